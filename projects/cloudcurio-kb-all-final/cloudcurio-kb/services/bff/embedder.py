@@ -0,0 +1,165 @@
+"""Query embeddings for vector search: one model per process, micro-batched, cached.
+
+Concurrent `embed()` calls are queued and encoded together: the batcher takes whatever is
+queued, waits up to EMBED_BATCH_WAIT_MS for more (at most EMBED_MAX_BATCH), and runs one
+`encode()` on a dedicated thread so the event loop never blocks on the model. Vectors are
+cached in an in-process LRU and, when a Redis client is given, in Redis (shared by replicas).
+"""
+from __future__ import annotations
+import asyncio, base64, hashlib, os, time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from cachetools import LRUCache
+from loguru import logger
+from prometheus_client import Counter, Histogram
+
+EMBED_MODEL = os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "onnx")  # onnx | torch
+EMBED_DEVICE = os.getenv("EMBED_DEVICE", "cpu")
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "2"))
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "10000"))
+EMBED_CACHE_TTL = int(os.getenv("EMBED_CACHE_TTL", str(7 * 24 * 3600)))
+
+_LATENCY_BUCKETS = (0.002, 0.005, 0.01, 0.015, 0.02, 0.03, 0.05, 0.1, 0.25, 1.0)
+EMBED_SECONDS = Histogram("bff_embed_seconds", "Query embedding latency as seen by callers, cache hits included",
+                          buckets=_LATENCY_BUCKETS)
+# misses only (batch queue wait + encode): what the 20 ms p95 target is about
+EMBED_MODEL_SECONDS = Histogram("bff_embed_model_seconds", "Query embedding latency of cache misses",
+                                buckets=_LATENCY_BUCKETS)
+EMBED_BATCH_SIZE = Histogram("bff_embed_batch_size", "Texts per model call", buckets=(1, 2, 4, 8, 16, 32, 64))
+EMBED_CACHE = Counter("bff_embed_cache_total", "Query embedding lookups", ["result"])  # hit_local|hit_redis|miss
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+def _pack(vec: List[float]) -> str:
+    return base64.b64encode(array("f", vec).tobytes()).decode()
+
+def _unpack(raw: str) -> List[float]:
+    a = array("f")
+    a.frombytes(base64.b64decode(raw))
+    return a.tolist()
+
+class Embedder:
+    def __init__(self, model_name: str = EMBED_MODEL, redis=None):
+        self.model_name = model_name
+        self.redis = redis
+        self.model = None
+        self.dim = 0
+        self._lru: LRUCache = LRUCache(maxsize=EMBED_CACHE_SIZE)
+        self._queue: "asyncio.Queue[Tuple[str, asyncio.Future]]" = asyncio.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        self._worker: Optional[asyncio.Task] = None
+        self._key_prefix = f"emb:{hashlib.sha1(model_name.encode()).hexdigest()[:12]}:"
+
+    def _load(self) -> None:
+        from sentence_transformers import SentenceTransformer
+        try:
+            self.model = SentenceTransformer(self.model_name, device=EMBED_DEVICE, backend=EMBED_BACKEND)
+        except Exception as e:  # no exported ONNX graph / onnxruntime missing
+            if EMBED_BACKEND == "torch":
+                raise
+            logger.warning(f"embedder: {EMBED_BACKEND} backend unavailable ({e}); using torch")
+            self.model = SentenceTransformer(self.model_name, device=EMBED_DEVICE)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self._encode(["warm up"] * min(EMBED_MAX_BATCH, 8))
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        vecs = self.model.encode(texts, batch_size=len(texts), normalize_embeddings=True,
+                                 convert_to_numpy=True, show_progress_bar=False)
+        return vecs.tolist()
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+        await loop.run_in_executor(self._pool, self._load)
+        self._worker = asyncio.create_task(self._batch_loop())
+        logger.info(f"embedder: {self.model_name} ({self.dim}d) loaded in {time.perf_counter() - t0:.1f}s")
+
+    async def close(self) -> None:
+        if self._worker:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+        self._pool.shutdown(wait=False)
+
+    async def embed(self, text: str) -> List[float]:
+        if self._worker is None:
+            raise RuntimeError("embedder not started")
+        t0 = time.perf_counter()
+        key = _normalize(text)
+        try:
+            vec = self._lru.get(key)
+            if vec is not None:
+                EMBED_CACHE.labels("hit_local").inc()
+                return vec
+            vec = await self._redis_get(key)
+            if vec is not None:
+                EMBED_CACHE.labels("hit_redis").inc()
+            else:
+                EMBED_CACHE.labels("miss").inc()
+                t_model = time.perf_counter()
+                fut = asyncio.get_running_loop().create_future()
+                await self._queue.put((key, fut))
+                vec = await fut
+                EMBED_MODEL_SECONDS.observe(time.perf_counter() - t_model)
+                await self._redis_set(key, vec)
+            self._lru[key] = vec
+            return vec
+        finally:
+            EMBED_SECONDS.observe(time.perf_counter() - t0)
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            deadline = loop.time() + EMBED_BATCH_WAIT_MS / 1000
+            while len(items) < EMBED_MAX_BATCH:
+                try:
+                    items.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        items.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            # identical concurrent queries share one row of the batch
+            waiters: Dict[str, List[asyncio.Future]] = {}
+            for text, fut in items:
+                waiters.setdefault(text, []).append(fut)
+            texts = list(waiters)
+            EMBED_BATCH_SIZE.observe(len(texts))
+            try:
+                vecs = await loop.run_in_executor(self._pool, self._encode, texts)
+            except Exception as e:
+                logger.exception("embedder: encode failed")
+                for futs in waiters.values():
+                    for f in futs:
+                        if not f.done():
+                            f.set_exception(e)
+                continue
+            for text, vec in zip(texts, vecs):
+                for f in waiters[text]:
+                    if not f.done():  # caller may have timed out
+                        f.set_result(vec)
+
+    async def _redis_get(self, key: str) -> Optional[List[float]]:
+        if self.redis is None:
+            return None
+        try:
+            raw = await self.redis.get(self._key_prefix + hashlib.sha256(key.encode()).hexdigest())
+            return _unpack(raw) if raw else None
+        except Exception as e:
+            logger.warning(f"embedder: redis get failed: {e}")
+            return None
+
+    async def _redis_set(self, key: str, vec: List[float]) -> None:
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(self._key_prefix + hashlib.sha256(key.encode()).hexdigest(), _pack(vec), ex=EMBED_CACHE_TTL)
+        except Exception as e:
+            logger.warning(f"embedder: redis set failed: {e}")
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 from __future__ import annotations
-import os, json, hashlib, time
+import os, json, hashlib, time, asyncio
 from typing import Any, Dict, List, Optional, Tuple
 from fastapi import FastAPI, Depends, HTTPException, Header, Query
 from pydantic import BaseModel
@@ -19,6 +19,8 @@ from datetime import datetime
 from prometheus_fastapi_instrumentator import Instrumentator
 from redis.asyncio import Redis
 from redis.asyncio.cluster import RedisCluster
+from embedder import Embedder
+from search_cache import SearchCache, cache_key
 
 APP = FastAPI(title="CloudCurio KB BFF")
 
@@ -28,6 +30,20 @@ OPENSEARCH_INDEX = os.getenv("OPENSEARCH_INDEX", "kb_docs")
 QDRANT_URL = os.getenv("QDRANT_URL", "http://qdrant:6333")
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "kb_embeddings")
 
+# Shared upstream clients (created at startup): pooled keep-alive connections, HTTP/2 where the
+# upstream negotiates it over TLS (plain http:// stays on HTTP/1.1).
+HTTP2 = os.getenv("UPSTREAM_HTTP2", "1") == "1"
+HTTP_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+OPENSEARCH_TIMEOUT = float(os.getenv("OPENSEARCH_TIMEOUT", "2.0"))
+QDRANT_TIMEOUT = float(os.getenv("QDRANT_TIMEOUT", "2.0"))
+# Total budget for /v1/search; a backend still running when it expires is dropped from the result.
+SEARCH_DEADLINE = float(os.getenv("SEARCH_DEADLINE", "2.5"))
+http_clients: Dict[str, httpx.AsyncClient] = {}
+embedder: Optional[Embedder] = None
+search_cache: Optional[SearchCache] = None
+
 JWT_ISSUER = os.getenv("JWT_ISSUER", "")
 JWT_AUDIENCE = os.getenv("JWT_AUDIENCE", "")
 OIDC_JWKS_URL = os.getenv("OIDC_JWKS_URL", "")
@@ -52,15 +68,21 @@ class DocIn(BaseModel):
     published_at: Optional[str] = None
     language: Optional[str] = None
 
+def _http_client(base_url: str, timeout: float) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=base_url, http2=HTTP2,
+        timeout=httpx.Timeout(timeout, connect=min(timeout, 1.0)),
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY))
+
 async def _get_jwks() -> dict:
     if "jwks" in _jwks_cache:
         return _jwks_cache["jwks"]
-    async with httpx.AsyncClient(timeout=10) as client:
-        r = await client.get(OIDC_JWKS_URL)
-        r.raise_for_status()
-        data = r.json()
-        _jwks_cache["jwks"] = data
-        return data
+    r = await http_clients["default"].get(OIDC_JWKS_URL)
+    r.raise_for_status()
+    data = r.json()
+    _jwks_cache["jwks"] = data
+    return data
 
 async def require_bearer(authorization: Optional[str] = Header(None)):
     if not authorization or not authorization.lower().startswith("bearer "):
@@ -131,18 +153,33 @@ async def rate_limit_mw(request: Request, call_next):
 
 @APP.on_event('startup')
 async def _startup():
-    global redis_client
+    global redis_client, embedder, search_cache
     Instrumentator().instrument(APP).expose(APP)
     if REDIS_MODE == "cluster":
         redis_client = RedisCluster(startup_nodes=[{'host': n.split(':')[0], 'port': int(n.split(':')[1])} for n in REDIS_CLUSTER_NODES],
                                     decode_responses=True, read_from_replicas=True)
     else:
         redis_client = Redis.from_url(REDIS_URL, encoding='utf-8', decode_responses=True)
+    search_cache = SearchCache(redis_client)
+    http_clients["opensearch"] = _http_client(OPENSEARCH_URL, OPENSEARCH_TIMEOUT)
+    http_clients["qdrant"] = _http_client(QDRANT_URL, QDRANT_TIMEOUT)
+    http_clients["default"] = _http_client("", 10)
+    embedder = Embedder(redis=redis_client)
+    try:
+        await embedder.start()
+    except Exception:
+        # keyword search keeps working; the vector leg reports "error" until restart
+        logger.exception("embedding model failed to load")
+        embedder = None
 
 @APP.on_event('shutdown')
 async def _shutdown():
     global redis_client
     if redis_client: await redis_client.aclose()
+    await asyncio.gather(*(c.aclose() for c in http_clients.values()))
+    if embedder: await embedder.close()
+    if search_cache: await search_cache.close()
+    http_clients.clear()
 
 class DocOut(BaseModel):
     status: str
@@ -160,34 +197,53 @@ async def create_or_update_doc(doc: DocIn, _=Depends(require_bearer)) -> DocOut:
 
 @APP.post("/v1/commit")
 async def commit_drafts(_=Depends(require_bearer)):
-    return {"status":"committed","commit_id":"fake-commit"}
-
-async def _opensearch_keyword(query: str, k: int) -> List[Tuple[str, float]]:
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            body = {"query":{"multi_match":{"query":query,"fields":["title^2","text"]}},"size":k}
-            r = await client.post(f"{OPENSEARCH_URL}/{OPENSEARCH_INDEX}/_search", json=body)
-            r.raise_for_status()
-            hits = r.json().get("hits", {}).get("hits", [])
-            return [(h.get("_id"), float(h.get("_score",0))) for h in hits]
+        generation = await search_cache.bump()  # cached search results are stale from here on
     except Exception as e:
-        logger.warning(f"OpenSearch error: {e}")
-        return []
+        # the commit itself succeeded; cached results go stale only at their TTL
+        logger.error(f"search cache generation bump failed: {e}")
+        generation = None
+    return {"status":"committed","commit_id":"fake-commit","generation":generation}
+
+async def _opensearch_keyword(query: str, k: int) -> List[Tuple[str, float]]:
+    body = {"query":{"multi_match":{"query":query,"fields":["title^2","text"]}},"size":k}
+    r = await http_clients["opensearch"].post(f"/{OPENSEARCH_INDEX}/_search", json=body)
+    r.raise_for_status()
+    hits = r.json().get("hits", {}).get("hits", [])
+    return [(h.get("_id"), float(h.get("_score",0))) for h in hits]
 
 async def _qdrant_vector(query: str, k: int) -> List[Tuple[str, float]]:
-    try:
-        seed = int(hashlib.sha256(query.encode()).hexdigest(),16)%1000
-        vec = [float((seed%100)/100.0)]*384
-        async with httpx.AsyncClient(timeout=15) as client:
-            body = {"vector": vec, "limit": k, "with_payload": False}
-            r = await client.post(f"{QDRANT_URL}/collections/{QDRANT_COLLECTION}/points/search", json=body)
-            if r.status_code >= 400:
-                return []
-            pts = r.json().get("result", [])
-            return [(str(p.get("id")), float(p.get("score",0))) for p in pts]
-    except Exception as e:
-        logger.warning(f"Qdrant error: {e}")
-        return []
+    if embedder is None:
+        raise RuntimeError("embedding model not loaded")
+    vec = await embedder.embed(query)
+    body = {"vector": vec, "limit": k, "with_payload": False}
+    r = await http_clients["qdrant"].post(f"/collections/{QDRANT_COLLECTION}/points/search", json=body)
+    r.raise_for_status()
+    pts = r.json().get("result", [])
+    return [(str(p.get("id")), float(p.get("score",0))) for p in pts]
+
+async def _gather_legs(legs: Dict[str, Any], deadline: float) -> Tuple[Dict[str, List[Tuple[str, float]]], Dict[str, str]]:
+    """Run the backend calls concurrently; whatever hasn't finished by `deadline` (seconds) is cancelled.
+    -> (hits per leg, status per leg: ok|timeout|error). Failed or late legs contribute no hits."""
+    tasks = {name: asyncio.ensure_future(coro) for name, coro in legs.items()}
+    done, pending = await asyncio.wait(tasks.values(), timeout=max(deadline, 0))
+    for t in pending:
+        t.cancel()
+    hits: Dict[str, List[Tuple[str, float]]] = {}
+    status: Dict[str, str] = {}
+    for name, t in tasks.items():
+        hits[name] = []
+        if t in pending:
+            status[name] = "timeout"
+        elif t.exception() is not None:
+            e = t.exception()
+            status[name] = "timeout" if isinstance(e, (httpx.TimeoutException, asyncio.TimeoutError)) else "error"
+            logger.warning(f"{name} search failed: {type(e).__name__}: {e}")
+        else:
+            hits[name], status[name] = t.result(), "ok"
+    if pending:
+        logger.warning(f"search deadline {deadline:.2f}s exceeded: {', '.join(n for n, t in tasks.items() if t in pending)}")
+    return hits, status
 
 def _fuse_results(kw, ve, k):
     def normalize(items):
@@ -203,11 +259,24 @@ def _fuse_results(kw, ve, k):
     return fused[:k]
 
 @APP.get("/v1/search")
-async def hybrid_search(q: str = Query(..., min_length=2), top_k: int = 10, _=Depends(require_bearer)):
-    kw = await _opensearch_keyword(q, top_k)
-    ve = await _qdrant_vector(q, top_k)
-    fused = _fuse_results(kw, ve, top_k)
-    return {"query": q, "results": fused, "keyword_hits": len(kw), "vector_hits": len(ve)}
+async def hybrid_search(q: str = Query(..., min_length=2), top_k: int = 10,
+                        timeout_ms: Optional[int] = Query(None, ge=1, description="caller's budget, capped at SEARCH_DEADLINE"),
+                        claims=Depends(require_bearer)):
+    deadline = min(SEARCH_DEADLINE, timeout_ms / 1000) if timeout_ms else SEARCH_DEADLINE
+
+    async def compute(budget: float) -> Tuple[dict, bool]:
+        hits, status = await _gather_legs({
+            "keyword": asyncio.wait_for(_opensearch_keyword(q, top_k), OPENSEARCH_TIMEOUT),
+            "vector": asyncio.wait_for(_qdrant_vector(q, top_k), QDRANT_TIMEOUT),
+        }, budget)
+        kw, ve = hits["keyword"], hits["vector"]
+        partial = any(s != "ok" for s in status.values())
+        body = {"results": _fuse_results(kw, ve, top_k), "keyword_hits": len(kw), "vector_hits": len(ve),
+                "partial": partial, "backends": status}
+        return body, not partial  # partial results are never cached
+
+    body, cache_status, generation = await search_cache.get_or_compute(cache_key(q, top_k, claims), compute, deadline)
+    return {"query": q, **body, "cache": cache_status, "generation": generation}
 
 def _etag_for(kind: str, cursor: str|None) -> str:
     raw = f"{kind}:{cursor or ''}".encode()
@@ -0,0 +1,158 @@
+"""Search result cache: Redis-backed, invalidated by the corpus generation that /v1/commit bumps.
+
+Entries are keyed by normalized query, top_k and the caller's claims scope, and remember the
+generation they were computed at. Entries from the current generation are fresh. Entries from
+an older one are served as stale for up to SEARCH_CACHE_MAX_STALE seconds after the commit,
+while a single background refresh recomputes them. Misses are coalesced: per key, one
+computation runs per process for each (generation, deadline), and across replicas only the one
+holding a short Redis lock computes while the others poll for its result. A waiter stops polling
+as soon as the lock is released without a stored result (partial results are not cached) and
+never waits past its own deadline.
+"""
+from __future__ import annotations
+import asyncio, hashlib, json, os, time, uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+from loguru import logger
+from prometheus_client import Counter
+
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "86400"))  # Redis eviction only; freshness is by generation
+SEARCH_CACHE_MAX_STALE = float(os.getenv("SEARCH_CACHE_MAX_STALE", "30"))
+SEARCH_CACHE_SCOPE_CLAIMS = [c.strip() for c in os.getenv("SEARCH_CACHE_SCOPE_CLAIMS", "scope,groups,tenant").split(",") if c.strip()]
+SEARCH_CACHE_LOCK_MS = int(os.getenv("SEARCH_CACHE_LOCK_MS", "5000"))
+
+META_KEY = "sc:meta"  # hash: gen, at (unix time of the last commit)
+
+# delete the lock only if we still hold it (it may have expired and been taken by another replica)
+RELEASE_LOCK = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+SEARCH_CACHE = Counter("bff_search_cache_total", "Search result cache lookups", ["result"])  # hit|stale|miss|coalesced|bypass
+
+def normalize_query(q: str) -> str:
+    return " ".join(q.split()).lower()
+
+def cache_key(q: str, top_k: int, claims: Optional[Dict[str, Any]]) -> str:
+    scope = {c: (claims or {}).get(c) for c in SEARCH_CACHE_SCOPE_CLAIMS}
+    blob = json.dumps([normalize_query(q), top_k, scope], sort_keys=True, default=str)
+    return "sc:e:" + hashlib.sha256(blob.encode()).hexdigest()
+
+class SearchCache:
+    def __init__(self, redis):
+        self.redis = redis
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._refreshing: Set[asyncio.Task] = set()
+
+    async def bump(self) -> int:
+        """Start a new corpus generation; every cached result becomes stale."""
+        pipe = self.redis.pipeline(transaction=False)  # cluster pipelines are non-transactional
+        pipe.hincrby(META_KEY, "gen", 1)
+        pipe.hset(META_KEY, "at", str(time.time()))
+        gen, _ = await pipe.execute()
+        return int(gen)
+
+    async def _read(self, key: str) -> Tuple[int, float, Optional[dict]]:
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hmget(META_KEY, "gen", "at")
+        pipe.get(key)
+        (gen, at), raw = await pipe.execute()
+        return int(gen or 0), float(at or 0), json.loads(raw) if raw else None
+
+    async def get_or_compute(self, key: str, compute: Callable[[float], Awaitable[Tuple[dict, bool]]],
+                             budget: float) -> Tuple[dict, str, int]:
+        """`compute(seconds left)` -> (payload, cacheable); `budget` is the caller's deadline in seconds.
+        Returns (payload, hit|stale|miss|coalesced|bypass, generation)."""
+        try:
+            gen, committed_at, entry = await self._read(key)
+        except Exception as e:
+            logger.warning(f"search cache: redis read failed: {e}")
+            payload, _ = await self._coalesced(f"{key}@{budget:.3f}", lambda: compute(budget))
+            SEARCH_CACHE.labels("bypass").inc()
+            return payload, "bypass", -1
+        if entry and entry["gen"] == gen:
+            SEARCH_CACHE.labels("hit").inc()
+            return entry["payload"], "hit", gen
+        if entry and time.time() - committed_at <= SEARCH_CACHE_MAX_STALE:
+            self._refresh_in_background(key, gen, compute, budget)
+            SEARCH_CACHE.labels("stale").inc()
+            return entry["payload"], "stale", entry["gen"]
+        flight = self._inflight.get(self._flight(key, gen, budget))
+        if flight is not None:
+            SEARCH_CACHE.labels("coalesced").inc()
+            payload, _ = await asyncio.shield(flight)
+            return payload, "coalesced", gen
+        payload = await self._compute_once(key, gen, compute, budget)
+        SEARCH_CACHE.labels("miss").inc()
+        return payload, "miss", gen
+
+    async def _coalesced(self, key: str, compute: Callable[[], Awaitable[Tuple[dict, bool]]]) -> Tuple[dict, bool]:
+        """One `compute()` per key in this process; concurrent callers share its result."""
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(compute())
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shielded: a caller that disconnects doesn't cancel the others' computation
+        return await asyncio.shield(fut)
+
+    @staticmethod
+    def _flight(key: str, gen: int, budget: float) -> str:
+        # per generation: a computation started before a commit doesn't answer requests after it;
+        # per deadline: a caller with a tight timeout_ms doesn't hand its partial result to others
+        return f"{key}@{gen}@{budget:.3f}"
+
+    async def _compute_once(self, key: str, gen: int, compute: Callable[[float], Awaitable[Tuple[dict, bool]]],
+                            budget: float) -> dict:
+        async def across_replicas() -> Tuple[dict, bool]:
+            until = time.monotonic() + budget
+            lock, token = key + ":lock", uuid.uuid4().hex
+            got = await self._try(self.redis.set(lock, token, nx=True, px=SEARCH_CACHE_LOCK_MS), default=True)
+            if not got:
+                # another replica is computing this generation's result: wait while it holds the lock
+                while time.monotonic() < until:
+                    await asyncio.sleep(0.025)
+                    raw, held = await self._try(self._poll(key, lock), default=(None, 0))
+                    if raw and json.loads(raw)["gen"] >= gen:
+                        return json.loads(raw)["payload"], False  # already stored by the other replica
+                    if not held:
+                        break  # released without a stored result (partial or failed): compute ourselves
+            try:
+                payload, cacheable = await compute(max(until - time.monotonic(), 0.0))
+                if cacheable:
+                    await self._try(self.redis.set(key, json.dumps({"gen": gen, "payload": payload}), ex=SEARCH_CACHE_TTL))
+                return payload, cacheable
+            finally:
+                if got:
+                    await self._try(self.redis.eval(RELEASE_LOCK, 1, lock, token))
+        payload, _ = await self._coalesced(self._flight(key, gen, budget), across_replicas)
+        return payload
+
+    async def _poll(self, key: str, lock: str) -> Tuple[Optional[str], int]:
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.get(key)
+        pipe.exists(lock)
+        raw, held = await pipe.execute()
+        return raw, held
+
+    def _refresh_in_background(self, key: str, gen: int, compute: Callable[[float], Awaitable[Tuple[dict, bool]]],
+                               budget: float) -> None:
+        if self._flight(key, gen, budget) in self._inflight:
+            return
+        task = asyncio.create_task(self._compute_once(key, gen, compute, budget))
+        self._refreshing.add(task)
+        task.add_done_callback(self._refresh_done)
+
+    def _refresh_done(self, task: asyncio.Task) -> None:
+        self._refreshing.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"search cache: background refresh failed: {task.exception()}")
+
+    async def _try(self, coro, default=None):
+        try:
+            return await coro
+        except Exception as e:
+            logger.warning(f"search cache: redis call failed: {e}")
+            return default
+
+    async def close(self) -> None:
+        for t in list(self._refreshing):
+            t.cancel()
+        await asyncio.gather(*self._refreshing, return_exceptions=True)
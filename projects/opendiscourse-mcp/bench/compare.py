@@ -0,0 +1,51 @@
+"""Compare two driver.py result files; exits 1 if any scenario regressed beyond the threshold.
+
+    python bench/compare.py bench/results/base.json bench/results/new.json --threshold 0.10
+"""
+from __future__ import annotations
+import argparse, json, sys
+from typing import Any, Dict, List, Tuple
+
+# metric -> True when higher is better
+METRICS = {"p50_ms": False, "p95_ms": False, "p99_ms": False, "throughput_rps": True}
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], threshold: float) -> Tuple[List[List[str]], List[str]]:
+    """-> (table rows, regressions) for scenarios present in both reports."""
+    rows, regressions = [], []
+    for name in base["scenarios"]:
+        if name not in new["scenarios"]:
+            continue
+        b, n = base["scenarios"][name], new["scenarios"][name]
+        for metric, higher_better in METRICS.items():
+            old, cur = float(b.get(metric, 0)), float(n.get(metric, 0))
+            change = (cur - old) / old if old else 0.0
+            worse = -change if higher_better else change
+            flag = "REGRESSION" if worse > threshold else ("improved" if worse < -threshold else "")
+            rows.append([name, metric, f"{old:g}", f"{cur:g}", f"{change:+.1%}", flag])
+            if flag == "REGRESSION":
+                regressions.append(f"{name} {metric} {old:g} -> {cur:g} ({change:+.1%})")
+        if n.get("errors", 0) > b.get("errors", 0):
+            regressions.append(f"{name} errors {b.get('errors', 0)} -> {n['errors']}")
+    return rows, regressions
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("base")
+    ap.add_argument("new")
+    ap.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    args = ap.parse_args()
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    rows, regressions = compare(base, new, args.threshold)
+    header = ["scenario", "metric", base["meta"]["git_sha"], new["meta"]["git_sha"], "change", ""]
+    widths = [max(len(str(r[i])) for r in rows + [header]) for i in range(len(header))]
+    for r in [header] + rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(r, widths)).rstrip())
+    if regressions:
+        print("\nregressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
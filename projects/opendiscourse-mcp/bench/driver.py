@@ -0,0 +1,212 @@
+"""Load driver: latency percentiles and throughput for ingest and search, written as JSON.
+
+    make bench-up                 # bench/docker-compose.bench.yml: pgvector, MinIO, API, worker, fixture site
+    python bench/driver.py        # all scenarios -> bench/results/<time>-<git sha>.json
+    python bench/compare.py bench/results/A.json bench/results/B.json
+
+Scenarios:
+    ingest_url       fetcher.ingest_url called in-process (it is not an MCP tool) against the
+                     bench Postgres/MinIO, fetching fresh fixture pages and PDFs
+    run_crawl_batch  crawl jobs through the API and the bench worker; latency is submit to done
+    search_docs      JSON-RPC calls with distinct queries (so the result cache doesn't answer)
+    semantic_search  same, over document_chunks
+"""
+from __future__ import annotations
+import argparse, asyncio, json, os, platform, random, subprocess, sys, time, uuid
+from typing import Any, Awaitable, Callable, Dict, List
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GOVDOCS = os.path.join(HERE, "..", "servers", "mcp_govdocs")
+SCENARIOS = ("ingest_url", "run_crawl_batch", "search_docs", "semantic_search")
+# connection settings of bench/docker-compose.bench.yml as seen from the host
+BENCH_ENV = {"POSTGRES_HOST": "localhost", "POSTGRES_PORT": "15432", "POSTGRES_DB": "bench",
+             "POSTGRES_USER": "bench", "POSTGRES_PASSWORD": "bench", "MINIO_ENDPOINT": "localhost:19000",
+             "MINIO_ROOT_USER": "benchadmin", "MINIO_ROOT_PASSWORD": "benchadmin"}
+
+def percentile(sorted_vals: List[float], q: float) -> float:
+    """Linear interpolation between closest ranks (numpy's default)."""
+    if not sorted_vals:
+        return 0.0
+    pos = (len(sorted_vals) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (pos - lo)
+
+def summarize(latencies_s: List[float], errors: int, wall_s: float, **extra: Any) -> Dict[str, Any]:
+    lat = sorted(x * 1000 for x in latencies_s)
+    return {
+        "requests": len(lat) + errors, "ok": len(lat), "errors": errors, "seconds": round(wall_s, 3),
+        "throughput_rps": round(len(lat) / wall_s, 2) if wall_s else 0.0,
+        "mean_ms": round(sum(lat) / len(lat), 2) if lat else 0.0,
+        "p50_ms": round(percentile(lat, 0.50), 2), "p95_ms": round(percentile(lat, 0.95), 2),
+        "p99_ms": round(percentile(lat, 0.99), 2), "max_ms": round(lat[-1], 2) if lat else 0.0,
+        **extra,
+    }
+
+async def run_load(op: Callable[[int], Awaitable[Any]], requests: int, concurrency: int,
+                   warmup: int = 0) -> Dict[str, Any]:
+    """Run `op(i)` for i in range(warmup + requests) with `concurrency` in flight; warmup isn't measured."""
+    for i in range(warmup):
+        try:
+            await op(i)
+        except Exception:
+            pass
+    latencies: List[float] = []
+    errors: List[str] = []
+    counter = iter(range(warmup, warmup + requests))
+
+    async def worker() -> None:
+        for i in counter:
+            t0 = time.perf_counter()
+            try:
+                await op(i)
+                latencies.append(time.perf_counter() - t0)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, len(errors), time.perf_counter() - t0, concurrency=concurrency,
+                     error_samples=errors[:5])
+
+class Rpc:
+    def __init__(self, client: httpx.AsyncClient, url: str):
+        self.client, self.url, self._id = client, url, 0
+
+    async def __call__(self, method: str, **params: Any) -> Any:
+        self._id += 1
+        r = await self.client.post(self.url, json={"jsonrpc": "2.0", "id": self._id, "method": method, "params": params})
+        r.raise_for_status()
+        body = r.json()
+        if "error" in body:
+            raise RuntimeError(f"{method}: {body['error']['message']}")
+        return body["result"]
+
+def queries(n: int, seed: int, words: int) -> List[str]:
+    from fixture_server import WORDS
+    rng = random.Random(seed)
+    return [" ".join(rng.sample(WORDS, words)) for _ in range(n)]
+
+async def bench_ingest_url(args: argparse.Namespace, rpc: Rpc) -> Dict[str, Any]:
+    for k, v in BENCH_ENV.items():
+        os.environ.setdefault(k, v)
+    sys.path.insert(0, GOVDOCS)
+    from db_pool import pool
+    from fetcher import ingest_url
+    from minio_utils import upload_queue
+    await rpc("evaluate_domain", domain=args.domain)
+    token = uuid.uuid4().hex[:8]
+    await pool.open(wait=True)
+    ingested = 0
+
+    async def op(i: int) -> None:
+        nonlocal ingested
+        ext = "pdf" if args.pdf_every and i % args.pdf_every == 0 else "html"
+        res = await ingest_url(args.domain, f"{args.fixture}/docs/{i}.{ext}?v={token}")
+        ingested += res.get("ingested", 0)
+
+    try:
+        result = await run_load(op, args.requests, args.concurrency, args.warmup)
+    finally:
+        await upload_queue.close()
+        await pool.close()
+    return {**result, "ingested": ingested}
+
+async def bench_run_crawl_batch(args: argparse.Namespace, rpc: Rpc) -> Dict[str, Any]:
+    # a fresh subdomain (CRAWL_ORIGINS maps *.bench.gov to the fixture) gets a fresh crawl_queue
+    domain = f"run-{uuid.uuid4().hex[:8]}.{args.domain}"
+    await rpc("evaluate_domain", domain=domain)
+    await rpc("set_site_settings", domain=domain, settings={"crawl": {"politeness_ms": 0}})
+    latencies: List[float] = []
+    errors: List[str] = []
+    urls = 0
+    t0 = time.perf_counter()
+
+    async def job(_: int) -> None:
+        nonlocal urls
+        start = time.perf_counter()
+        job_id = (await rpc("run_crawl_batch", domain=domain, limit=args.batch, vectorize=args.vectorize))["job_id"]
+        while True:
+            state = await rpc("get_crawl_job", job_id=job_id)
+            if state["state"] in ("done", "failed"):
+                break
+            await asyncio.sleep(0.2)
+        if state["state"] == "failed":
+            errors.append(str((state.get("result") or {}).get("error")))
+            return
+        latencies.append(time.perf_counter() - start)
+        urls += int(state.get("attempted") or (state.get("result") or {}).get("attempted", 0))
+
+    await asyncio.gather(*(job(i) for i in range(args.jobs)))
+    wall = time.perf_counter() - t0
+    return summarize(latencies, len(errors), wall, jobs=args.jobs, batch=args.batch, urls=urls,
+                     urls_per_s=round(urls / wall, 2) if wall else 0.0, error_samples=errors[:5])
+
+async def bench_search(tool: str, args: argparse.Namespace, rpc: Rpc) -> Dict[str, Any]:
+    qs = queries(args.requests + args.warmup, args.seed, 2 if tool == "search_docs" else 4)
+    params = {"search_docs": lambda q: {"query": q, "limit": 25},
+              "semantic_search": lambda q: {"query": q, "top_k": 10}}[tool]
+    return await run_load(lambda i: rpc(tool, **params(qs[i])), args.requests, args.concurrency, args.warmup)
+
+def git_sha() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    sys.path.insert(0, HERE)
+    results: Dict[str, Any] = {}
+    async with httpx.AsyncClient(timeout=args.timeout) as client:
+        rpc = Rpc(client, args.api)
+        try:
+            await client.post(f"{args.fixture}/_generation")  # new content: ingests are not duplicates
+        except httpx.HTTPError as e:
+            sys.exit(f"fixture server not reachable at {args.fixture}: {e}")
+        for name in args.scenarios:
+            print(f"{name} ...", flush=True)
+            if name == "ingest_url":
+                results[name] = await bench_ingest_url(args, rpc)
+            elif name == "run_crawl_batch":
+                results[name] = await bench_run_crawl_batch(args, rpc)
+            else:
+                results[name] = await bench_search(name, args, rpc)
+            r = results[name]
+            print(f"  p50 {r['p50_ms']} ms  p95 {r['p95_ms']} ms  p99 {r['p99_ms']} ms  "
+                  f"{r['throughput_rps']} req/s  errors {r['errors']}", flush=True)
+    return {
+        "meta": {"git_sha": git_sha(), "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(args.started)),
+                 "host": platform.node(), "python": platform.python_version(),
+                 "params": {k: v for k, v in vars(args).items() if k not in ("started",)}},
+        "scenarios": results,
+    }
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="mcp_govdocs load driver")
+    ap.add_argument("--api", default="http://localhost:18001/mcp")
+    ap.add_argument("--fixture", default="http://localhost:18080", help="fixture server as seen from this host")
+    ap.add_argument("--domain", default="bench.gov")
+    ap.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    ap.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    ap.add_argument("--warmup", type=int, default=10)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--pdf-every", type=int, default=10, help="ingest_url: every Nth URL is a PDF")
+    ap.add_argument("--jobs", type=int, default=4, help="run_crawl_batch: concurrent jobs")
+    ap.add_argument("--batch", type=int, default=100, help="run_crawl_batch: URLs per job")
+    ap.add_argument("--vectorize", action="store_true", help="run_crawl_batch: vectorize ingested docs")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--out", default=os.path.join(HERE, "results"))
+    args = ap.parse_args()
+    args.started = time.time()
+    report = asyncio.run(main_async(args))
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(args.started))}-{report['meta']['git_sha']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"results: {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Synthetic government site for benchmarks: robots.txt, a sitemap index, page sitemaps,
+templated HTML pages and small text PDFs, all generated deterministically from the doc id.
+
+    python bench/fixture_server.py --port 8080 --docs 5000 --public-origin http://fixture:8080
+
+POST /_generation starts a new corpus generation (every page's content, and so its hash,
+changes), so repeated benchmark runs ingest new documents instead of duplicates.
+"""
+from __future__ import annotations
+import argparse, random, threading, time, zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("agency federal register notice rule proposed comment period regulation program grant funding "
+         "report audit oversight committee hearing budget appropriation authority section amendment public "
+         "health safety transportation energy environment education defense treasury labor commerce housing "
+         "infrastructure compliance enforcement guidance policy statute review assessment data annual").split()
+
+SITEMAP_SIZE = 1000
+
+def sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+def page_text(doc_id: int, generation: int) -> tuple[str, list[str]]:
+    rng = random.Random(doc_id * 7919 + generation)
+    title = f"{sentence(rng, 6)[:-1]} ({doc_id})"
+    paragraphs = [" ".join(sentence(rng, rng.randint(8, 20)) for _ in range(rng.randint(3, 6)))
+                  for _ in range(rng.randint(4, 12))]
+    return title, paragraphs
+
+def html_page(doc_id: int, generation: int) -> bytes:
+    title, paragraphs = page_text(doc_id, generation)
+    body = "".join(f"<p>{p}</p>" for p in paragraphs)
+    nav = "".join(f'<li><a href="/docs/{doc_id + k}.html">Related {k}</a></li>' for k in range(1, 6))
+    return (f"<!doctype html><html><head><title>{title} | Bench Agency</title>"
+            f"<script>window.analytics = {{}};</script></head><body>"
+            f'<header id="site-header"><ul class="menu">{nav}</ul></header>'
+            f'<main><div class="node-{doc_id}"><h1 class="page-title">{title}</h1>'
+            f'<div class="field field-body">{body}</div></div></main>'
+            f'<a rel="next" href="/docs/{doc_id + 1}.html">Next</a>'
+            f"<footer><p>Bench Agency, 1 Benchmark Plaza, Washington DC. Generation {generation}.</p></footer>"
+            f"</body></html>").encode()
+
+def _pdf_escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def pdf_doc(doc_id: int, generation: int) -> bytes:
+    """Single-page PDF with real text operators, so pdfminer extracts the words."""
+    title, paragraphs = page_text(doc_id, generation)
+    words = " ".join(paragraphs).split()
+    lines = [title] + [" ".join(words[i:i + 12]) for i in range(0, min(len(words), 480), 12)]
+    stream = "BT /F1 10 Tf 12 TL 50 760 Td " + " ".join(f"({_pdf_escape(l)}) '" for l in lines) + " ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        "/Resources << /Font << /F1 5 0 R >> >> >>",
+        f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for n, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{n} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+def doc_path(doc_id: int, pdf_every: int) -> str:
+    return f"/docs/{doc_id}.pdf" if pdf_every and doc_id % pdf_every == 0 else f"/docs/{doc_id}.html"
+
+class Corpus:
+    def __init__(self, docs: int, pdf_every: int, public_origin: str, latency_ms: float):
+        self.docs, self.pdf_every, self.origin, self.latency_s = docs, pdf_every, public_origin.rstrip("/"), latency_ms / 1000
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def bump(self) -> int:
+        with self._lock:
+            self.generation += 1
+            return self.generation
+
+    def robots(self) -> bytes:
+        return f"User-agent: *\nDisallow: /private/\nSitemap: {self.origin}/sitemap_index.xml\n".encode()
+
+    def sitemap_index(self) -> bytes:
+        n = -(-self.docs // SITEMAP_SIZE)
+        items = "".join(f"<sitemap><loc>{self.origin}/sitemaps/{i}.xml</loc></sitemap>" for i in range(n))
+        return (f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex '
+                f'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{items}</sitemapindex>').encode()
+
+    def sitemap(self, i: int) -> bytes | None:
+        start = i * SITEMAP_SIZE
+        if start >= self.docs:
+            return None
+        urls = "".join(f"<url><loc>{self.origin}{doc_path(d, self.pdf_every)}</loc><changefreq>weekly</changefreq></url>"
+                       for d in range(start, min(start + SITEMAP_SIZE, self.docs)))
+        return (f'<?xml version="1.0" encoding="UTF-8"?><urlset '
+                f'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>').encode()
+
+def make_handler(corpus: Corpus):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args) -> None:  # keep benchmark output clean
+            pass
+
+        def _send(self, status: int, body: bytes, ctype: str) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self) -> None:
+            if self.path == "/_generation":
+                self._send(200, f'{{"generation": {corpus.bump()}}}'.encode(), "application/json")
+            else:
+                self._send(404, b"not found", "text/plain")
+
+        def do_GET(self) -> None:
+            if corpus.latency_s:
+                time.sleep(corpus.latency_s)
+            path = self.path.split("?", 1)[0]
+            # ?v=<token> varies the content without a generation bump (per-request fresh documents)
+            salt = zlib.crc32(self.path.split("?", 1)[1].encode()) if "?" in self.path else 0
+            gen = corpus.generation + salt
+            if path == "/robots.txt":
+                return self._send(200, corpus.robots(), "text/plain")
+            if path == "/sitemap_index.xml":
+                return self._send(200, corpus.sitemap_index(), "application/xml")
+            if path.startswith("/sitemaps/") and path.endswith(".xml"):
+                body = corpus.sitemap(int(path[len("/sitemaps/"):-4]))
+                return self._send(200, body, "application/xml") if body else self._send(404, b"", "text/plain")
+            if path.startswith("/docs/"):
+                name, _, ext = path[len("/docs/"):].partition(".")
+                if name.isdigit() and ext == "html":
+                    return self._send(200, html_page(int(name), gen), "text/html; charset=utf-8")
+                if name.isdigit() and ext == "pdf":
+                    return self._send(200, pdf_doc(int(name), gen), "application/pdf")
+            self._send(404, b"not found", "text/plain")
+    return Handler
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--docs", type=int, default=5000)
+    ap.add_argument("--pdf-every", type=int, default=10, help="every Nth doc is a PDF (0 = none)")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="added to every GET")
+    ap.add_argument("--public-origin", default=None, help="origin written into robots.txt and sitemaps")
+    args = ap.parse_args()
+    corpus = Corpus(args.docs, args.pdf_every, args.public_origin or f"http://localhost:{args.port}", args.latency_ms)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(corpus))
+    print(f"fixture server on {args.host}:{args.port} ({args.docs} docs, origin {corpus.origin})", flush=True)
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+from __future__ import annotations
+import json, math, time
+from typing import Any, Dict, List, Sequence
+import psycopg
+from psycopg import sql
+from db import get_db_dsn
+from db_pool import pool
+
+INDEX_NAME = "document_chunks_embedding_idx"
+OPS = "vector_cosine_ops"
+
+# Default ef_search / probes multipliers when no benchmark calibration exists yet.
+_HNSW_EF = [(0.80, 20), (0.90, 40), (0.95, 80), (0.98, 160), (1.0, 400)]
+_IVF_SQRT_FACTOR = [(0.80, 0.5), (0.90, 1.0), (0.95, 2.0), (0.98, 4.0), (1.0, 8.0)]
+
+_state: Dict[str, Any] | None = None
+_state_loaded_at = 0.0
+STATE_TTL_S = 60.0
+
+def ivfflat_lists_for(rows: int) -> int:
+    """pgvector guidance: rows/1000 up to 1M rows, sqrt(rows) beyond."""
+    if rows <= 1_000_000:
+        return max(1, rows // 1000)
+    return int(math.sqrt(rows))
+
+def _lookup(table: Sequence[tuple[float, float]], recall: float) -> float:
+    for target, value in table:
+        if recall <= target:
+            return value
+    return table[-1][1]
+
+def params_for_recall(state: Dict[str, Any] | None, recall: float, top_k: int) -> Dict[str, int]:
+    """Per-query knob for the current index: calibrated curve first, heuristic otherwise."""
+    if not state:
+        return {}
+    calibration = state.get("calibration") or []
+    # calibration rows are sorted by the knob ascending; take the cheapest that meets recall
+    for row in calibration:
+        if row["recall"] >= recall:
+            knob = int(row["value"])
+            break
+    else:
+        knob = 0
+    if state["kind"] == "hnsw":
+        ef = knob or int(_lookup(_HNSW_EF, recall))
+        return {"hnsw.ef_search": max(ef, top_k)}
+    lists = int(state.get("lists") or 1)
+    probes = knob or math.ceil(math.sqrt(lists) * _lookup(_IVF_SQRT_FACTOR, recall))
+    return {"ivfflat.probes": max(1, min(probes, lists))}
+
+async def load_state(force: bool = False) -> Dict[str, Any] | None:
+    global _state, _state_loaded_at
+    if force or time.monotonic() - _state_loaded_at > STATE_TTL_S:
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT kind, lists, m, ef_construction, row_count, built_at, calibration "
+                                  "FROM ann_index_state WHERE id")
+                row = await cur.fetchone()
+        _state = None if not row else {
+            "kind": row[0], "lists": row[1], "m": row[2], "ef_construction": row[3],
+            "row_count": row[4], "built_at": row[5].isoformat() if row[5] else None,
+            "calibration": row[6] or [],
+        }
+        _state_loaded_at = time.monotonic()
+    return _state
+
+async def apply_search_params(cur, recall: float, top_k: int) -> Dict[str, int]:
+    """SET LOCAL the probes/ef_search for this transaction; returns what was applied."""
+    applied = params_for_recall(await load_state(), recall, top_k)
+    for name, value in applied.items():
+        await cur.execute(f"SET LOCAL {name} = {int(value)}")
+    return applied
+
+async def build_index(kind: str = "ivfflat", lists: int | None = None, m: int = 16,
+                ef_construction: int = 64, maintenance_work_mem: str = "512MB") -> Dict[str, Any]:
+    """(Re)build the embedding index after a bulk load without blocking searches.
+
+    The new index is built CONCURRENTLY under a temporary name and swapped in, so the
+    old one keeps serving queries until the rebuild finishes.
+    """
+    if kind not in ("ivfflat", "hnsw"):
+        raise ValueError("kind must be ivfflat or hnsw")
+    async with await psycopg.AsyncConnection.connect(get_db_dsn(), autocommit=True) as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT count(*) FROM document_chunks WHERE embedding IS NOT NULL")
+            rows = int((await cur.fetchone())[0])
+            if kind == "ivfflat":
+                lists = lists or ivfflat_lists_for(rows)
+                with_clause = f"lists = {int(lists)}"
+            else:
+                lists = None
+                with_clause = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+            started = time.perf_counter()
+            await cur.execute(sql.SQL("SET maintenance_work_mem = {}").format(sql.Literal(maintenance_work_mem)))
+            await cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}_new")
+            await cur.execute(f"CREATE INDEX CONCURRENTLY {INDEX_NAME}_new ON document_chunks "
+                              f"USING {kind} (embedding {OPS}) WITH ({with_clause})")
+            await cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}")
+            await cur.execute(f"ALTER INDEX {INDEX_NAME}_new RENAME TO {INDEX_NAME}")
+            elapsed = time.perf_counter() - started
+            await cur.execute(
+                "INSERT INTO ann_index_state (id, kind, lists, m, ef_construction, row_count, built_at, calibration) "
+                "VALUES (true, %s, %s, %s, %s, %s, now(), '[]'::jsonb) "
+                "ON CONFLICT (id) DO UPDATE SET kind = EXCLUDED.kind, lists = EXCLUDED.lists, m = EXCLUDED.m, "
+                "ef_construction = EXCLUDED.ef_construction, row_count = EXCLUDED.row_count, "
+                "built_at = EXCLUDED.built_at, calibration = EXCLUDED.calibration",
+                (kind, lists, m if kind == "hnsw" else None, ef_construction if kind == "hnsw" else None, rows),
+            )
+    await load_state(force=True)
+    return {"kind": kind, "lists": lists, "rows": rows, "build_seconds": round(elapsed, 2)}
+
+def _percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, int(round(p * (len(s) - 1))))]
+
+async def benchmark(k: int = 10, queries: int = 50, sweep: Sequence[int] | None = None,
+              save: bool = True) -> Dict[str, Any]:
+    """Recall@k and latency of the ANN index vs exact search for a sweep of probes/ef_search.
+
+    Query vectors are sampled from stored chunks. Exact neighbours come from a sequential
+    scan (index scans disabled). With `save`, the curve becomes the calibration used by
+    `params_for_recall`.
+    """
+    state = await load_state(force=True)
+    if not state:
+        raise ValueError("no ANN index built yet; run build_index first")
+    knob = "hnsw.ef_search" if state["kind"] == "hnsw" else "ivfflat.probes"
+    if sweep is None:
+        if state["kind"] == "hnsw":
+            sweep = [k, 20, 40, 80, 160, 320]
+        else:
+            lists = int(state["lists"] or 1)
+            sweep = sorted({max(1, min(lists, v)) for v in (1, 2, 4, 8, 16, 32, 64, lists // 4, lists // 2)})
+    sweep = sorted(set(int(v) for v in sweep))
+    search_sql = "SELECT id FROM document_chunks ORDER BY embedding <=> %s LIMIT %s"
+    curve: List[Dict[str, Any]] = []
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT embedding FROM document_chunks WHERE embedding IS NOT NULL "
+                              "ORDER BY random() LIMIT %s", (queries,))
+            qvecs = [r[0] for r in await cur.fetchall()]
+            exact, exact_lat = [], []
+            for q in qvecs:
+                await cur.execute("SET LOCAL enable_indexscan = off")
+                await cur.execute("SET LOCAL statement_timeout = 0")
+                t0 = time.perf_counter()
+                # never prepared: a cached generic plan outlives the GUC change, so the
+                # seqscan plan could be reused by the sweep below (and vice versa)
+                await cur.execute(search_sql, (q, k), prepare=False)
+                exact.append({r[0] for r in await cur.fetchall()})
+                exact_lat.append((time.perf_counter() - t0) * 1000)
+                await conn.rollback()
+            for value in sweep:
+                hits, lat = 0, []
+                for q, truth in zip(qvecs, exact):
+                    await cur.execute(f"SET LOCAL {knob} = {value}")
+                    t0 = time.perf_counter()
+                    await cur.execute(search_sql, (q, k), prepare=False)
+                    got = {r[0] for r in await cur.fetchall()}
+                    lat.append((time.perf_counter() - t0) * 1000)
+                    hits += len(got & truth)
+                    await conn.rollback()
+                denom = sum(len(t) for t in exact) or 1
+                curve.append({"value": value, "recall": round(hits / denom, 4),
+                              "p50_ms": round(_percentile(lat, 0.5), 3), "p95_ms": round(_percentile(lat, 0.95), 3)})
+    if save:
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("UPDATE ann_index_state SET calibration = %s::jsonb WHERE id", (json.dumps(curve),))
+            await conn.commit()
+        await load_state(force=True)
+    return {
+        "kind": state["kind"], "knob": knob, "k": k, "queries": len(qvecs),
+        "exact": {"p50_ms": round(_percentile(exact_lat, 0.5), 3), "p95_ms": round(_percentile(exact_lat, 0.95), 3)},
+        "curve": curve,
+    }
@@ -1,17 +1,21 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
-from typing import Any, Dict
-import uvicorn, logging
-from mcp_tools import MCPRouter
-from minio_utils import ensure_bucket
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import Any, Dict, List
+import asyncio, json, uuid, uvicorn, logging
+from mcp_tools import MCPRouter, MethodNotFound, InvalidParams
+from settings import settings
+from minio_utils import ensure_bucket, upload_queue
 from db_pool import pool
 from logging_config import configure_logging
+import metrics, profiler, result_cache, sampler, site_settings, tracing
 
 configure_logging()
 log = logging.getLogger("mcp_govdocs")
 
 app = FastAPI(title="MCP GovDocs", version="0.2.0")
 router = MCPRouter()
+metrics.registry.register(metrics.PoolCollector(pool))
 
 class JSONRPCRequest(BaseModel):
     jsonrpc: str
@@ -21,35 +25,118 @@ class JSONRPCRequest(BaseModel):
 
 @app.on_event("startup")
 async def startup():
-    # Health check DB
-        ensure_bucket()
-    with pool.connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT 1")
+    # Open the DB pool (fails fast if Postgres is unreachable); warm the MinIO client and bucket memo
+    tracing.setup_tracing("mcp_govdocs")
+    await pool.open(wait=True)
+    site_settings.start_listener()
+    ensure_bucket()
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT 1")
+
+@app.on_event("shutdown")
+async def shutdown():
+    profiler.stop()
+    await sampler.shutdown()
+    await result_cache.cache.close()
+    await upload_queue.close()
+    await site_settings.stop_listener()
+    await pool.close()
 
 @app.get("/healthz")
 async def healthz():
     try:
-        with pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT 1")
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT 1")
         return {"ok": True, "name": "mcp_govdocs"}
     except Exception as e:
         log.exception("DB health check failed")
         return {"ok": False, "error": str(e)}
 
-@app.post("/mcp")
-async def mcp_endpoint(body: JSONRPCRequest):
+@app.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/sample_runs/{run_id}/events")
+async def sample_run_events(run_id: str, after: int = 0):
+    """Server-sent events: one `result` per finished domain, then `done` with the run totals."""
+    try:
+        uuid.UUID(run_id)
+    except ValueError:
+        return Response(status_code=404)
+    if await sampler.progress(run_id, after, limit=0) is None:
+        return Response(status_code=404)
+
+    async def events():
+        cursor = after
+        while True:
+            run = await sampler.progress(run_id, cursor)
+            for r in run["results"]:
+                yield f"event: result\ndata: {json.dumps(r)}\n\n"
+            cursor = run["next"]
+            if run["state"] != "running" and not run["results"]:
+                yield f"event: done\ndata: {json.dumps({k: v for k, v in run.items() if k != 'results'})}\n\n"
+                return
+            if not run["results"]:
+                await asyncio.sleep(1.0)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+def _error(code: int, message: str, id: Any = None) -> Dict[str, Any]:
+    return {"jsonrpc": "2.0", "error": {"code": code, "message": message}, "id": id}
+
+async def _call(body: JSONRPCRequest) -> Dict[str, Any]:
+    timeout = router.timeout_for(body.method)
     try:
-        result = await router.dispatch(body.method, body.params or {})
+        result = await asyncio.wait_for(router.dispatch(body.method, body.params or {}), timeout=timeout)
         return {"jsonrpc": "2.0", "result": result, "id": body.id}
-    except router.MethodNotFound as e:
-        return {"jsonrpc": "2.0", "error": {"code": -32601, "message": str(e)}, "id": body.id}
-    except router.InvalidParams as e:
-        return {"jsonrpc": "2.0", "error": {"code": -32602, "message": str(e)}, "id": body.id}
-    except Exception as e:
-        log.exception("Internal error")
-        return {"jsonrpc": "2.0", "error": {"code": -32603, "message": "Internal error"}, "id": body.id}
+    except MethodNotFound as e:
+        return _error(-32601, str(e), body.id)
+    except InvalidParams as e:
+        return _error(-32602, str(e), body.id)
+    except asyncio.TimeoutError:
+        return _error(-32000, f"Timeout after {timeout:g}s", body.id)
+    except Exception:
+        log.exception("Internal error in %s", body.method)
+        return _error(-32603, "Internal error", body.id)
+
+async def _handle(item: Any, limit: asyncio.Semaphore | None = None) -> Dict[str, Any] | None:
+    """One request object -> response, or None for a notification (no "id" member)."""
+    try:
+        body = JSONRPCRequest.model_validate(item)
+    except ValidationError as e:
+        return _error(-32600, f"Invalid Request: {e.errors()[0]['msg']}", item.get("id") if isinstance(item, dict) else None)
+    if limit is None:
+        resp = await _call(body)
+    else:
+        async with limit:
+            resp = await _call(body)
+    return resp if "id" in body.model_fields_set else None
+
+@app.post("/mcp")
+async def mcp_endpoint(request: Request):
+    """JSON-RPC 2.0 single call or batch array.
+
+    Batch members are dispatched concurrently (at most MCP_BATCH_CONCURRENCY at once), each
+    under its own timeout; failures are reported per member and never fail the batch.
+    """
+    try:
+        payload = json.loads(await request.body())
+    except ValueError:
+        return _error(-32700, "Parse error")
+    if not isinstance(payload, list):
+        resp = await _handle(payload)
+        return resp if resp is not None else Response(status_code=204)
+    if not payload:
+        return _error(-32600, "Invalid Request: empty batch")
+    if len(payload) > settings.mcp_batch_max:
+        return _error(-32600, f"Invalid Request: batch exceeds {settings.mcp_batch_max} calls")
+    limit = asyncio.Semaphore(settings.mcp_batch_concurrency)
+    responses: List[Dict[str, Any] | None] = await asyncio.gather(*(_handle(item, limit) for item in payload))
+    out = [r for r in responses if r is not None]
+    return out if out else Response(status_code=204)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,371 @@
+"""Bulk ingest of a pre-downloaded corpus (directory, .tar[.gz|.bz2|.xz] or .zip) plus manifest.
+
+    python -m bulk_ingest /data/bulk/govinfo-2024.tar.gz --manifest manifest.jsonl --domain www.govinfo.gov
+
+The manifest (JSONL, or CSV with a header) has one row per file: `path` (required, relative
+to the source), and optionally `url`, `domain`, `title`, `doc_type`, `content_type`,
+`published_at`. Without one, every file is ingested under `--domain` with a file:// URL.
+
+Files are parsed in a process pool, objects go to MinIO through the shared upload queue,
+and rows are loaded with COPY into a staging table and inserted in one transaction per batch.
+"""
+from __future__ import annotations
+import argparse, asyncio, csv, hashlib, io, json, logging, os, posixpath, tarfile, time, zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Tuple
+import metrics, ocr, result_cache
+from config_loader import load_settings_for
+from db_pool import pool
+from minio_utils import ensure_bucket, upload_queue
+from settings import settings
+
+log = logging.getLogger("mcp_govdocs.bulk_ingest")
+
+MAX_FILE_BYTES = 200 * 1024 * 1024
+MANIFEST_NAMES = ("manifest.jsonl", "manifest.csv")
+
+Entry = Dict[str, Any]
+
+class _ByteBudget:
+    """Bytes of files read but not yet parsed and queued. acquire() waits while the budget is
+    spent; a file larger than the whole budget still goes through, alone."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self, n: int) -> None:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.used == 0 or self.used + n <= self.limit)
+            self.used += n
+
+    async def release(self, n: int) -> None:
+        async with self._cond:
+            self.used -= n
+            self._cond.notify_all()
+
+def _read_manifest(data: bytes, name: str) -> List[Entry]:
+    text = data.decode("utf-8-sig")
+    if name.endswith(".csv"):
+        rows = list(csv.DictReader(io.StringIO(text)))
+    else:
+        rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+    out = []
+    for row in rows:
+        if not row.get("path"):
+            raise ValueError(f"manifest row without path: {row}")
+        out.append({k: v for k, v in row.items() if v not in (None, "")})
+    return out
+
+def _norm(path: str) -> str:
+    path = path.replace("\\", "/")
+    while path.startswith("./"):
+        path = path[2:]
+    return path.lstrip("/")
+
+def _escapes(name: str) -> bool:
+    """Archive member or manifest path that climbs out of the source (`..` after normalizing)."""
+    norm = posixpath.normpath(_norm(name))
+    return norm == ".." or norm.startswith("../")
+
+def _inside(root: str, name: str) -> str | None:
+    """Real path of `name` under directory `root`, or None if it resolves outside it (.., symlinks)."""
+    root = os.path.realpath(root)
+    full = os.path.realpath(os.path.join(root, _norm(name)))
+    return full if full.startswith(root + os.sep) else None
+
+def iter_source(source: str, manifest: List[Entry] | None) -> Iterator[Tuple[Entry, bytes]]:
+    """Yield (manifest entry, file bytes). Archives are read in a single streaming pass."""
+    wanted = {_norm(e["path"]): e for e in manifest} if manifest is not None else None
+
+    def entry_for(name: str) -> Entry | None:
+        name = _norm(name)
+        if name in MANIFEST_NAMES:
+            return None
+        if _escapes(name):
+            log.warning("skipping %s: outside the source", name)
+            return None
+        if wanted is None:
+            return {"path": name}
+        return wanted.pop(name, None)
+
+    if os.path.isdir(source):
+        if wanted is not None:
+            for name, entry in list(wanted.items()):
+                full = _inside(source, name)
+                if full is None:
+                    log.warning("skipping %s: outside the source", name)
+                    continue
+                try:
+                    with open(full, "rb") as f:
+                        data = f.read(MAX_FILE_BYTES + 1)
+                except OSError as e:
+                    log.warning("skipping %s: %s", name, e)
+                    continue
+                del wanted[name]
+                yield entry, data
+            return
+        for root, _, files in os.walk(source):
+            for fn in sorted(files):
+                full = os.path.join(root, fn)
+                entry = entry_for(os.path.relpath(full, source))
+                if entry is not None and _inside(source, entry["path"]) is None:  # symlink out of the tree
+                    log.warning("skipping %s: outside the source", entry["path"])
+                elif entry is not None:
+                    with open(full, "rb") as f:
+                        yield entry, f.read(MAX_FILE_BYTES + 1)
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and (entry := entry_for(info.filename)) is not None:
+                    with zf.open(info) as f:
+                        yield entry, f.read(MAX_FILE_BYTES + 1)
+    else:
+        with tarfile.open(source, mode="r|*") as tf:
+            for member in tf:
+                if member.isfile() and (entry := entry_for(member.name)) is not None:
+                    f = tf.extractfile(member)
+                    if f is not None:
+                        yield entry, f.read(MAX_FILE_BYTES + 1)
+    if wanted:
+        log.warning("%d manifest paths not found in %s", len(wanted), source)
+
+def load_manifest(source: str, manifest: str | None) -> List[Entry] | None:
+    """Explicit manifest path, else manifest.jsonl/.csv at the top of a directory or zip."""
+    if manifest:
+        with open(manifest, "rb") as f:
+            return _read_manifest(f.read(), manifest)
+    if os.path.isdir(source):
+        for name in MANIFEST_NAMES:
+            path = os.path.join(source, name)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    return _read_manifest(f.read(), name)
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as zf:
+            for name in MANIFEST_NAMES:
+                if name in zf.namelist():
+                    return _read_manifest(zf.read(name), name)
+    return None
+
+def _timestamp(value: Any) -> datetime | None:
+    """Manifest published_at -> datetime (ISO 8601 date or timestamp); ValueError if unparsable."""
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        raise ValueError(f"unparsable published_at: {value!r}") from None
+
+def parse_file(path: str, content_type: str, raw: bytes) -> Dict[str, Any]:
+    """Runs in the process pool: type detection + text extraction (same normalizers as crawl)."""
+    from fetcher import normalize_html, normalize_pdf
+    lower = path.lower()
+    if "pdf" in content_type or lower.endswith(".pdf"):
+        title, text = normalize_pdf(raw)
+        doc_type, ext, raw_ct = "pdf", "pdf", "application/pdf"
+    elif content_type.startswith("text/plain") or lower.endswith(".txt"):
+        title, text = "", raw.decode("utf-8", errors="ignore")
+        doc_type, ext, raw_ct = "text", "txt", "text/plain"
+    else:
+        title, text = normalize_html(raw)
+        doc_type, ext, raw_ct = "html", "html", content_type or "text/html"
+    return {"title": title, "text": text, "doc_type": doc_type, "ext": ext, "raw_ct": raw_ct,
+            "sha": hashlib.sha256(raw).hexdigest()}
+
+STAGE_COLUMNS = ("domain", "url", "doc_type", "title", "published_at", "content_hash", "storage_uri",
+                 "provenance", "text", "needs_ocr")
+
+async def copy_batch(rows: List[Tuple]) -> int:
+    """COPY rows into a staging table, then insert new documents + text in one transaction.
+
+    Returns how many documents were new (the rest already existed by (url, content_hash)).
+    """
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SET LOCAL statement_timeout = 0")
+            await cur.execute(
+                "CREATE TEMP TABLE bulk_stage (domain text, url text, doc_type text, title text, "
+                "published_at timestamptz, content_hash text, storage_uri text, provenance jsonb, text text, "
+                "needs_ocr boolean) "
+                "ON COMMIT DROP"
+            )
+            async with cur.copy(f"COPY bulk_stage ({', '.join(STAGE_COLUMNS)}) FROM STDIN") as copy:
+                for row in rows:
+                    await copy.write_row(row)
+            await cur.execute("INSERT INTO gov_domains (domain) SELECT DISTINCT domain FROM bulk_stage "
+                              "ON CONFLICT (domain) DO NOTHING")
+            await cur.execute(
+                """
+                WITH ins AS (
+                    INSERT INTO documents (domain, url, doc_type, title, published_at, content_hash, storage_uri, provenance)
+                    SELECT domain, url, doc_type, title, published_at, content_hash, storage_uri, provenance FROM bulk_stage
+                    ON CONFLICT DO NOTHING
+                    RETURNING id, domain, url, content_hash
+                ), txt AS (
+                    INSERT INTO document_text (doc_id, text)
+                    SELECT ins.id, s.text FROM ins JOIN bulk_stage s USING (url, content_hash)
+                    ON CONFLICT (doc_id) DO NOTHING
+                ), ocr AS (
+                    INSERT INTO ocr_queue (doc_id)
+                    SELECT ins.id FROM ins JOIN bulk_stage s USING (url, content_hash) WHERE s.needs_ocr
+                    ON CONFLICT (doc_id) DO NOTHING
+                ), counts AS (
+                    UPDATE gov_domains g SET docs_count = COALESCE(g.docs_count, 0) + c.n, last_crawled = now()
+                    FROM (SELECT domain, count(*) AS n FROM ins GROUP BY domain) c WHERE g.domain = c.domain
+                )
+                SELECT count(*) FROM ins
+                """
+            )
+            inserted = int((await cur.fetchone())[0])
+        await conn.commit()
+    if inserted:
+        await result_cache.invalidate_docs(r[0] for r in rows)
+    return inserted
+
+async def bulk_ingest(source: str, manifest: str | None = None, domain: str | None = None,
+                      workers: int | None = None, batch_size: int = 1000) -> Dict[str, Any]:
+    entries = load_manifest(source, manifest)
+    conf = load_settings_for(domain)
+    storage = conf.get("storage", {})
+    raw_prefix, text_prefix = storage.get("raw_prefix", "raw"), storage.get("text_prefix", "text")
+    compress = bool(storage.get("compress_text", False))
+    ocr_conf = ocr.ocr_config(conf)
+    bucket = ensure_bucket()
+    workers = workers or os.cpu_count() or 4
+    loop = asyncio.get_running_loop()
+    inflight = asyncio.Semaphore(workers * 4)  # bounds fan-out: files being parsed/uploaded
+    budget = _ByteBudget(settings.bulk_ingest_max_inflight_bytes)  # bounds memory held by those files
+    flush_lock = asyncio.Lock()
+    pending: List[Tuple] = []
+    pending_bytes = 0  # text held by rows waiting for the next flush
+    seen: set = set()
+    stats = {"files": 0, "ingested": 0, "duplicates": 0, "errors": 0, "bytes": 0}
+    errors: List[Dict[str, str]] = []
+    t0 = time.perf_counter()
+
+    def failed(path: str, e: Exception) -> None:
+        stats["errors"] += 1
+        if len(errors) < 20:
+            errors.append({"path": path, "error": str(e)})
+
+    async def flush() -> None:
+        nonlocal pending_bytes
+        async with flush_lock:
+            if not pending:
+                return
+            rows = pending[:]
+            pending.clear()
+            pending_bytes = 0
+            lost = 0
+            with metrics.stage("db", "bulk"):
+                try:
+                    inserted = await copy_batch([r[:-1] for r in rows])
+                except Exception as e:
+                    # find the bad rows instead of losing the batch
+                    log.warning("bulk batch of %d failed (%s); retrying row by row", len(rows), e)
+                    inserted = 0
+                    for row in rows:
+                        try:
+                            inserted += await copy_batch([row[:-1]])
+                        except Exception as row_error:
+                            failed(row[-1], row_error)
+                            lost += 1
+            stats["ingested"] += inserted
+            stats["duplicates"] += len(rows) - lost - inserted
+
+    async def process(entry: Entry, raw: bytes) -> None:
+        nonlocal pending_bytes
+        try:
+            dom = entry.get("domain") or domain
+            if not dom:
+                raise ValueError("no domain (manifest column or --domain)")
+            published_at = _timestamp(entry.get("published_at"))  # before anything is uploaded
+            if len(raw) > MAX_FILE_BYTES:
+                raise ValueError("file too large")
+            parsed = await loop.run_in_executor(executor, parse_file, entry["path"],
+                                                entry.get("content_type", ""), raw)
+            url = entry.get("url") or f"file:///{_norm(entry['path'])}"
+            sha = parsed["sha"]
+            if (url, sha) in seen:
+                stats["duplicates"] += 1
+                return
+            seen.add((url, sha))
+            text_bytes = parsed["text"].encode("utf-8")
+            raw_key, _ = await upload_queue.put_many(
+                [(bucket, f"{raw_prefix}/{dom}/{sha}.{parsed['ext']}", raw, parsed["raw_ct"]),
+                 (bucket, f"{text_prefix}/{dom}/{sha}.txt", text_bytes, "text/plain; charset=utf-8")],
+                compress=compress,
+            )
+            metrics.ingest_bytes.labels(dom, "raw").inc(len(raw))
+            metrics.ingest_bytes.labels(dom, "text").inc(len(text_bytes))
+            stats["bytes"] += len(raw)
+            provenance = {"adapter": "bulk", "source": os.path.basename(source), "path": entry["path"],
+                          "fetched_at": int(time.time())}
+            pending.append((dom, url, entry.get("doc_type") or parsed["doc_type"],
+                            entry.get("title") or parsed["title"] or url.rsplit("/", 1)[-1],
+                            published_at, sha, f"s3://{bucket}/{raw_key}",
+                            json.dumps(provenance), parsed["text"].replace("\x00", ""),
+                            parsed["doc_type"] == "pdf" and ocr_conf["enabled"]
+                            and ocr.needs_ocr(parsed["text"], ocr_conf["min_chars_per_page"]),
+                            entry["path"]))  # last: for error reports, not loaded
+            pending_bytes += len(text_bytes)
+            if len(pending) >= batch_size or pending_bytes >= budget.limit // 4:
+                await flush()
+        except Exception as e:
+            failed(entry.get("path", ""), e)
+        finally:
+            await budget.release(len(raw))
+            inflight.release()
+
+    tasks: set = set()
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        it = iter_source(source, entries)
+        while True:
+            await inflight.acquire()
+            item = await asyncio.to_thread(next, it, None)  # disk / archive reads off the loop
+            if item is None:
+                inflight.release()
+                break
+            await budget.acquire(len(item[1]))
+            stats["files"] += 1
+            task = asyncio.create_task(process(*item))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*list(tasks))
+    except BaseException:
+        # cancelled or failed: don't block the event loop waiting for queued parses
+        for t in list(tasks):
+            t.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    await asyncio.to_thread(executor.shutdown)
+    await flush()
+    elapsed = time.perf_counter() - t0
+    return {**stats, "seconds": round(elapsed, 1),
+            "docs_per_minute": round(stats["ingested"] * 60 / elapsed, 1) if elapsed else None,
+            "error_samples": errors}
+
+async def _main(argv: List[str] | None = None) -> None:
+    from logging_config import configure_logging
+    ap = argparse.ArgumentParser(prog="python -m bulk_ingest", description=__doc__.splitlines()[0])
+    ap.add_argument("source", help="directory, tar(.gz/.bz2/.xz) or zip")
+    ap.add_argument("--manifest", help="JSONL or CSV manifest (default: manifest.jsonl/.csv in the source)")
+    ap.add_argument("--domain", help="domain for rows without one")
+    ap.add_argument("--workers", type=int, help="parser processes (default: CPU count)")
+    ap.add_argument("--batch-size", type=int, default=1000)
+    args = ap.parse_args(argv)
+    configure_logging()
+    await pool.open(wait=True)
+    try:
+        result = await bulk_ingest(args.source, args.manifest, args.domain, args.workers, args.batch_size)
+    finally:
+        await upload_queue.close()
+        await pool.close()
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(_main())
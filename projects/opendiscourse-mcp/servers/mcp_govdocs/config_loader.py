@@ -1,6 +1,16 @@
 from __future__ import annotations
-import os, yaml
-from typing import Dict, Any
+import os, re, yaml
+from typing import Dict, Any, Tuple
+
+# ${VAR} / ${VAR:-default}
+_ENV_RE = re.compile(r"\$\{([^}:]+)(:-([^}]*))?\}")
+
+BASE_DIR = os.path.dirname(__file__)
+
+# path -> (mtime_ns, size, parsed+expanded data); re-read only when the file changes
+_yaml_cache: Dict[str, Tuple[int, int, Dict[str, Any]]] = {}
+# domain -> (default stamp, site stamp, merged settings)
+_merged_cache: Dict[str, Tuple[Tuple[int, int], Tuple[int, int], Dict[str, Any]]] = {}
 
 def deep_merge(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
     out = dict(a)
@@ -11,32 +21,57 @@ def deep_merge(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
             out[k] = v
     return out
 
+def _repl(m: re.Match) -> str:
+    return os.environ.get(m.group(1), m.group(3) or "")
+
+def expand(val: Any) -> Any:
+    """Env expansion of ${VAR:-default} in every string of a parsed YAML tree."""
+    if isinstance(val, str):
+        return _ENV_RE.sub(_repl, val) if "${" in val else val
+    if isinstance(val, dict):
+        return {k: expand(v) for k, v in val.items()}
+    if isinstance(val, list):
+        return [expand(x) for x in val]
+    return val
+
+def _stamp(path: str) -> Tuple[int, int]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return (0, -1)
+    return (st.st_mtime_ns, st.st_size)
+
 def load_yaml(path: str) -> Dict[str, Any]:
-    if not os.path.exists(path):
-        return {}
-    with open(path, "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f) or {}
-    # env expansion of ${VAR:-default} simple form
-    def expand(val):
-        import re
-        if isinstance(val, str):
-            pattern = r"\$\{([^}:]+)(:-([^}]*))?\}"
-            def repl(m):
-                var = m.group(1); default = m.group(3) or ""
-                return os.environ.get(var, default)
-            return re.sub(pattern, repl, val)
-        if isinstance(val, dict):
-            return {k: expand(v) for k, v in val.items()}
-        if isinstance(val, list):
-            return [expand(x) for x in val]
-        return val
-    return expand(data)
+    stamp = _stamp(path)
+    cached = _yaml_cache.get(path)
+    if cached and cached[:2] == stamp:
+        return cached[2]
+    if stamp[1] < 0:
+        data: Dict[str, Any] = {}
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data = expand(yaml.safe_load(f) or {})
+    _yaml_cache[path] = (*stamp, data)
+    return data
 
 def load_settings_for(domain: str | None = None) -> Dict[str, Any]:
-    base_dir = os.path.dirname(__file__)
-    default = load_yaml(os.path.join(base_dir, "config", "default.yml"))
-    if domain:
-        site_path = os.path.join(base_dir, "config", "sites", f"{domain}.yml")
-        site = load_yaml(site_path)
-        return deep_merge(default, site)
-    return default
+    """File settings (default.yml + sites/<domain>.yml), cached until either file changes.
+
+    The returned dict is shared between callers: treat it as read-only.
+    """
+    default_path = os.path.join(BASE_DIR, "config", "default.yml")
+    key = domain or ""
+    site_path = os.path.join(BASE_DIR, "config", "sites", f"{domain}.yml") if domain else ""
+    d_stamp = _stamp(default_path)
+    s_stamp = _stamp(site_path) if domain else (0, -1)
+    cached = _merged_cache.get(key)
+    if cached and cached[0] == d_stamp and cached[1] == s_stamp:
+        return cached[2]
+    default = load_yaml(default_path)
+    merged = deep_merge(default, load_yaml(site_path)) if domain else default
+    _merged_cache[key] = (d_stamp, s_stamp, merged)
+    return merged
+
+def clear_cache() -> None:
+    _yaml_cache.clear()
+    _merged_cache.clear()
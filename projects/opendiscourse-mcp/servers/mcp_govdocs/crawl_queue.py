@@ -0,0 +1,236 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Tuple
+from db_pool import pool
+from learner import SitemapEntry
+
+MAX_ATTEMPTS = 3
+LEASE = "15 minutes"  # a running row not renewed for this long belongs to a dead worker
+
+# Lowest pending seqs for the domain; rows another worker holds are skipped, not waited on.
+CLAIM_SQL = """
+UPDATE crawl_queue q SET state = 'running', attempts = q.attempts + 1, claimed_at = now()
+FROM (SELECT domain, seq FROM crawl_queue
+      WHERE domain = %s AND state = 'pending'
+      ORDER BY seq LIMIT %s
+      FOR UPDATE SKIP LOCKED) c
+WHERE q.domain = c.domain AND q.seq = c.seq
+RETURNING q.seq, q.url
+"""
+
+async def is_seeded(domain: str) -> bool:
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT seeded_at IS NOT NULL FROM crawl_cursors WHERE domain = %s", (domain,))
+            row = await cur.fetchone()
+    return bool(row and row[0])
+
+async def enqueue(domain: str, entries: Iterable[str | SitemapEntry], sitemap: SitemapEntry | None = None) -> int:
+    """Append URLs in order; ones already queued for the domain are ignored. Returns rows added.
+
+    With `sitemap`, the sitemap is recorded as enumerated in the same transaction.
+    """
+    entries = [SitemapEntry(e) if isinstance(e, str) else e for e in entries]
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "INSERT INTO crawl_queue (domain, url, lastmod, changefreq) "
+                "SELECT %s, u, m, f FROM unnest(%s::text[], %s::timestamptz[], %s::text[]) "
+                "WITH ORDINALITY AS t(u, m, f, n) ORDER BY n ON CONFLICT DO NOTHING",
+                (domain, [e.loc for e in entries], [e.lastmod for e in entries], [e.changefreq for e in entries]),
+            )
+            added = max(cur.rowcount, 0)
+            await cur.execute(
+                "INSERT INTO crawl_cursors (domain, total) VALUES (%s, %s) "
+                "ON CONFLICT (domain) DO UPDATE SET total = crawl_cursors.total + EXCLUDED.total",
+                (domain, added),
+            )
+            if sitemap is not None:
+                await cur.execute(
+                    "INSERT INTO sitemap_walk (domain, sitemap, lastmod, urls) VALUES (%s, %s, %s, %s) "
+                    "ON CONFLICT (domain, sitemap) DO UPDATE SET lastmod = EXCLUDED.lastmod, "
+                    "urls = EXCLUDED.urls, finished_at = now()",
+                    (domain, sitemap.loc, sitemap.lastmod, len(entries)),
+                )
+        await conn.commit()
+    return added
+
+async def walked_sitemaps(domain: str) -> Dict[str, Any]:
+    """sitemap -> lastmod for the domain's already enumerated page sitemaps."""
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT sitemap, lastmod FROM sitemap_walk WHERE domain = %s", (domain,))
+            return {r[0]: r[1] for r in await cur.fetchall()}
+
+async def mark_seeded(domain: str, added: int) -> None:
+    """Record a finished sitemap walk; `added` new URLs adapt how soon the next walk is due."""
+    import recrawl
+    async with pool.connection() as conn:
+        cur = await conn.execute("SELECT reseed_days FROM crawl_cursors WHERE domain = %s", (domain,))
+        row = await cur.fetchone()
+        days = recrawl.next_reseed_days(float(row[0]), added) if row else 1.0
+        await conn.execute(
+            "INSERT INTO crawl_cursors (domain, seeded_at, reseed_days) VALUES (%s, now(), %s) "
+            "ON CONFLICT (domain) DO UPDATE SET seeded_at = now(), reseed_days = EXCLUDED.reseed_days",
+            (domain, days),
+        )
+        await conn.commit()
+
+async def claim(domain: str, limit: int) -> List[Tuple[int, str]]:
+    """Mark up to `limit` pending URLs as running for this worker and return (seq, url)."""
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "UPDATE crawl_queue SET state = 'pending' "
+                "WHERE domain = %s AND state = 'running' AND claimed_at < now() - %s::interval",
+                (domain, LEASE),
+            )
+            await cur.execute(CLAIM_SQL, (domain, limit), prepare=True)
+            rows = await cur.fetchall()
+        await conn.commit()
+    return [(int(r[0]), r[1]) for r in rows]
+
+async def finish(domain: str, results: Dict[int, str | None], final: Iterable[int] = (),
+                 changed: Iterable[int] = (), conf: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    """Record outcomes ({seq: error or None}). Failed URLs go back to pending until MAX_ATTEMPTS;
+    seqs in `final` (e.g. disallowed by robots.txt) fail at once. Fetched URLs get their next
+    visit scheduled from their change history (`changed` = content hash differed).
+
+    Returns the domain's progress (pos = URLs in a final state, total = URLs queued).
+    """
+    import recrawl
+    final = set(final)
+    ok = [s for s, err in results.items() if err is None]
+    failed = [(s, err) for s, err in results.items() if err is not None]
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            finished = 0
+            if ok:
+                finished += await recrawl.record_visits(cur, domain, ok, changed, recrawl.recrawl_config(conf or {}))
+            for seq, err in failed:
+                await cur.execute(
+                    "UPDATE crawl_queue SET last_error = %s, "
+                    "state = CASE WHEN attempts >= %s OR %s THEN 'failed' ELSE 'pending' END "
+                    "WHERE domain = %s AND seq = %s AND state = 'running' RETURNING state",
+                    (err[:2000], MAX_ATTEMPTS, seq in final, domain, seq),
+                )
+                row = await cur.fetchone()
+                finished += 1 if row and row[0] == "failed" else 0
+            await cur.execute(
+                "UPDATE crawl_cursors SET pos = pos + %s, last_run = now() WHERE domain = %s RETURNING pos, total",
+                (finished, domain),
+            )
+            row = await cur.fetchone()
+        await conn.commit()
+    pos, total = (int(row[0]), int(row[1])) if row else (0, 0)
+    return {"pos": pos, "total": total, "done": pos >= total}
+
+# --- jobs (run_crawl_batch -> worker.py) ---
+
+JOB_COLUMNS = "id::text, domain, url_limit, vectorize, state, attempted, ingested, result, created_at, finished_at"
+
+def _job(row) -> Dict[str, Any]:
+    keys = ("job_id", "domain", "limit", "vectorize", "state", "attempted", "ingested", "result",
+            "created_at", "finished_at")
+    job = dict(zip(keys, row))
+    for k in ("created_at", "finished_at"):
+        job[k] = job[k].isoformat() if job[k] else None
+    return job
+
+async def submit_job(domain: str, limit: int, vectorize: bool) -> Dict[str, Any]:
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "INSERT INTO gov_domains (domain) VALUES (%s) ON CONFLICT (domain) DO NOTHING", (domain,)
+            )
+            await cur.execute(
+                f"INSERT INTO crawl_jobs (domain, url_limit, vectorize) VALUES (%s, %s, %s) RETURNING {JOB_COLUMNS}",
+                (domain, limit, vectorize),
+            )
+            row = await cur.fetchone()
+        await conn.commit()
+    return _job(row)
+
+async def get_job(job_id: str) -> Dict[str, Any] | None:
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(f"SELECT {JOB_COLUMNS} FROM crawl_jobs WHERE id = %s::uuid", (job_id,))
+            row = await cur.fetchone()
+    return _job(row) if row else None
+
+async def claim_job(worker: str, lease_s: int) -> Tuple[str, str, int, bool] | None:
+    """Oldest queued job (or one whose worker stopped heartbeating) -> (id, domain, limit, vectorize)."""
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "UPDATE crawl_jobs j SET state = 'running', worker = %s, heartbeat_at = now() "
+                "FROM (SELECT id FROM crawl_jobs "
+                "      WHERE state = 'queued' "
+                "         OR (state = 'running' AND heartbeat_at < now() - make_interval(secs => %s)) "
+                "      ORDER BY created_at LIMIT 1 FOR UPDATE SKIP LOCKED) c "
+                "WHERE j.id = c.id RETURNING j.id::text, j.domain, j.url_limit, j.vectorize",
+                (worker, lease_s),
+                prepare=True,
+            )
+            row = await cur.fetchone()
+        await conn.commit()
+    return (row[0], row[1], int(row[2]), bool(row[3])) if row else None
+
+async def heartbeat_job(job_id: str, worker: str, attempted: int, ingested: int,
+                        domain: str, seqs: Iterable[int] = ()) -> bool:
+    """Renew the job's lease and that of the URL rows it holds (`seqs`, claimed but not yet
+    finished); False once another worker has taken the job over (stop working on it)."""
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "UPDATE crawl_jobs SET heartbeat_at = now(), attempted = %s, ingested = %s "
+                "WHERE id = %s::uuid AND worker = %s AND state = 'running' RETURNING 1",
+                (attempted, ingested, job_id, worker),
+                prepare=True,
+            )
+            owned = await cur.fetchone() is not None
+            seqs = list(seqs)
+            if owned and seqs:
+                await cur.execute(
+                    "UPDATE crawl_queue SET claimed_at = now() "
+                    "WHERE domain = %s AND seq = ANY(%s) AND state = 'running'",
+                    (domain, seqs),
+                )
+        await conn.commit()
+    return owned
+
+async def finish_job(job_id: str, worker: str, state: str, result: Dict[str, Any]) -> bool:
+    """Record the job's outcome unless it has been handed to another worker meanwhile."""
+    import json
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "UPDATE crawl_jobs SET state = %s, result = %s::jsonb, attempted = %s, ingested = %s, "
+                "finished_at = now(), heartbeat_at = now() "
+                "WHERE id = %s::uuid AND worker = %s AND state = 'running' RETURNING 1",
+                (state, json.dumps(result, default=str), int(result.get("attempted", 0)),
+                 int(result.get("ingested", 0)), job_id, worker),
+            )
+            owned = await cur.fetchone() is not None
+        await conn.commit()
+    return owned
+
+async def reserve_slot(domain: str, interval_ms: int) -> float:
+    """Book the domain's next fetch slot; returns seconds to wait before fetching.
+
+    The row lock serializes callers, so workers on any host space requests `interval_ms`
+    apart without holding a lock (or a connection) while they sleep.
+    """
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "INSERT INTO crawl_rate AS r (domain, next_at) "
+                "VALUES (%(d)s, clock_timestamp() + make_interval(secs => %(s)s)) "
+                "ON CONFLICT (domain) DO UPDATE "
+                "SET next_at = GREATEST(r.next_at, clock_timestamp()) + make_interval(secs => %(s)s) "
+                "RETURNING extract(epoch FROM (r.next_at - make_interval(secs => %(s)s) - clock_timestamp()))",
+                {"d": domain, "s": interval_ms / 1000.0},
+                prepare=True,
+            )
+            wait = float((await cur.fetchone())[0])
+        await conn.commit()
+    return max(wait, 0.0)
@@ -1,4 +1,24 @@
-from psycopg_pool import ConnectionPool
+from psycopg_pool import AsyncConnectionPool
+from pgvector.psycopg import register_vector_async
 from settings import settings
 
-pool = ConnectionPool(f"postgresql://{settings.postgres_user}:{settings.postgres_password}@{settings.postgres_host}:{settings.postgres_port}/{settings.postgres_db}", max_size=10)
+async def _configure(conn) -> None:
+    # numpy arrays <-> pgvector `vector` (text and binary COPY) on every pooled connection
+    await register_vector_async(conn)
+    await conn.commit()
+
+# Opened by the app/worker at startup (`await pool.open()`), never at import time.
+# statement_timeout bounds every pooled query; long jobs lift it with SET LOCAL.
+pool = AsyncConnectionPool(
+    f"postgresql://{settings.postgres_user}:{settings.postgres_password}@{settings.postgres_host}:{settings.postgres_port}/{settings.postgres_db}",
+    min_size=settings.db_pool_min_size,
+    max_size=settings.db_pool_max_size,
+    timeout=settings.db_pool_timeout_s,
+    kwargs={
+        "options": f"-c statement_timeout={settings.db_statement_timeout_ms}",
+        "prepare_threshold": settings.db_prepare_threshold,
+    },
+    configure=_configure,
+    open=False,
+    name="govdocs",
+)
@@ -0,0 +1,105 @@
+from __future__ import annotations
+import os, re, zlib
+from functools import lru_cache
+from typing import List, Protocol, Sequence, Tuple
+import numpy as np
+
+# (start_char, end_char, content) — offsets index into the original document text
+Chunk = Tuple[int, int, str]
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+def chunk_text(text: str, size: int = 1200, overlap: int = 200) -> List[Chunk]:
+    """Split `text` into ~`size`-char windows overlapping by `overlap` chars.
+
+    Window ends are pulled back to the last whitespace in the second half of the window
+    so words are not cut; whitespace-only windows are dropped.
+    """
+    if size <= 0:
+        raise ValueError("chunk size must be positive")
+    overlap = max(0, min(overlap, size // 2))
+    chunks: List[Chunk] = []
+    n = len(text)
+    start = 0
+    while start < n:
+        end = min(start + size, n)
+        if end < n:
+            cut = text.rfind(" ", start + size // 2, end)
+            cut = max(cut, text.rfind("\n", start + size // 2, end))
+            if cut > start:
+                end = cut
+        piece = text[start:end]
+        if piece.strip():
+            chunks.append((start, end, piece))
+        if end >= n:
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+class Embedder(Protocol):
+    name: str
+    dim: int
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Return a float32 (len(texts), dim) matrix of L2-normalized rows."""
+        ...
+
+
+class HashingEmbedder:
+    """Signed feature-hashing bag of words with sublinear term frequency.
+
+    Dependency-free fallback: deterministic across processes (crc32, not hash()) so
+    stored chunks and later queries land in the same space.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = _TOKEN_RE.findall(text.lower())
+            if not tokens:
+                continue
+            h = np.fromiter((zlib.crc32(t.encode()) for t in tokens), dtype=np.uint32, count=len(tokens))
+            sign = np.where(h & 0x80000000, -1.0, 1.0)
+            out[row] = np.bincount((h % self.dim).astype(np.intp), weights=sign, minlength=self.dim)
+        out = np.sign(out) * np.log1p(np.abs(out))
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (out / norms).astype(np.float32)
+
+
+class SentenceTransformerEmbedder:
+    """Local sentence-transformers model, loaded once per process on CPU."""
+
+    def __init__(self, model_name: str, dim: int, batch_size: int = 64):
+        from sentence_transformers import SentenceTransformer
+
+        self.name = model_name
+        self.model = SentenceTransformer(model_name, device=os.environ.get("EMBED_DEVICE", "cpu"))
+        self.dim = int(self.model.get_sentence_embedding_dimension())
+        if self.dim != dim:
+            raise ValueError(f"model {model_name} produces {self.dim}-dim vectors, column expects {dim}")
+        self.batch_size = batch_size
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vecs = self.model.encode(list(texts), batch_size=self.batch_size, normalize_embeddings=True,
+                                 convert_to_numpy=True, show_progress_bar=False)
+        return np.asarray(vecs, dtype=np.float32)
+
+
+@lru_cache(maxsize=1)
+def get_embedder() -> Embedder:
+    """Embedder configured by `embedding.*` in default.yml (EMBED_MODEL env overrides)."""
+    from config_loader import load_settings_for
+
+    cfg = load_settings_for().get("embedding", {})
+    dim = int(cfg.get("dim", 256))
+    model = os.environ.get("EMBED_MODEL", cfg.get("model") or "")
+    if model:
+        return SentenceTransformerEmbedder(model, dim, batch_size=int(cfg.get("batch_size", 64)))
+    return HashingEmbedder(dim)
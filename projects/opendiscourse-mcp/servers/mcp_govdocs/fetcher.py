@@ -1,13 +1,13 @@
 from __future__ import annotations
-import httpx, hashlib, time, uuid, os
+import asyncio, httpx, hashlib, json, time, uuid, os
 from bs4 import BeautifulSoup
 from readability import Document as ReadabilityDocument
 from pdfminer.high_level import extract_text as pdf_extract_text
 from io import BytesIO
 from typing import Dict, Any, Tuple
 from db_pool import pool
-from minio_utils import ensure_bucket, put_object_bytes
-from config_loader import load_settings_for
+from minio_utils import ensure_bucket, upload_queue
+import metrics, ocr, patterns, profiler, result_cache, site_settings
 
 async def fetch_url(url: str, user_agent: str) -> Tuple[bytes, str, Dict[str, str]]:
     async with httpx.AsyncClient(timeout=30.0, follow_redirects=True, headers={"User-Agent": user_agent}) as client:
@@ -32,10 +32,14 @@ def normalize_pdf(content: bytes) -> Tuple[str, str]:
     title = ""
     return title, text
 
+@profiler.attributed
 async def ingest_url(domain: str, url: str) -> Dict[str, Any]:
-    settings = load_settings_for(domain)
+    settings = await site_settings.effective(domain)
+    profiler.sync(domain, settings)
     ua = settings.get("user_agent", "OpenDiscourseGovDocs/0.1")
-    raw, ctype, headers = await fetch_url(url, ua)
+    with metrics.stage("fetch", domain):
+        raw, ctype, headers = await fetch_url(url, ua)
+    metrics.ingest_bytes.labels(domain, "raw").inc(len(raw))
     sha = hashlib.sha256(raw).hexdigest()
     bucket = ensure_bucket()
     raw_prefix = settings.get("storage", {}).get("raw_prefix", "raw")
@@ -43,12 +47,24 @@ async def ingest_url(domain: str, url: str) -> Dict[str, Any]:
 
     # Determine type & normalize
     if "pdf" in ctype or url.lower().endswith(".pdf"):
-        title, text = normalize_pdf(raw)
+        with metrics.stage("pdfminer", domain):
+            title, text = await asyncio.to_thread(profiler.tagged(domain, normalize_pdf), raw)
         ext = "pdf"
         doc_type = "pdf"
         raw_ct = "application/pdf"
     else:
-        title, text = normalize_html(raw)
+        # learned site profile first; readability only for unknown sites or pages it doesn't fit
+        compiled = await patterns.profile_for(domain)
+        fast = None
+        if compiled:
+            with metrics.stage("extract", domain):
+                fast = await asyncio.to_thread(profiler.tagged(domain, patterns.extract), raw, compiled)
+        if fast:
+            title, text = fast
+        else:
+            with metrics.stage("readability", domain):
+                title, text = await asyncio.to_thread(profiler.tagged(domain, normalize_html), raw)
+        extractor = "profile" if fast else "readability"
         ext = "html"
         doc_type = "html"
         raw_ct = ctype or "text/html"
@@ -56,29 +72,57 @@ async def ingest_url(domain: str, url: str) -> Dict[str, Any]:
     # Store raw and text
     raw_key = f"{raw_prefix}/{domain}/{sha}.{ext}"
     text_key = f"{text_prefix}/{domain}/{sha}.txt"
-    put_object_bytes(bucket, raw_key, raw, raw_ct)
-    put_object_bytes(bucket, text_key, text.encode("utf-8"), "text/plain; charset=utf-8")
+    compress = bool(settings.get("storage", {}).get("compress_text", False))
+    text_bytes = text.encode("utf-8")
+    metrics.ingest_bytes.labels(domain, "text").inc(len(text_bytes))
+    with metrics.stage("store", domain):
+        raw_key, text_key = await upload_queue.put_many(
+            [(bucket, raw_key, raw, raw_ct), (bucket, text_key, text_bytes, "text/plain; charset=utf-8")],
+            compress=compress,
+        )
 
     # Insert DB rows
     storage_uri = f"s3://{bucket}/{raw_key}"
     provenance = {"content_type": ctype, "headers": headers, "fetched_at": int(time.time())}
-    with pool.connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
+    if doc_type == "html":
+        provenance["extractor"] = extractor
+    with metrics.stage("db", domain):
+        doc_id = await _insert(domain, url, doc_type, title, sha, storage_uri, provenance, text)
+    if doc_id is None:
+        metrics.ingest_documents.labels(domain, "duplicate").inc()
+        return {"ingested": 0, "reason": "duplicate"}
+    metrics.ingest_documents.labels(domain, "ingested").inc()
+    await result_cache.invalidate_docs([domain])
+    result = {"ingested": 1, "doc_id": str(doc_id), "raw_key": raw_key, "text_key": text_key}
+    ocr_conf = ocr.ocr_config(settings)
+    if doc_type == "pdf" and ocr_conf["enabled"] and ocr.needs_ocr(text, ocr_conf["min_chars_per_page"]):
+        # scanned PDF: keep what pdfminer found now, OCR later in a worker
+        await ocr.enqueue(doc_id)
+        result["ocr"] = "queued"
+    return result
+
+async def _insert(domain: str, url: str, doc_type: str, title: str, sha: str, storage_uri: str,
+                  provenance: Dict[str, Any], text: str):
+    """documents + document_text rows; returns the new id, or None for a duplicate."""
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
                 "INSERT INTO documents (domain, url, doc_type, title, content_hash, storage_uri, provenance) "
                 "VALUES (%s,%s,%s,%s,%s,%s,%s::jsonb) "
                 "ON CONFLICT DO NOTHING RETURNING id",
                 (domain, url, doc_type, title or url.rsplit('/',1)[-1], sha, storage_uri, json.dumps(provenance)),
+                prepare=True,
             )
-            row = cur.fetchone()
+            row = await cur.fetchone()
             if row:
                 doc_id = row[0]
-                cur.execute(
+                await cur.execute(
                     "INSERT INTO document_text (doc_id, text) VALUES (%s, %s) ON CONFLICT (doc_id) DO NOTHING",
                     (doc_id, text),
+                    prepare=True,
                 )
                 # Update gov_domains stats
-                cur.execute("UPDATE gov_domains SET docs_count = COALESCE(docs_count,0)+1, last_crawled = now() WHERE domain = %s", (domain,))
-                conn.commit()
-                return {"ingested": 1, "doc_id": str(doc_id), "raw_key": raw_key, "text_key": text_key}
-    return {"ingested": 0, "reason": "duplicate"}
+                await cur.execute("UPDATE gov_domains SET docs_count = COALESCE(docs_count,0)+1, last_crawled = now() WHERE domain = %s", (domain,))
+                await conn.commit()
+                return doc_id
+    return None
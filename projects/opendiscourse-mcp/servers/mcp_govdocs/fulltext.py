@@ -0,0 +1,105 @@
+from __future__ import annotations
+import base64, json
+from typing import Any, Dict, List, Tuple
+from db_pool import pool
+
+TS_CONFIG = "english"  # must match 0006_fulltext.sql
+TITLE_WEIGHT = 2.0
+
+# Candidate ids come from each GIN index separately (an OR across two tables could not
+# use both), then ranks are summed per document and paged by (rank, id).
+FTS_SQL = f"""
+WITH q AS (SELECT websearch_to_tsquery('{TS_CONFIG}', %(query)s) AS q),
+hits AS (
+    SELECT d.id, ts_rank(d.title_tsv, q.q) * {TITLE_WEIGHT} AS r FROM documents d, q WHERE d.title_tsv @@ q.q
+    UNION ALL
+    SELECT t.doc_id, ts_rank(t.tsv, q.q) FROM document_text t, q WHERE t.tsv @@ q.q
+),
+ranked AS (SELECT id, sum(r)::float8 AS rank FROM hits GROUP BY id)
+SELECT d.id::text, d.url, d.title, d.doc_type,
+       COALESCE(to_char(d.retrieved_at, 'YYYY-MM-DD"T"HH24:MI:SS'), ''), r.rank
+FROM ranked r JOIN documents d ON d.id = r.id
+WHERE %(after_rank)s::float8 IS NULL OR (r.rank, d.id) < (%(after_rank)s::float8, %(after_id)s::uuid)
+ORDER BY r.rank DESC, d.id DESC
+LIMIT %(limit)s
+"""
+
+# Substring match on title/url (served by the optional pg_trgm indexes), newest first.
+TRGM_SQL = """
+SELECT d.id::text, d.url, d.title, d.doc_type,
+       COALESCE(to_char(d.retrieved_at, 'YYYY-MM-DD"T"HH24:MI:SS'), ''), extract(epoch FROM d.retrieved_at)::float8
+FROM documents d
+WHERE (d.title ILIKE %(pattern)s OR d.url ILIKE %(pattern)s)
+  AND (%(after_rank)s::float8 IS NULL
+       OR (extract(epoch FROM d.retrieved_at)::float8, d.id) < (%(after_rank)s::float8, %(after_id)s::uuid))
+ORDER BY extract(epoch FROM d.retrieved_at)::float8 DESC, d.id DESC
+LIMIT %(limit)s
+"""
+
+def encode_cursor(mode: str, rank: float, doc_id: str) -> str:
+    raw = json.dumps([mode, rank, doc_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, float, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        mode, rank, doc_id = json.loads(raw)
+        return str(mode), float(rank), str(doc_id)
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {e}") from e
+
+def _like_pattern(query: str) -> str:
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+async def search(cur, query: str, limit: int = 25, cursor: str | None = None) -> Dict[str, Any]:
+    """Ranked full-text search with keyset paging; substring fallback when FTS finds nothing.
+
+    The returned `next_cursor` pins the mode, so later pages stay on the same ordering.
+    """
+    mode, after_rank, after_id = ("fts", None, None)
+    if cursor:
+        mode, after_rank, after_id = decode_cursor(cursor)
+    params = {"query": query, "pattern": _like_pattern(query), "limit": limit,
+              "after_rank": after_rank, "after_id": after_id}
+    rows: List[tuple] = []
+    if mode == "fts":
+        await cur.execute(FTS_SQL, params, prepare=True)
+        rows = await cur.fetchall()
+        if not rows and not cursor:
+            mode = "trigram"
+    if mode == "trigram":
+        await cur.execute(TRGM_SQL, params)
+        rows = await cur.fetchall()
+    items = [{"id": r[0], "url": r[1], "title": r[2], "doc_type": r[3], "retrieved_at": r[4],
+              "rank": r[5] if mode == "fts" else None} for r in rows]
+    next_cursor = encode_cursor(mode, rows[-1][5], rows[-1][0]) if len(rows) == limit else None
+    return {"items": items, "mode": mode, "next_cursor": next_cursor}
+
+async def backfill(batch_size: int = 1000, max_batches: int | None = None) -> Dict[str, Any]:
+    """Fill document_text.tsv for rows loaded before 0006_fulltext.sql, one commit per batch.
+
+    SKIP LOCKED lets several backfills (or ingests) run side by side without waiting.
+    """
+    updated = batches = 0
+    while max_batches is None or batches < max_batches:
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SET LOCAL statement_timeout = 0")
+                await cur.execute(
+                    "UPDATE document_text t SET tsv = document_text_tsv(t.text) "
+                    "WHERE t.doc_id IN (SELECT doc_id FROM document_text WHERE tsv IS NULL "
+                    "                   LIMIT %s FOR UPDATE SKIP LOCKED)",
+                    (batch_size,),
+                )
+                n = cur.rowcount
+            await conn.commit()
+        if n <= 0:
+            break
+        updated += n
+        batches += 1
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT count(*) FROM document_text WHERE tsv IS NULL")
+            remaining = int((await cur.fetchone())[0])
+    return {"updated": updated, "batches": batches, "remaining": remaining}
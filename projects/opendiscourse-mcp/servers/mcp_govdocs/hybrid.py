@@ -0,0 +1,149 @@
+from __future__ import annotations
+import asyncio, time
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+from db_pool import pool
+from fulltext import TITLE_WEIGHT, TS_CONFIG
+
+RRF_K = 60
+
+def rrf_fuse(rankings: Mapping[str, Sequence[str]], k: int = RRF_K,
+             weights: Mapping[str, float] | None = None) -> List[Tuple[str, float, Dict[str, int]]]:
+    """Reciprocal rank fusion: score(d) = sum_s w_s / (k + rank_s(d)), ranks 1-based.
+
+    Returns (id, score, {source: rank}) sorted by score, ties broken by id for stability.
+    """
+    scores: Dict[str, float] = {}
+    ranks: Dict[str, Dict[str, int]] = {}
+    for source, ids in rankings.items():
+        w = (weights or {}).get(source, 1.0)
+        for rank, doc_id in enumerate(ids, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + w / (k + rank)
+            ranks.setdefault(doc_id, {})[source] = rank
+    fused = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+    return [(doc_id, score, ranks[doc_id]) for doc_id, score in fused]
+
+def filter_sql(alias: str, domain: str | None, doc_type: str | None, date_from: str | None,
+               date_to: str | None) -> Tuple[str, Dict[str, Any]]:
+    """AND-ed predicates on a `documents` alias; dates apply to published_at, else retrieved_at."""
+    clauses, params = [], {}
+    if domain:
+        clauses.append(f"{alias}.domain = %(f_domain)s")
+        params["f_domain"] = domain
+    if doc_type:
+        clauses.append(f"{alias}.doc_type = %(f_doc_type)s")
+        params["f_doc_type"] = doc_type
+    if date_from:
+        clauses.append(f"COALESCE({alias}.published_at, {alias}.retrieved_at) >= %(f_from)s::timestamptz")
+        params["f_from"] = date_from
+    if date_to:
+        clauses.append(f"COALESCE({alias}.published_at, {alias}.retrieved_at) < %(f_to)s::timestamptz")
+        params["f_to"] = date_to
+    return "".join(f" AND {c}" for c in clauses), params
+
+async def _fts_leg(query: str, limit: int, filters: Dict[str, Any]) -> Tuple[List[str], float]:
+    where, params = filter_sql("d", **filters)
+    sql = f"""
+    WITH q AS (SELECT websearch_to_tsquery('{TS_CONFIG}', %(query)s) AS q),
+    hits AS (
+        SELECT d.id, ts_rank(d.title_tsv, q.q) * {TITLE_WEIGHT} AS r
+        FROM documents d, q WHERE d.title_tsv @@ q.q{where}
+        UNION ALL
+        SELECT d.id, ts_rank(t.tsv, q.q)
+        FROM document_text t JOIN documents d ON d.id = t.doc_id, q WHERE t.tsv @@ q.q{where}
+    )
+    SELECT id::text FROM hits GROUP BY id ORDER BY sum(r) DESC, id LIMIT %(limit)s
+    """
+    t0 = time.perf_counter()
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(sql, {"query": query, "limit": limit, **params})
+            ids = [r[0] for r in await cur.fetchall()]
+    return ids, (time.perf_counter() - t0) * 1000
+
+async def _vector_leg(qvec, limit: int, recall: float, filters: Dict[str, Any]) -> Tuple[List[str], Dict[str, str], float]:
+    from ann_index import apply_search_params
+    where, params = filter_sql("d", **filters)
+    # Filters are applied to the ANN candidates, so over-fetch chunks when filtering and
+    # keep each document's best chunk.
+    chunk_limit = limit * (8 if params else 3)
+    sql = f"""
+    SELECT c.doc_id::text, left(c.content, 300)
+    FROM document_chunks c JOIN documents d ON d.id = c.doc_id
+    WHERE c.embedding IS NOT NULL{where}
+    ORDER BY c.embedding <=> %(qvec)s LIMIT %(chunk_limit)s
+    """
+    t0 = time.perf_counter()
+    ids: List[str] = []
+    snippets: Dict[str, str] = {}
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await apply_search_params(cur, recall, chunk_limit)
+            await cur.execute(sql, {"qvec": qvec, "chunk_limit": chunk_limit, **params})
+            for doc_id, snippet in await cur.fetchall():
+                if doc_id not in snippets:
+                    snippets[doc_id] = snippet
+                    ids.append(doc_id)
+    return ids[:limit], snippets, (time.perf_counter() - t0) * 1000
+
+async def _hydrate(ids: Sequence[str]) -> Dict[str, Tuple]:
+    if not ids:
+        return {}
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT id::text, url, title, doc_type, domain, "
+                "COALESCE(to_char(COALESCE(published_at, retrieved_at), 'YYYY-MM-DD\"T\"HH24:MI:SS'), '') "
+                "FROM documents WHERE id = ANY(%s::uuid[])",
+                (list(ids),),
+            )
+            return {r[0]: r for r in await cur.fetchall()}
+
+async def hybrid_search(query: str, top_k: int = 10, candidates: int = 50, recall: float = 0.9,
+                        rrf_k: int = RRF_K, filters: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    """Full-text and vector legs run concurrently on their own pooled connections, then RRF."""
+    from embeddings import get_embedder
+    filters = filters or {}
+    timings: Dict[str, float] = {}
+    t_start = time.perf_counter()
+    qvec = (await asyncio.to_thread(get_embedder().embed, [query]))[0]
+    timings["embed_ms"] = (time.perf_counter() - t_start) * 1000
+    fts_res, vec_res = await asyncio.gather(
+        _fts_leg(query, candidates, filters),
+        _vector_leg(qvec, candidates, recall, filters),
+        return_exceptions=True,
+    )
+    errors: Dict[str, str] = {}
+    fts_ids: List[str] = []
+    vec_ids: List[str] = []
+    snippets: Dict[str, str] = {}
+    if isinstance(fts_res, BaseException):
+        errors["fts"] = str(fts_res)
+    else:
+        fts_ids, timings["fts_ms"] = fts_res
+    if isinstance(vec_res, BaseException):
+        errors["vector"] = str(vec_res)
+    else:
+        vec_ids, snippets, timings["vector_ms"] = vec_res
+    if len(errors) == 2:
+        raise RuntimeError(f"both retrieval legs failed: {errors}")
+    t0 = time.perf_counter()
+    fused = rrf_fuse({"fts": fts_ids, "vector": vec_ids}, k=rrf_k)[:top_k]
+    timings["fuse_ms"] = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    rows = await _hydrate([doc_id for doc_id, _, _ in fused])
+    timings["hydrate_ms"] = (time.perf_counter() - t0) * 1000
+    items = []
+    for doc_id, score, ranks in fused:
+        row = rows.get(doc_id)
+        if not row:
+            continue
+        items.append({"doc_id": doc_id, "url": row[1], "title": row[2], "doc_type": row[3], "domain": row[4],
+                      "date": row[5], "score": round(score, 6), "ranks": ranks, "snippet": snippets.get(doc_id)})
+    timings["total_ms"] = (time.perf_counter() - t_start) * 1000
+    return {
+        "items": items,
+        "mode": "hybrid",
+        "candidates": {"fts": len(fts_ids), "vector": len(vec_ids)},
+        "timings": {k: round(v, 2) for k, v in timings.items()},
+        "errors": errors or None,
+    }
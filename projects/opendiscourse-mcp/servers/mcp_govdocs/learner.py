@@ -1,10 +1,17 @@
-import httpx, re, urllib.parse, xml.etree.ElementTree as ET
-from typing import List, Dict
+from __future__ import annotations
+import asyncio, hashlib, httpx, logging, re, urllib.parse, zlib, xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Iterable, List, NamedTuple, Set, Tuple
+
+log = logging.getLogger("mcp_govdocs.learner")
+
+USER_AGENT = "OpenDiscourseGovDocs/0.1"
+MAX_SITEMAP_BYTES = 200 * 1024 * 1024  # decompressed; the protocol allows 50 MB per file
 
 async def fetch_text(url: str, timeout: float = 15.0) -> str | None:
     try:
         async with httpx.AsyncClient(follow_redirects=True, timeout=timeout) as client:
-            r = await client.get(url, headers={"User-Agent": "OpenDiscourseGovDocs/0.1"})
+            r = await client.get(url, headers={"User-Agent": USER_AGENT})
             if r.status_code == 200 and r.text:
                 return r.text
     except Exception:
@@ -12,14 +19,9 @@ async def fetch_text(url: str, timeout: float = 15.0) -> str | None:
     return None
 
 async def discover_sitemaps(domain: str) -> List[str]:
-    base = f"https://{domain}"
-    robots = await fetch_text(f"{base}/robots.txt")
-    sitemaps: List[str] = []
-    if robots:
-        for line in robots.splitlines():
-            if line.lower().startswith("sitemap:"):
-                sm = line.split(":", 1)[1].strip()
-                sitemaps.append(sm)
+    import robots
+    base = robots.origin(domain)
+    sitemaps: List[str] = list((await robots.get_rules(domain)).sitemaps)
     if not sitemaps:
         # try common locations
         for p in ["/sitemap.xml", "/sitemap_index.xml"]:
@@ -33,37 +35,177 @@ async def discover_sitemaps(domain: str) -> List[str]:
             seen.add(nu); out.append(nu)
     return out
 
+class SitemapEntry(NamedTuple):
+    loc: str
+    lastmod: datetime | None = None
+    changefreq: str | None = None
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+def _parse_lastmod(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+    # date-only values are naive; compare everything as UTC
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+class SitemapParser:
+    """Incremental <urlset>/<sitemapindex> parser: feed raw (optionally gzipped) chunks and
+    collect pages/child sitemaps as they complete, without holding the whole document."""
+
+    def __init__(self) -> None:
+        self._xml = ET.XMLPullParser(events=("start", "end"))
+        self._gunzip: zlib._Decompress | None = None
+        self._first = True
+        self._root: ET.Element | None = None
+        self.size = 0
+        self.pages: List[SitemapEntry] = []
+        self.sitemaps: List[SitemapEntry] = []
+
+    def feed(self, chunk: bytes) -> None:
+        if self._first:
+            self._first = False
+            if chunk[:2] == b"\x1f\x8b":  # .xml.gz served without Content-Encoding
+                self._gunzip = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self._gunzip is not None:
+            chunk = self._gunzip.decompress(chunk)
+        self.size += len(chunk)
+        if self.size > MAX_SITEMAP_BYTES:
+            raise ValueError("sitemap too large")
+        self._xml.feed(chunk)
+        self._drain()
+
+    def close(self) -> None:
+        if self._gunzip is not None:
+            self._xml.feed(self._gunzip.flush())
+        self._xml.close()
+        self._drain()
+
+    def _drain(self) -> None:
+        for event, elem in self._xml.read_events():
+            if event == "start":
+                if self._root is None:
+                    self._root = elem
+                continue
+            name = _local(elem.tag)
+            if name not in ("url", "sitemap"):
+                continue
+            fields = {_local(c.tag): (c.text or "").strip() for c in elem}
+            if fields.get("loc"):
+                entry = SitemapEntry(fields["loc"], _parse_lastmod(fields.get("lastmod")),
+                                     fields.get("changefreq") or None)
+                (self.pages if name == "url" else self.sitemaps).append(entry)
+            # drop finished entries so memory stays flat on 50k-URL files
+            if self._root is not None:
+                self._root.clear()
+
 def parse_sitemap(xml_text: str) -> List[str]:
-    urls: List[str] = []
+    """Page and child-sitemap URLs of one sitemap document (child sitemaps first)."""
+    parser = SitemapParser()
     try:
-        root = ET.fromstring(xml_text)
-        ns = {"sm": "http://www.sitemaps.org/schemas/sitemap/0.9"}
-        # sitemapindex
-        for loc in root.findall(".//sm:sitemap/sm:loc", ns):
-            urls.append(loc.text.strip())
-        # urlset
-        for loc in root.findall(".//sm:url/sm:loc", ns):
-            urls.append(loc.text.strip())
-    except Exception:
+        parser.feed(xml_text.encode("utf-8"))
+        parser.close()
+    except (ET.ParseError, ValueError):
         pass
-    return urls[:5000]  # cap
+    return [e.loc for e in parser.sitemaps + parser.pages][:5000]  # cap
+
+async def fetch_sitemap(client: httpx.AsyncClient, url: str) -> Tuple[List[SitemapEntry], List[SitemapEntry]]:
+    """Stream one sitemap (plain or gzipped) -> (pages, child sitemaps)."""
+    parser = SitemapParser()
+    async with client.stream("GET", url) as r:
+        r.raise_for_status()
+        async for chunk in r.aiter_bytes():
+            parser.feed(chunk)
+    parser.close()
+    return parser.pages, parser.sitemaps
+
+def url_key(url: str) -> int:
+    """64-bit fingerprint used by the walker's seen-set (far smaller than the URL strings)."""
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "little")
 
+async def walk_sitemaps(domain: str, roots: Iterable[str] | None = None, *, concurrency: int = 8,
+                        max_urls: int | None = None, done: Dict[str, datetime | None] | None = None,
+                        ) -> AsyncIterator[Tuple[SitemapEntry, List[SitemapEntry]]]:
+    """Walk sitemap indexes recursively, fetching up to `concurrency` sitemaps at once.
+
+    Yields (sitemap, new pages) once per page sitemap that was read in full, pages
+    de-duplicated across the whole walk; indexes are re-read on every walk and not yielded.
+    `done` maps page sitemaps finished by an earlier walk to the lastmod they had then; they
+    are skipped unless their index reports a newer lastmod, so a caller that records each
+    yielded sitemap can resume an interrupted enumeration.
+    """
+    done = done or {}
+    if roots is None:
+        roots = await discover_sitemaps(domain)
+    todo: asyncio.Queue[SitemapEntry | None] = asyncio.Queue()
+    out: asyncio.Queue[Tuple[SitemapEntry, List[SitemapEntry]] | None] = asyncio.Queue(maxsize=concurrency)
+    queued: Set[int] = set()
+    seen: Set[int] = set()
+    pending = 0
+
+    def push(entry: SitemapEntry) -> None:
+        nonlocal pending
+        key = url_key(entry.loc)
+        if key in queued:
+            return
+        queued.add(key)
+        if entry.loc in done and (entry.lastmod is None or done[entry.loc] is None
+                                  or entry.lastmod <= done[entry.loc]):
+            return
+        pending += 1
+        todo.put_nowait(entry)
+
+    async def fetcher(client: httpx.AsyncClient) -> None:
+        nonlocal pending
+        while (sm := await todo.get()) is not None:
+            try:
+                pages, children = await fetch_sitemap(client, sm.loc)
+            except Exception as e:
+                log.warning("sitemap %s skipped: %s", sm.loc, e)
+                pages, children = None, []
+            for child in children:
+                push(child._replace(loc=urllib.parse.urljoin(sm.loc, child.loc)))
+            if pages is not None and not children:
+                await out.put((sm, pages))
+            pending -= 1
+            if pending == 0:
+                await out.put(None)
+
+    for url in roots:
+        push(SitemapEntry(url))
+    if not pending:
+        return
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(follow_redirects=True, timeout=30.0, limits=limits,
+                                 headers={"User-Agent": USER_AGENT}) as client:
+        tasks = [asyncio.create_task(fetcher(client)) for _ in range(concurrency)]
+        emitted = 0
+        try:
+            while (item := await out.get()) is not None:
+                sm, pages = item
+                fresh = []
+                for p in pages:
+                    key = url_key(p.loc)
+                    if key not in seen:
+                        seen.add(key)
+                        fresh.append(p)
+                if max_urls is not None:
+                    fresh = fresh[: max_urls - emitted]
+                emitted += len(fresh)
+                yield sm, fresh
+                if max_urls is not None and emitted >= max_urls:
+                    break
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
 async def build_url_list(domain: str, max_urls: int = 5000) -> list[str]:
-    sitemaps = await discover_sitemaps(domain)
     urls: list[str] = []
-    for sm in sitemaps:
-        xml = await fetch_text(sm)
-        if not xml:
-            continue
-        urls.extend(parse_sitemap(xml))
-        if len(urls) >= max_urls:
-            break
-    # de-dup but keep order
-    seen = set()
-    de_duplicated = []
-    for u in urls:
-        if u not in seen:
-            seen.add(u)
-            de_duplicated.append(u)
-    return de_duplicated[:max_urls]
+    async for _, pages in walk_sitemaps(domain, max_urls=max_urls):
+        urls.extend(p.loc for p in pages)
+    return urls
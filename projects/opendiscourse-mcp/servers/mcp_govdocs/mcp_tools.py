@@ -1,11 +1,22 @@
-from typing import Any, Dict
+from typing import Any, Dict, List
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from db_pool import pool
 import hashlib, json, time
+import psycopg, logging
+import metrics, result_cache, tracing
+from result_cache import cached
+
+log = logging.getLogger("mcp_govdocs.tools")
 
 class MethodNotFound(Exception): ...
 class InvalidParams(Exception): ...
 
+def long_running(fn):
+    """Tool that works through a whole corpus or index in-process: exempt from MCP_CALL_TIMEOUT_S,
+    bounded by MCP_LONG_CALL_TIMEOUT_S instead (0 = no limit)."""
+    fn.long_running = True
+    return fn
+
 class MCPRouter:
     def __init__(self):
         self.tools = {
@@ -14,65 +25,110 @@ class MCPRouter:
             "learn_patterns": self.learn_patterns,
             "run_crawl": self.run_crawl,
             "search_docs": self.search_docs,
-                "get_site_settings": self.get_site_settings,
-                "set_site_settings": self.set_site_settings,
-                "crawl_sample": self.crawl_sample,
-                "run_crawl_batch": self.run_crawl_batch,
-                "semantic_search": self.semantic_search,
-                "learn_robots_sitemaps": self.learn_robots_sitemaps,
-                "vectorize_doc": self.vectorize_doc,
+            "get_site_settings": self.get_site_settings,
+            "set_site_settings": self.set_site_settings,
+            "crawl_sample": self.crawl_sample,
+            "crawl_samples": self.crawl_samples,
+            "get_sample_run": self.get_sample_run,
+            "run_crawl_batch": self.run_crawl_batch,
+            "get_crawl_job": self.get_crawl_job,
+            "bulk_ingest": self.bulk_ingest,
+            "rank_domains": self.rank_domains,
+            "refresh_domain_scores": self.refresh_domain_scores,
+            "semantic_search": self.semantic_search,
+            "hybrid_search": self.hybrid_search,
+            "learn_robots_sitemaps": self.learn_robots_sitemaps,
+            "vectorize_doc": self.vectorize_doc,
+            "revectorize_docs": self.revectorize_docs,
+            "backfill_search_vectors": self.backfill_search_vectors,
+            "build_vector_index": self.build_vector_index,
+            "benchmark_vector_index": self.benchmark_vector_index,
         }
 
+    def timeout_for(self, method: str) -> float | None:
+        """Seconds a call may run before it is cancelled; None = no limit."""
+        from settings import settings
+        if getattr(self.tools.get(method), "long_running", False):
+            return settings.mcp_long_call_timeout_s or None
+        return settings.mcp_call_timeout_s or None
+
     async def dispatch(self, method: str, params: Dict[str, Any]):
         if method not in self.tools:
             raise MethodNotFound(f"Unknown tool: {method}")
-        try:
-            return await self.tools[method](**params)
-        except TypeError as e:
-            raise InvalidParams(str(e))
+        status = "error"
+        t0 = time.perf_counter()
+        with tracing.span(f"mcp.{method}", **{"mcp.tool": method, "mcp.domain": params.get("domain")}):
+            try:
+                fn = self.tools[method]
+                ttl_s = getattr(fn, "cache_ttl_s", None)
+                if ttl_s:
+                    tags = fn.cache_tags(params) if callable(fn.cache_tags) else list(fn.cache_tags)
+                    result = await result_cache.cache.get_or_call(method, params, ttl_s, tags, lambda: fn(**params))
+                else:
+                    result = await fn(**params)
+                status = "ok"
+                return result
+            except TypeError as e:
+                status = "invalid_params"
+                raise InvalidParams(str(e))
+            except InvalidParams:
+                status = "invalid_params"
+                raise
+            finally:
+                metrics.tool_seconds.labels(method, status).observe(time.perf_counter() - t0)
 
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=0.2), reraise=True)
     async def evaluate_domain(self, domain: str) -> Dict[str, Any]:
         score = 0.9 if domain.endswith(".gov") else 0.2
-        with pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     """                        INSERT INTO gov_domains (domain, gov_level, reliability_score, coverage_score)
                     VALUES (%s, %s, %s, %s)
                     ON CONFLICT (domain) DO UPDATE SET reliability_score = EXCLUDED.reliability_score
                     RETURNING domain, reliability_score, coverage_score
                     """, (domain, "federal", score, 0.5),
                 )
-                row = cur.fetchone()
+                row = await cur.fetchone()
         return {"domain": row[0], "reliability_score": float(row[1]), "coverage_score": float(row[2])}
 
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=0.2), reraise=True)
     async def approve_domain(self, domain: str) -> Dict[str, Any]:
-        with pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("UPDATE gov_domains SET coverage_score = 1.0 WHERE domain = %s", (domain,))
-                conn.commit()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("UPDATE gov_domains SET coverage_score = 1.0 WHERE domain = %s", (domain,))
+                await conn.commit()
         return {"domain": domain, "approved": True}
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=0.2), reraise=True)
-    async def learn_patterns(self, domain: str) -> Dict[str, Any]:
-        profile = {
-            "selectors": {"title": "h1", "content": "article"},
-            "pagination": {"mode": "link-next", "selector": "a[rel=next]"},
-            "file_types": ["pdf", "html", "json"],
-        }
+    @long_running
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=0.2), reraise=True,
+           retry=retry_if_exception_type(psycopg.OperationalError))
+    async def learn_patterns(self, domain: str, sample_pages: int | None = None) -> Dict[str, Any]:
+        """Fetch sample pages and learn title/content/pagination selectors; ingest then extracts
+        with them instead of running readability (see patterns.py)."""
+        import patterns, site_settings
+        if sample_pages is not None and not 1 <= sample_pages <= 100:
+            raise InvalidParams("sample_pages must be between 1 and 100")
+        learned = await patterns.learn(domain, await site_settings.effective(domain), sample_pages)
+        if not learned["learned"]["pages"]:
+            raise InvalidParams(f"no HTML sample pages could be fetched for {domain}")
+        profile = {**learned, "file_types": ["pdf", "html", "json"]}
         profile_str = json.dumps(profile, sort_keys=True)
         profile_hash = hashlib.sha256(profile_str.encode()).hexdigest()
-        with pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                # merge: keeps the sitemaps/samples written by learn_robots_sitemaps
+                await cur.execute(
                     """                        INSERT INTO site_profiles (domain, profile, profile_hash)
                     VALUES (%s, %s::jsonb, %s)
-                    ON CONFLICT (domain) DO UPDATE SET profile = EXCLUDED.profile, profile_hash = EXCLUDED.profile_hash
+                    ON CONFLICT (domain) DO UPDATE SET profile = site_profiles.profile || EXCLUDED.profile,
+                        profile_hash = EXCLUDED.profile_hash, learned_at = now()
                     """, (domain, profile_str, profile_hash),
                 )
-                conn.commit()
-        return {"domain": domain, "profile_hash": profile_hash}
+                await conn.commit()
+        patterns.invalidate(domain)
+        return {"domain": domain, "profile_hash": profile_hash, "selectors": profile["selectors"],
+                "pagination": profile["pagination"], "learned": profile["learned"]}
 
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=0.2), reraise=True)
     async def run_crawl(self, domain: str, limit: int = 1) -> Dict[str, Any]:
@@ -80,249 +136,296 @@ class MCPRouter:
         content_hash = hashlib.sha256(doc_url.encode()).hexdigest()
         storage_uri = f"s3://opendiscourse/raw/{content_hash}.txt"
         provenance = {"adapter": "stub", "fetched_at": int(time.time())}
-        with pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     """                        INSERT INTO documents (domain, url, doc_type, title, content_hash, storage_uri, provenance)
                     VALUES (%s, %s, %s, %s, %s, %s, %s::jsonb)
                     ON CONFLICT DO NOTHING
                     RETURNING id
                     """, (domain, doc_url, "press_release", "Stub Document", content_hash, storage_uri, json.dumps(provenance)),
                 )
-                new_id = cur.fetchone()
-                conn.commit()
+                new_id = await cur.fetchone()
+                await conn.commit()
+        if new_id:
+            await result_cache.invalidate_docs([domain])
         return {"ingested": 1 if new_id else 0}
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=0.2), reraise=True)
-    async def search_docs(self, query: str) -> Dict[str, Any]:
-        q = f"%{query}%"
-        with pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """                        SELECT id::text, url, title, doc_type, COALESCE(to_char(retrieved_at, 'YYYY-MM-DD"T"HH24:MI:SS'), '')
-                    FROM documents
-                    WHERE title ILIKE %s OR url ILIKE %s
-                    ORDER BY retrieved_at DESC NULLS LAST
-                    LIMIT 25
-                    """, (q, q),
-                )
-                rows = cur.fetchall()
-        items = [{"id": r[0], "url": r[1], "title": r[2], "doc_type": r[3], "retrieved_at": r[4]} for r in rows]
-        return {"items": items}
+    @cached(60, ["docs:*"])
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=0.2), reraise=True,
+           retry=retry_if_exception_type(psycopg.OperationalError))
+    async def search_docs(self, query: str, limit: int = 25, cursor: str | None = None) -> Dict[str, Any]:
+        """Ranked full-text search over titles and text; pass `next_cursor` back for the next page."""
+        import fulltext
+        limit = max(1, min(int(limit), 100))
+        try:
+            async with pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    return await fulltext.search(cur, query, limit=limit, cursor=cursor)
+        except ValueError as e:
+            raise InvalidParams(str(e))
 
+    @long_running
+    async def backfill_search_vectors(self, batch_size: int = 1000, max_batches: int | None = None) -> Dict[str, Any]:
+        """Fill document_text.tsv for rows ingested before full-text search existed."""
+        import fulltext
+        return await fulltext.backfill(batch_size, max_batches)
 
-async def learn_robots_sitemaps(self, domain: str) -> Dict[str, Any]:
-    from learner import discover_sitemaps, fetch_text, parse_sitemap
-    # Discover sitemap URLs
-    sitemaps = await discover_sitemaps(domain)
-    discovered = []
-    for sm in sitemaps[:10]:
-        xml = await fetch_text(sm)
-        if xml:
-            discovered.extend(parse_sitemap(xml))
-    profile = {
-        "sitemaps": sitemaps,
-        "samples": discovered[:50],
-    }
-    import json, hashlib
-    profile_str = json.dumps(profile, sort_keys=True)
-    profile_hash = hashlib.sha256(profile_str.encode()).hexdigest()
-    with pool.connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """                        INSERT INTO site_profiles (domain, profile, profile_hash)
-                VALUES (%s, %s::jsonb, %s)
-                ON CONFLICT (domain) DO UPDATE SET profile = EXCLUDED.profile, profile_hash = EXCLUDED.profile_hash
-                """, (domain, profile_str, profile_hash),
-            )
-            conn.commit()
-    return {"domain": domain, "sitemaps": sitemaps, "profile_hash": profile_hash}
 
-async def vectorize_doc(self, doc_id: str | None = None, text: str | None = None) -> Dict[str, Any]:
-    # Lightweight 256-dim hashing embedding to keep deps minimal
-    def embed(s: str) -> list[float]:
-        dim = 256
-        vec = [0.0]*dim
-        for ch in s:
-            i = ord(ch) % dim
-            vec[i] += 1.0
-        # L2 normalize
-        import math
-        norm = math.sqrt(sum(v*v for v in vec)) or 1.0
-        return [v/norm for v in vec]
-    content = text
-    import uuid
-    if doc_id and not text:
-        with pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT text FROM document_text WHERE doc_id = %s", (uuid.UUID(doc_id),))
-                row = cur.fetchone()
-                if not row:
-                    return {"ok": False, "error": "doc text not found"}
-                content = row[0]
-    if not content:
-        return {"ok": False, "error": "no content provided"}
-    emb = embed(content[:20000])  # cut to avoid huge strings
-    with pool.connection() as conn:
-        with conn.cursor() as cur:
-            # insert a single chunk for now
-            cur.execute(
-                "INSERT INTO document_chunks (doc_id, chunk_index, content, embedding) VALUES (uuid_generate_v4(), 0, %s, %s) RETURNING id",
-                # Use doc_id if supplied, else generate a doc + text? Keep simple: attach no FK if missing not allowed -> we must provide a valid doc_id
-                # So if doc_id is None, create a synthetic doc.
-            )
-    return {"ok": True}
+    async def learn_robots_sitemaps(self, domain: str) -> Dict[str, Any]:
+        from learner import discover_sitemaps, fetch_text, parse_sitemap
+        # Discover sitemap URLs
+        sitemaps = await discover_sitemaps(domain)
+        discovered = []
+        for sm in sitemaps[:10]:
+            xml = await fetch_text(sm)
+            if xml:
+                discovered.extend(parse_sitemap(xml))
+        profile = {
+            "sitemaps": sitemaps,
+            "samples": discovered[:50],
+        }
+        import json, hashlib
+        profile_str = json.dumps(profile, sort_keys=True)
+        profile_hash = hashlib.sha256(profile_str.encode()).hexdigest()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """                        INSERT INTO site_profiles (domain, profile, profile_hash)
+                    VALUES (%s, %s::jsonb, %s)
+                    ON CONFLICT (domain) DO UPDATE SET profile = site_profiles.profile || EXCLUDED.profile,
+                        profile_hash = EXCLUDED.profile_hash
+                    """, (domain, profile_str, profile_hash),
+                )
+                await conn.commit()
+        import robots
+        rules = await robots.get_rules(domain)
+        return {"domain": domain, "sitemaps": sitemaps, "crawl_delay": rules.crawl_delay, "profile_hash": profile_hash}
 
+    async def vectorize_doc(self, doc_id: str, text: str | None = None) -> Dict[str, Any]:
+        """Chunk a document's text (or `text` if given), embed it and replace its chunks."""
+        from vectorizer import vectorize_text
+        import uuid
+        doc_uuid = uuid.UUID(doc_id)
+        content = text
+        if not content:
+            async with pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute("SELECT text FROM document_text WHERE doc_id = %s", (doc_uuid,))
+                    row = await cur.fetchone()
+            if not row:
+                return {"ok": False, "error": "doc text not found"}
+            content = row[0]
+        if not content:
+            return {"ok": False, "error": "no content provided"}
+        chunks = await vectorize_text(doc_uuid, content)
+        return {"ok": True, "doc_id": doc_id, "chunks": chunks}
 
-async def get_site_settings(self, domain: str) -> Dict[str, Any]:
-    from config_loader import load_settings_for
-    # Merge DB settings (if any) on top of file defaults
-    settings = load_settings_for(domain)
-    with pool.connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT settings FROM site_settings WHERE domain = %s", (domain,))
-            row = cur.fetchone()
-            if row and row[0]:
-                db_settings = row[0]
-                # shallow merge (DB overrides file)
-                settings = {**settings, **db_settings}
-    return {"domain": domain, "settings": settings}
+    @long_running
+    async def revectorize_docs(self, domain: str | None = None, batch_docs: int = 200) -> Dict[str, Any]:
+        """Re-embed all stored text (optionally one domain), e.g. after switching embedders."""
+        from vectorizer import revectorize
+        return await revectorize(domain, batch_docs)
 
-async def set_site_settings(self, domain: str, settings: Dict[str, Any]) -> Dict[str, Any]:
-    with pool.connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "INSERT INTO site_settings (domain, settings) VALUES (%s, %s::jsonb) "
-                "ON CONFLICT (domain) DO UPDATE SET settings = EXCLUDED.settings, updated_at = now()",
-                (domain, json.dumps(settings)),
-            )
-            conn.commit()
-    return {"domain": domain, "ok": True}
+    @cached(60, lambda p: [f"docs:{p['domain']}" if p.get("domain") else "docs:*", "vectors"])
+    async def hybrid_search(self, query: str, top_k: int = 10, domain: str | None = None,
+                            doc_type: str | None = None, date_from: str | None = None,
+                            date_to: str | None = None, candidates: int = 50,
+                            recall: float | None = None) -> Dict[str, Any]:
+        """Full-text + vector retrieval fused with reciprocal rank fusion.
+        Filters apply inside both legs; `timings` reports per-stage milliseconds."""
+        from hybrid import hybrid_search
+        from config_loader import load_settings_for
+        if recall is None:
+            recall = float(load_settings_for().get("vector_index", {}).get("recall_target", 0.9))
+        filters = {"domain": domain, "doc_type": doc_type, "date_from": date_from, "date_to": date_to}
+        return await hybrid_search(query, top_k=max(1, min(int(top_k), 100)), candidates=max(int(candidates), int(top_k)),
+                                   recall=recall, filters=filters)
 
-async def crawl_sample(self, domain: str, max_docs: int = 1) -> Dict[str, Any]:
-    # Use samples from site_profiles; if missing, learn first
-    from learner import discover_sitemaps, fetch_text, parse_sitemap
-    from fetcher import ingest_url
-    with pool.connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT profile FROM site_profiles WHERE domain = %s", (domain,))
-            row = cur.fetchone()
-    samples = []
-    if row and row[0]:
-        prof = row[0]
-        samples = prof.get("samples", [])[:max_docs]
-    if not samples:
-        # attempt discovery
-        sitemaps = await discover_sitemaps(domain)
-        for sm in sitemaps[:5]:
-            xml = await fetch_text(sm)
-            if xml:
-                samples.extend(parse_sitemap(xml))
-        samples = samples[:max_docs]
-    ingested = 0
-    last = None
-    for url in samples:
-        res = await ingest_url(domain, url)
-        ingested += res.get("ingested", 0)
-        last = res
-    return {"domain": domain, "attempted": len(samples), "ingested": ingested, "last": last}
+    @long_running
+    async def build_vector_index(self, kind: str = "ivfflat", lists: int | None = None, m: int = 16,
+                                 ef_construction: int = 64) -> Dict[str, Any]:
+        """(Re)build the document_chunks ANN index; run after bulk loads / revectorize_docs.
+        IVFFlat `lists` defaults to a size derived from the current row count."""
+        from ann_index import build_index
+        try:
+            return await build_index(kind, lists, m, ef_construction)
+        except ValueError as e:
+            raise InvalidParams(str(e))
 
+    @long_running
+    async def benchmark_vector_index(self, k: int = 10, queries: int = 50, sweep: list[int] | None = None,
+                                     save: bool = True) -> Dict[str, Any]:
+        """Recall@k vs latency of the ANN index against exact search; `save` stores the curve
+        used to map recall targets to probes/ef_search."""
+        from ann_index import benchmark
+        try:
+            return await benchmark(k, queries, sweep, save)
+        except ValueError as e:
+            raise InvalidParams(str(e))
+
+    @cached(60, lambda p: [f"settings:{p.get('domain')}"])
+    async def get_site_settings(self, domain: str) -> Dict[str, Any]:
+        """File defaults + site YAML + DB overrides (deep-merged), served from the settings cache."""
+        import site_settings
+        return {"domain": domain, "settings": await site_settings.effective(domain)}
 
-async def run_crawl_batch(self, domain: str, limit: int = 100, vectorize: bool = True) -> Dict[str, Any]:
-    """Batch crawl using sitemap URL list with a persistent cursor per domain.
-    Respects politeness from site settings between requests.
-    """
-    from learner import build_url_list
-    from fetcher import ingest_url
-    from config_loader import load_settings_for
-    import asyncio, json
-    settings = load_settings_for(domain)
-    politeness_ms = int(settings.get("crawl", {}).get("politeness_ms", 1500))
-    # Read or build cursor
-    with pool.connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT url_list, pos, total FROM crawl_cursors WHERE domain = %s", (domain,))
-            row = cur.fetchone()
-            if row:
-                url_list, pos, total = row[0], int(row[1] or 0), int(row[2] or 0)
-            else:
-                url_list = await build_url_list(domain, max_urls=5000)
-                pos, total = 0, len(url_list)
-                cur.execute(
-                    "INSERT INTO crawl_cursors (domain, pos, total, url_list) VALUES (%s,%s,%s,%s::jsonb)",
-                    (domain, pos, total, json.dumps(url_list)),
+    async def set_site_settings(self, domain: str, settings: Dict[str, Any]) -> Dict[str, Any]:
+        import site_settings
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "INSERT INTO site_settings (domain, settings) VALUES (%s, %s::jsonb) "
+                    "ON CONFLICT (domain) DO UPDATE SET settings = EXCLUDED.settings, updated_at = now()",
+                    (domain, json.dumps(settings)),
                 )
-                conn.commit()
-    attempted = 0
-    ingested = 0
-    last = None
-    end = min(pos + limit, total)
-    for i in range(pos, end):
-        url = url_list[i]
+                await conn.commit()
+        # local copy now; other processes drop theirs on the NOTIFY fired by the trigger
+        site_settings.invalidate(domain)
+        await result_cache.invalidate(f"settings:{domain}")
+        return {"domain": domain, "ok": True}
+
+    async def crawl_sample(self, domain: str, max_docs: int = 1) -> Dict[str, Any]:
+        """Ingest up to `max_docs` URLs from the domain's stored samples (discovered on first use)."""
+        import sampler
+        return await sampler.sample_domain(domain, max_docs, per_host=1)
+
+    async def crawl_samples(self, domains: List[str], max_docs: int = 1, concurrency: int | None = None,
+                            per_host: int | None = None) -> Dict[str, Any]:
+        """crawl_sample for many domains concurrently, in the background; follow it with
+        get_sample_run or GET /sample_runs/{run_id}/events."""
+        import sampler
+        from settings import settings
+        domains = list(dict.fromkeys(d.strip().lower() for d in domains if d and d.strip()))
+        if not domains:
+            raise InvalidParams("domains must not be empty")
+        if len(domains) > 5000:
+            raise InvalidParams("at most 5000 domains per run")
+        if not 1 <= max_docs <= 100:
+            raise InvalidParams("max_docs must be between 1 and 100")
+        concurrency = min(concurrency or settings.sample_concurrency, settings.sample_concurrency)
+        per_host = min(per_host or settings.sample_per_host, settings.sample_per_host)
+        if concurrency < 1 or per_host < 1:
+            raise InvalidParams("concurrency and per_host must be >= 1")
+        run_id = await sampler.start(domains, max_docs, concurrency, per_host)
+        return {"run_id": run_id, "domains": len(domains), "state": "running",
+                "events": f"/sample_runs/{run_id}/events"}
+
+    async def get_sample_run(self, run_id: str, after: int = 0) -> Dict[str, Any]:
+        """Progress of a crawl_samples run and the domain results that arrived after `after`."""
+        import sampler, uuid
         try:
-            res = await ingest_url(domain, url)
-            attempted += 1
-            ingested += res.get("ingested", 0)
-            last = res
-            # Optional vectorize if we got a doc_id
-            if vectorize and res.get("doc_id"):
-                await self.vectorize_doc(doc_id=res["doc_id"])
-        except Exception as e:
-            last = {"error": str(e), "url": url}
-        # Politeness delay
-        await asyncio.sleep(politeness_ms / 1000.0)
-    # Update cursor
-    with pool.connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "UPDATE crawl_cursors SET pos = %s, last_run = now() WHERE domain = %s",
-                (end, domain),
-            )
-            conn.commit()
-    done = end >= total
-    return {"domain": domain, "attempted": attempted, "ingested": ingested, "pos": end, "total": total, "done": done, "last": last}
+            uuid.UUID(run_id)
+        except ValueError:
+            raise InvalidParams(f"invalid run_id: {run_id}")
+        run = await sampler.progress(run_id, after)
+        if run is None:
+            raise InvalidParams(f"unknown run_id: {run_id}")
+        return run
 
-async def semantic_search(self, query: str, top_k: int = 10) -> Dict[str, Any]:
-    """Vector similarity search over document_chunks using the lightweight 256-dim embedding.
-    Falls back to LIKE search if no vector table or embeddings present.
-    """
-    # Same embed function as vectorize_doc
-    def embed(s: str) -> list[float]:
-        dim = 256
-        vec = [0.0]*dim
-        for ch in s:
-            i = ord(ch) % dim
-            vec[i] += 1.0
-        import math
-        norm = math.sqrt(sum(v*v for v in vec)) or 1.0
-        return [v/norm for v in vec]
-    qvec = embed(query)
-    vec_literal = "[" + ",".join(str(x) for x in qvec) + "]"
-    items = []
-    try:
-        with pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT doc_id::text, chunk_index, left(content, 500) AS snippet, (1 - (embedding <=> %s::vector)) AS score "
-                    "FROM document_chunks ORDER BY embedding <=> %s::vector LIMIT %s",
-                    (vec_literal, vec_literal, top_k),
-                )
-                rows = cur.fetchall()
-                for r in rows:
-                    items.append({"doc_id": r[0], "chunk_index": r[1], "snippet": r[2], "score": float(r[3])})
-        return {"items": items, "mode": "vector"}
-    except Exception:
-        # Fallback LIKE search
-        with pool.connection() as conn:
-            with conn.cursor() as cur:
-                pat = "%" + query + "%"
-                cur.execute(
-                    "SELECT d.id::text, d.title, left(t.text, 300) as snippet FROM documents d "
-                    "JOIN document_text t ON d.id = t.doc_id "
-                    "WHERE d.title ILIKE %s OR t.text ILIKE %s LIMIT %s",
-                    (pat, pat, top_k),
-                )
-                rows = cur.fetchall()
-                for r in rows:
-                    items.append({"doc_id": r[0], "title": r[1], "snippet": r[2], "score": None})
-        return {"items": items, "mode": "fallback-like"}
+    async def run_crawl_batch(self, domain: str, limit: int = 100, vectorize: bool = True) -> Dict[str, Any]:
+        """Queue a crawl of the next `limit` URLs of the domain's crawl_queue (seeded from its
+        sitemaps on first run). A `python -m worker` process executes it; poll get_crawl_job.
+        """
+        import crawl_queue
+        if not 1 <= limit <= 10000:
+            raise InvalidParams("limit must be between 1 and 10000")
+        job = await crawl_queue.submit_job(domain, limit, vectorize)
+        return {"job_id": job["job_id"], "domain": domain, "state": job["state"]}
+
+    async def get_crawl_job(self, job_id: str) -> Dict[str, Any]:
+        """State and (once finished) result of a job queued by run_crawl_batch."""
+        import crawl_queue, uuid
+        try:
+            uuid.UUID(job_id)
+        except ValueError:
+            raise InvalidParams(f"invalid job_id: {job_id}")
+        job = await crawl_queue.get_job(job_id)
+        if job is None:
+            raise InvalidParams(f"unknown job_id: {job_id}")
+        return job
+
+    @long_running
+    async def bulk_ingest(self, source: str, manifest: str | None = None, domain: str | None = None,
+                          workers: int | None = None, batch_size: int = 1000) -> Dict[str, Any]:
+        """Ingest a local directory / tar / zip (+ JSONL or CSV manifest) under BULK_INGEST_ROOT."""
+        import os, bulk_ingest
+        from settings import settings
+        root = os.path.realpath(settings.bulk_ingest_root)
+        paths = {}
+        for name, value in (("source", source), ("manifest", manifest)):
+            if value is None:
+                continue
+            path = os.path.realpath(os.path.join(root, value))
+            if os.path.commonpath([root, path]) != root or not os.path.exists(path):
+                raise InvalidParams(f"{name} must exist under {root}: {value}")
+            paths[name] = path
+        if batch_size < 1:
+            raise InvalidParams("batch_size must be >= 1")
+        if workers is not None and workers < 1:
+            raise InvalidParams("workers must be >= 1")
+        # parser processes fork from the API server: never more than it has CPUs
+        cpus = os.cpu_count() or 4
+        workers = min(workers or cpus, cpus)
+        return await bulk_ingest.bulk_ingest(paths["source"], paths.get("manifest"), domain, workers, batch_size)
+
+    @cached(300, ["domain_scores"])
+    async def rank_domains(self, top_n: int = 20) -> Dict[str, Any]:
+        """Highest-value domains from the materialized domain_scores table."""
+        import ranking
+        if not 1 <= top_n <= 1000:
+            raise InvalidParams("top_n must be between 1 and 1000")
+        return {"items": await ranking.top_domains(top_n)}
+
+    async def refresh_domain_scores(self, weights: Dict[str, float] | None = None) -> Dict[str, Any]:
+        """Recompute domain_scores (workers also do this every RANK_REFRESH_S); `weights` overrides ranking.weights."""
+        import ranking
+        try:
+            return await ranking.refresh_scores(weights)
+        except ValueError as e:
+            raise InvalidParams(str(e))
+
+    @cached(60, ["docs:*", "vectors"])
+    async def semantic_search(self, query: str, top_k: int = 10, recall: float | None = None) -> Dict[str, Any]:
+        """Vector similarity search over document_chunks using the configured embedder.
+        `recall` (default vector_index.recall_target) picks ivfflat.probes / hnsw.ef_search.
+        Falls back to LIKE search if no vector table or embeddings present.
+        """
+        from embeddings import get_embedder
+        from ann_index import apply_search_params
+        from config_loader import load_settings_for
+        if recall is None:
+            recall = float(load_settings_for().get("vector_index", {}).get("recall_target", 0.9))
+        import asyncio
+        qvec = (await asyncio.to_thread(get_embedder().embed, [query]))[0]
+        items = []
+        try:
+            async with pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    search_params = await apply_search_params(cur, recall, top_k)
+                    await cur.execute(
+                        "SELECT doc_id::text, chunk_index, left(content, 500) AS snippet, (1 - (embedding <=> %s::vector)) AS score "
+                        "FROM document_chunks ORDER BY embedding <=> %s::vector LIMIT %s",
+                        (qvec, qvec, top_k),
+                        prepare=True,
+                    )
+                    rows = await cur.fetchall()
+                    for r in rows:
+                        items.append({"doc_id": r[0], "chunk_index": r[1], "snippet": r[2], "score": float(r[3])})
+            return {"items": items, "mode": "vector", "search_params": search_params}
+        except Exception:
+            log.warning("vector search unavailable, falling back to full-text", exc_info=True)
+            from fulltext import TS_CONFIG
+            async with pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(
+                        f"SELECT d.id::text, d.title, left(t.text, 300) AS snippet, ts_rank(t.tsv, q) AS score "
+                        f"FROM document_text t JOIN documents d ON d.id = t.doc_id, "
+                        f"websearch_to_tsquery('{TS_CONFIG}', %s) q "
+                        f"WHERE t.tsv @@ q ORDER BY score DESC LIMIT %s",
+                        (query, top_k),
+                    )
+                    rows = await cur.fetchall()
+                    for r in rows:
+                        items.append({"doc_id": r[0], "title": r[1], "snippet": r[2], "score": float(r[3])})
+            return {"items": items, "mode": "fallback-fts"}
@@ -0,0 +1,77 @@
+from __future__ import annotations
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+from prometheus_client.registry import Collector
+
+registry = CollectorRegistry(auto_describe=True)
+
+# fetch / readability / pdfminer / store / db / vectorize; sub-ms DB steps up to multi-minute PDFs
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 180)
+
+ingest_stage_seconds = Histogram("govdocs_ingest_stage_seconds", "Time spent per ingest stage",
+                                 ["stage", "domain"], buckets=STAGE_BUCKETS, registry=registry)
+ingest_errors = Counter("govdocs_ingest_errors", "Ingest stages that raised", ["stage", "domain"], registry=registry)
+ingest_documents = Counter("govdocs_ingest_documents", "Fetched documents by outcome (ingested, duplicate)",
+                           ["domain", "outcome"], registry=registry)
+ingest_bytes = Counter("govdocs_ingest_bytes", "Bytes fetched (raw) and extracted (text)",
+                       ["domain", "kind"], registry=registry)
+result_cache_requests = Counter("govdocs_result_cache_requests", "Cacheable tool calls by outcome (hit_local, hit_redis, miss)",
+                                ["tool", "outcome"], registry=registry)
+result_cache_invalidations = Counter("govdocs_result_cache_invalidations", "Result cache tag generations bumped",
+                                     registry=registry)
+tool_seconds = Histogram("govdocs_tool_seconds", "MCP tool call latency", ["tool", "status"],
+                         buckets=STAGE_BUCKETS, registry=registry)
+
+@contextmanager
+def stage(name: str, domain: str) -> Iterator[None]:
+    """Time one ingest stage; failures are counted per stage and re-raised."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ingest_errors.labels(name, domain).inc()
+        raise
+    finally:
+        ingest_stage_seconds.labels(name, domain).observe(time.perf_counter() - t0)
+
+class PoolCollector(Collector):
+    """Exports psycopg_pool.get_stats() at scrape time (no per-query bookkeeping)."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def collect(self) -> Iterable[Metric]:
+        stats = self.pool.get_stats()
+        name = self.pool.name
+        size, available = stats.get("pool_size", 0), stats.get("pool_available", 0)
+        if self.pool.closed:
+            size = available = 0
+        gauges = {
+            "govdocs_db_pool_size": ("Connections currently open", size),
+            "govdocs_db_pool_available": ("Idle connections ready for use", available),
+            "govdocs_db_pool_in_use": ("Connections checked out by requests", size - available),
+            "govdocs_db_pool_waiting": ("Requests queued waiting for a connection", stats.get("requests_waiting", 0)),
+            "govdocs_db_pool_max": ("Configured max_size", stats.get("pool_max", 0)),
+        }
+        for metric, (doc, value) in gauges.items():
+            g = GaugeMetricFamily(metric, doc, labels=["pool"])
+            g.add_metric([name], value)
+            yield g
+        counters = {
+            "govdocs_db_pool_requests": ("Connection requests served", stats.get("requests_num", 0)),
+            "govdocs_db_pool_requests_queued": ("Connection requests that had to wait", stats.get("requests_queued", 0)),
+            "govdocs_db_pool_wait_seconds": ("Total time requests spent waiting for a connection",
+                                             stats.get("requests_wait_ms", 0) / 1000.0),
+            "govdocs_db_pool_usage_seconds": ("Total time connections were checked out", stats.get("usage_ms", 0) / 1000.0),
+            "govdocs_db_pool_errors": ("Connection requests that failed (timeouts, errors)", stats.get("requests_errors", 0)),
+        }
+        for metric, (doc, value) in counters.items():
+            c = CounterMetricFamily(metric, doc, labels=["pool"])
+            c.add_metric([name], value)
+            yield c
+
+def render() -> tuple[bytes, str]:
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,26 +1,120 @@
-import os
+import asyncio, io, os
+from typing import Iterable, List, Tuple
 from minio import Minio
 from minio.error import S3Error
 
-def ensure_bucket():
-    endpoint = os.environ.get("MINIO_ENDPOINT", "minio:9000")
-    access_key = os.environ.get("MINIO_ROOT_USER", "minioadmin")
-    secret_key = os.environ.get("MINIO_ROOT_PASSWORD", "minioadmin")
-    bucket = os.environ.get("MINIO_BUCKET", "opendiscourse")
-    secure = False if ":" in endpoint else True
-    client = Minio(endpoint, access_key=access_key, secret_key=secret_key, secure=secure)
-    found = client.bucket_exists(bucket)
-    if not found:
-        client.make_bucket(bucket)
+try:
+    import zstandard
+except ImportError:  # optional: text objects are stored uncompressed without it
+    zstandard = None
+
+_client: Minio | None = None
+_known_buckets: set[str] = set()
+
+def get_client() -> Minio:
+    """Process-wide MinIO client (its urllib3 pool is reused across puts)."""
+    global _client
+    if _client is None:
+        endpoint = os.environ.get("MINIO_ENDPOINT", "minio:9000")
+        access_key = os.environ.get("MINIO_ROOT_USER", "minioadmin")
+        secret_key = os.environ.get("MINIO_ROOT_PASSWORD", "minioadmin")
+        secure = False if ":" in endpoint else True
+        _client = Minio(endpoint, access_key=access_key, secret_key=secret_key, secure=secure)
+    return _client
+
+def ensure_bucket(bucket: str | None = None) -> str:
+    bucket = bucket or os.environ.get("MINIO_BUCKET", "opendiscourse")
+    if bucket in _known_buckets:
+        return bucket
+    client = get_client()
+    if not client.bucket_exists(bucket):
+        try:
+            client.make_bucket(bucket)
+        except S3Error as e:
+            # another worker created it between the check and the create
+            if e.code not in ("BucketAlreadyOwnedByYou", "BucketAlreadyExists"):
+                raise
+    _known_buckets.add(bucket)
     return bucket
 
+def put_object_bytes(bucket: str, key: str, data: bytes, content_type: str = "application/octet-stream",
+                     compress: bool = False) -> str:
+    """Upload `data` and return the key actually written.
+
+    With `compress=True` text objects are zstd-compressed and stored under `<key>.zst`
+    with `Content-Encoding: zstd`; binary objects and missing zstandard are left as-is.
+    """
+    metadata = None
+    if compress and zstandard is not None and content_type.startswith("text/"):
+        data = zstandard.ZstdCompressor(level=3).compress(data)
+        key = f"{key}.zst"
+        metadata = {"Content-Encoding": "zstd"}
+    get_client().put_object(bucket, key, io.BytesIO(data), length=len(data),
+                            content_type=content_type, metadata=metadata)
+    return key
+
+def get_object_bytes(bucket: str, key: str) -> bytes:
+    resp = get_client().get_object(bucket, key)
+    try:
+        return resp.read()
+    finally:
+        resp.close()
+        resp.release_conn()
+
+
+Upload = Tuple[str, str, bytes, str]  # (bucket, key, data, content_type)
+
+class UploadQueue:
+    """Async upload queue drained by a fixed set of workers.
+
+    Callers enqueue puts and await their keys; the worker count bounds concurrent MinIO
+    requests for the whole process, so bursts of ingests never open unbounded sockets.
+    """
+
+    def __init__(self, concurrency: int | None = None, maxsize: int = 256):
+        self.concurrency = concurrency or int(os.environ.get("MINIO_UPLOAD_CONCURRENCY", "8"))
+        self._queue: asyncio.Queue | None = None
+        self._maxsize = maxsize
+        self._workers: List[asyncio.Task] = []
+
+    def _start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self._maxsize)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        while True:
+            (bucket, key, data, content_type), compress, fut = await self._queue.get()
+            try:
+                written = await asyncio.to_thread(put_object_bytes, bucket, key, data, content_type, compress)
+                if not fut.done():
+                    fut.set_result(written)
+            except Exception as e:
+                if not fut.done():
+                    fut.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    async def submit(self, upload: Upload, compress: bool = False) -> "asyncio.Future[str]":
+        if self._queue is None:
+            self._start()
+        assert self._queue is not None
+        fut: asyncio.Future[str] = asyncio.get_running_loop().create_future()
+        await self._queue.put((upload, compress, fut))
+        return fut
+
+    async def put_many(self, uploads: Iterable[Upload], compress: bool = False) -> List[str]:
+        """Enqueue a batch of puts and wait for all of them; returns written keys in order."""
+        futs = [await self.submit(u, compress) for u in uploads]
+        return list(await asyncio.gather(*futs))
 
-import io
+    async def close(self) -> None:
+        if self._queue is None:
+            return
+        await self._queue.join()
+        for w in self._workers:
+            w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._queue, self._workers = None, []
 
-def put_object_bytes(bucket: str, key: str, data: bytes, content_type: str = "application/octet-stream"):
-    endpoint = os.environ.get("MINIO_ENDPOINT", "minio:9000")
-    access_key = os.environ.get("MINIO_ROOT_USER", "minioadmin")
-    secret_key = os.environ.get("MINIO_ROOT_PASSWORD", "minioadmin")
-    secure = False if ":" in endpoint else True
-    client = Minio(endpoint, access_key=access_key, secret_key=secret_key, secure=secure)
-    client.put_object(bucket, key, io.BytesIO(data), length=len(data), content_type=content_type)
+upload_queue = UploadQueue()
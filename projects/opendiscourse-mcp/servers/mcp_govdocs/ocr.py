@@ -0,0 +1,209 @@
+"""OCR for scanned / low-text PDFs with the local `tesseract` binary.
+
+Ingest only enqueues documents (ocr_queue); worker.py drains the queue with its own runner
+and process pool, so an OCR backlog never holds up HTML or text-PDF ingest. Pages are
+rendered with pypdfium2 and recognized in parallel, each page rendered once, inside its own pool
+task; only text crosses back over the process boundary. Results are cached per page, keyed by
+the PDF's hash, the page index and the DPI, so no page is rendered just to look it up.
+"""
+from __future__ import annotations
+import asyncio, hashlib, io, logging, os, shutil, subprocess, time, uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+import metrics, result_cache, site_settings
+from config_loader import load_settings_for
+from db_pool import pool
+
+log = logging.getLogger("mcp_govdocs.ocr")
+
+MAX_ATTEMPTS = 3
+LEASE = "30 minutes"
+
+def ocr_config(conf: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    pdf = (conf if conf is not None else load_settings_for()).get("parsing", {}).get("pdf", {})
+    return {
+        "enabled": bool(pdf.get("ocr_fallback", False)),
+        "min_chars_per_page": int(pdf.get("ocr_min_chars_per_page", 100)),
+        "dpi": int(pdf.get("ocr_dpi", 300)),
+        "lang": str(pdf.get("ocr_lang", "eng")),
+        "workers": int(pdf.get("ocr_workers", 2)),
+        "max_pages": int(pdf.get("ocr_max_pages", 200)),
+    }
+
+def needs_ocr(text: str, min_chars_per_page: int) -> bool:
+    """pdfminer separates pages with form feeds; too little text per page means a scan."""
+    pages = max(text.count("\f"), 1)
+    return len(text.strip()) < pages * min_chars_per_page
+
+def available() -> bool:
+    if shutil.which("tesseract") is None:
+        return False
+    try:
+        import pypdfium2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+# --- process-pool functions ---
+
+def _render(doc, index: int, dpi: int) -> bytes:
+    buf = io.BytesIO()
+    doc[index].render(scale=dpi / 72).to_pil().convert("L").save(buf, format="PNG")
+    return buf.getvalue()
+
+def pdf_pages(pdf: bytes, max_pages: int) -> Tuple[str, int]:
+    """-> (sha256 of the PDF, pages to OCR); opens the document without rendering anything."""
+    import pypdfium2 as pdfium
+    doc = pdfium.PdfDocument(pdf)
+    try:
+        return hashlib.sha256(pdf).hexdigest(), min(len(doc), max_pages)
+    finally:
+        doc.close()
+
+def page_key(pdf_sha: str, index: int, dpi: int) -> str:
+    return hashlib.sha256(f"{pdf_sha}:{index}:{dpi}".encode()).hexdigest()
+
+def ocr_page(pdf: bytes, index: int, dpi: int, lang: str) -> str:
+    """Render and recognize one page inside the pool process; returns only its text."""
+    import pypdfium2 as pdfium
+    doc = pdfium.PdfDocument(pdf)
+    try:
+        png = _render(doc, index, dpi)
+    finally:
+        doc.close()
+    return ocr_image(png, lang)
+
+def ocr_image(png: bytes, lang: str) -> str:
+    # one tesseract process per page; OMP_THREAD_LIMIT=1 because pages already run in parallel
+    proc = subprocess.run(["tesseract", "stdin", "stdout", "-l", lang], input=png, capture_output=True,
+                          timeout=300, check=True, env={**os.environ, "OMP_THREAD_LIMIT": "1"})
+    return proc.stdout.decode("utf-8", errors="ignore")
+
+_executor: ProcessPoolExecutor | None = None
+
+def _pool(workers: int) -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=workers)
+    return _executor
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+async def ocr_pdf(pdf: bytes, conf: Dict[str, Any]) -> Tuple[str, int, int]:
+    """OCR every page (cache first) -> (text with form feeds between pages, pages, cache hits)."""
+    loop = asyncio.get_running_loop()
+    executor = _pool(conf["workers"])
+    pdf_sha, pages = await loop.run_in_executor(executor, pdf_pages, pdf, conf["max_pages"])
+    keys = [page_key(pdf_sha, i, conf["dpi"]) for i in range(pages)]
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT page_hash, text FROM ocr_page_cache WHERE page_hash = ANY(%s) AND lang = %s",
+                              (keys, conf["lang"]))
+            cached = dict(await cur.fetchall())
+    misses = [i for i, k in enumerate(keys) if k not in cached]
+    results = await asyncio.gather(*(loop.run_in_executor(executor, ocr_page, pdf, i, conf["dpi"], conf["lang"])
+                                      for i in misses))
+    fresh = {keys[i]: t for i, t in zip(misses, results)}
+    if fresh:
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.executemany(
+                    "INSERT INTO ocr_page_cache (page_hash, lang, text) VALUES (%s, %s, %s) ON CONFLICT DO NOTHING",
+                    [(k, conf["lang"], t) for k, t in fresh.items()],
+                )
+            await conn.commit()
+    text = "\f".join(cached[k] if k in cached else fresh[k] for k in keys)
+    return text, pages, pages - len(misses)
+
+# --- queue ---
+
+async def enqueue(doc_id: uuid.UUID | str) -> None:
+    async with pool.connection() as conn:
+        await conn.execute("INSERT INTO ocr_queue (doc_id) VALUES (%s) ON CONFLICT (doc_id) DO NOTHING", (doc_id,))
+        await conn.commit()
+
+async def claim() -> Tuple[uuid.UUID, str, str] | None:
+    """Next pending doc (or one abandoned by a dead worker) -> (doc_id, domain, storage_uri)."""
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "UPDATE ocr_queue q SET state = 'running', attempts = q.attempts + 1, claimed_at = now() "
+                "FROM (SELECT doc_id FROM ocr_queue "
+                "      WHERE state = 'pending' OR (state = 'running' AND claimed_at < now() - %s::interval) "
+                "      ORDER BY enqueued_at LIMIT 1 FOR UPDATE SKIP LOCKED) c, documents d "
+                "WHERE q.doc_id = c.doc_id AND d.id = q.doc_id RETURNING q.doc_id, d.domain, d.storage_uri",
+                (LEASE,),
+            )
+            row = await cur.fetchone()
+        await conn.commit()
+    return (row[0], row[1], row[2]) if row else None
+
+async def _finish(doc_id: uuid.UUID, error: str | None, pages: int | None = None, cached: int | None = None) -> None:
+    async with pool.connection() as conn:
+        if error is None:
+            await conn.execute(
+                "UPDATE ocr_queue SET state = 'done', pages = %s, cached_pages = %s, last_error = NULL, "
+                "finished_at = now() WHERE doc_id = %s",
+                (pages, cached, doc_id),
+            )
+        else:
+            await conn.execute(
+                "UPDATE ocr_queue SET last_error = %s, finished_at = now(), "
+                "state = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END WHERE doc_id = %s",
+                (error[:2000], MAX_ATTEMPTS, doc_id),
+            )
+        await conn.commit()
+
+async def process(doc_id: uuid.UUID, domain: str, storage_uri: str, conf: Dict[str, Any]) -> None:
+    """OCR one queued PDF and replace its text (DB, MinIO text object) and chunks."""
+    from minio_utils import get_object_bytes, upload_queue
+    from vectorizer import vectorize_text
+    try:
+        bucket, raw_key = storage_uri.removeprefix("s3://").split("/", 1)
+        pdf = await asyncio.to_thread(get_object_bytes, bucket, raw_key)
+        with metrics.stage("ocr", domain):
+            text, pages, cached = await ocr_pdf(pdf, conf)
+        if text.strip():
+            async with pool.connection() as conn:
+                await conn.execute("UPDATE document_text SET text = %s WHERE doc_id = %s", (text, doc_id))
+                await conn.execute(
+                    "UPDATE documents SET provenance = provenance || jsonb_build_object('ocr', "
+                    "jsonb_build_object('pages', %s::int, 'lang', %s::text, 'at', %s::bigint)) WHERE id = %s",
+                    (pages, conf["lang"], int(time.time()), doc_id),
+                )
+                await conn.commit()
+            await result_cache.invalidate_docs([domain])
+            storage = (await site_settings.effective(domain)).get("storage", {})
+            raw_prefix, text_prefix = storage.get("raw_prefix", "raw"), storage.get("text_prefix", "text")
+            text_key = raw_key.replace(f"{raw_prefix}/", f"{text_prefix}/", 1).rsplit(".", 1)[0] + ".txt"
+            await upload_queue.put_many([(bucket, text_key, text.encode("utf-8"), "text/plain; charset=utf-8")],
+                                        compress=bool(storage.get("compress_text", False)))
+            await vectorize_text(doc_id, text)
+        await _finish(doc_id, None, pages, cached)
+        log.info("ocr %s: %d pages (%d cached)", doc_id, pages, cached)
+    except Exception as e:
+        log.exception("ocr %s failed", doc_id)
+        await _finish(doc_id, str(e))
+
+async def runner(stop: asyncio.Event, poll_s: float) -> None:
+    """Worker loop: one document at a time per runner; its pages use the whole OCR pool."""
+    if not available():
+        log.warning("OCR runner disabled: tesseract and/or pypdfium2 not installed")
+        return
+    while not stop.is_set():
+        job = None
+        try:
+            job = await claim()
+        except Exception:
+            log.exception("claiming an OCR job failed")
+        if job is None:
+            try:
+                await asyncio.wait_for(stop.wait(), poll_s)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await process(*job, ocr_config(await site_settings.effective(job[1])))
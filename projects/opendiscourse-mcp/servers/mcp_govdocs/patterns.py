@@ -0,0 +1,261 @@
+"""Per-domain page patterns: learned title/content/pagination selectors and a fast extractor.
+
+`learn` fetches a sample of a domain's HTML pages, finds the main content block of each
+(readability-style paragraph scoring) and keeps the selectors that pick it out on at least
+`parsing.html.profile_min_match` of the sample. Known domains then skip readability: the
+fetcher parses the page once with lxml and reads the profile's nodes directly, falling back
+to readability whenever the profile does not match a page.
+
+Selectors are a small CSS subset: descendant steps of `tag`, `#id`, `.class` and `[attr=value]`.
+"""
+from __future__ import annotations
+import asyncio, logging, math, random, re, time
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+import lxml.html
+from db_pool import pool
+
+log = logging.getLogger("mcp_govdocs.patterns")
+
+CACHE_TTL_S = 300  # other processes pick up a re-learned profile within this
+MIN_PARAGRAPH_CHARS = 25
+NEXT_TEXT = re.compile(r"^\s*(next( page)?|older( posts)?|[›»>])\s*[›»>]?\s*$", re.I)
+_STEP = re.compile(r"^(?P<tag>[a-zA-Z][\w-]*|\*)?(?P<rest>(?:#[\w-]+|\.[\w-]+|\[[\w-]+=[^\]'\"]+\])*)$")
+_PART = re.compile(r"#([\w-]+)|\.([\w-]+)|\[([\w-]+)=([^\]]+)\]")
+_UNSTABLE = re.compile(r"\d{3,}|^(active|current|selected|open|hidden|js-)")
+# text nodes that are rendered; tail text of a node belongs to its parent, so this is exact
+_TEXT = ".//text()[not(ancestor::script or ancestor::style or ancestor::noscript)]"
+
+def to_xpath(selector: str) -> str:
+    """'div#main article.post-body' -> //div[@id='main']//article[contains(...)]."""
+    out = []
+    for step in selector.split():
+        m = _STEP.match(step)
+        if not m:
+            raise ValueError(f"unsupported selector step: {step!r}")
+        preds = []
+        for id_, cls, attr, value in _PART.findall(m.group("rest")):
+            if id_:
+                preds.append(f"[@id='{id_}']")
+            elif cls:
+                preds.append(f"[contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')]")
+            else:
+                preds.append(f"[@{attr}='{value}']")
+        out.append("//" + (m.group("tag") or "*").lower() + "".join(preds))
+    return "".join(out)
+
+def _step(el) -> str:
+    step = el.tag
+    id_ = el.get("id", "")
+    if re.fullmatch(r"[\w-]+", id_) and not _UNSTABLE.search(id_):
+        return f"{step}#{id_}"
+    classes = sorted(c for c in el.get("class", "").split() if re.fullmatch(r"[\w-]+", c) and not _UNSTABLE.search(c))
+    return step + "".join(f".{c}" for c in classes[:2])
+
+def _candidates(el) -> List[str]:
+    """Selectors for `el` from most general to most specific, stopping at an id."""
+    own = _step(el)
+    out = [own]
+    if "#" in own:
+        return out
+    chain = [own]
+    parent = el.getparent()
+    for _ in range(2):
+        if parent is None or parent.tag in ("html", "body"):
+            break
+        chain.insert(0, _step(parent))
+        out.append(" ".join(chain))
+        if "#" in chain[0]:
+            break
+        parent = parent.getparent()
+    return out
+
+def _text(el) -> str:
+    if el.tag == "meta":
+        return (el.get("content") or "").strip()
+    return "\n".join(s for s in (t.strip() for t in el.xpath(_TEXT)) if s)
+
+def _norm(s: str) -> str:
+    return " ".join(s.split()).casefold()
+
+def _main_block(doc):
+    """Readability-lite: paragraphs score their parent fully and grandparent by half."""
+    scores: Counter = Counter()
+    for p in doc.iter("p", "pre", "li"):
+        n = len(_text(p))
+        if n < MIN_PARAGRAPH_CHARS:
+            continue
+        parent = p.getparent()
+        if parent is not None:
+            scores[parent] += n
+            if parent.getparent() is not None:
+                scores[parent.getparent()] += n / 2
+    best = [el for el, _ in scores.most_common() if el.tag not in ("html", "body")]
+    return best[0] if best else None
+
+def _pick(candidates: Counter, hits) -> Tuple[str | None, int]:
+    """Candidate with the most sample hits; fewer steps (more general) wins ties."""
+    best, best_hits = None, 0
+    for sel in sorted(candidates, key=lambda s: (len(s.split()), -candidates[s], s)):
+        n = sum(1 for ok in hits(sel) if ok)
+        if n > best_hits:
+            best, best_hits = sel, n
+    return best, best_hits
+
+def learn_profile(pages: List[bytes], min_match: float = 0.8) -> Dict[str, Any]:
+    """Infer stable selectors from sample pages -> profile dict (selectors None when unstable)."""
+    docs, blocks, titles = [], [], []
+    for raw in pages:
+        try:
+            doc = lxml.html.document_fromstring(raw.decode("utf-8", errors="ignore"))
+        except Exception:
+            continue
+        block = _main_block(doc)
+        if block is None:
+            continue
+        docs.append(doc)
+        blocks.append(block)
+        t = doc.find(".//title")
+        titles.append(_norm(t.text_content()) if t is not None else "")
+    if not docs:
+        return {"selectors": {"title": None, "content": None}, "pagination": {"mode": "none"},
+                "learned": {"pages": 0}}
+    need = max(1, math.ceil(min_match * len(docs) - 1e-9))
+    want = [len(_text(b)) for b in blocks]
+
+    content_cands: Counter = Counter()
+    title_cands: Counter = Counter({"h1": 0, "meta[property=og:title]": 0})
+    next_cands: Counter = Counter({"a[rel=next]": 0, "link[rel=next]": 0})
+    for doc, block in zip(docs, blocks):
+        content_cands.update(_candidates(block))
+        for h in doc.iter("h1", "h2"):
+            if _text(h):
+                title_cands.update(_candidates(h))
+        for a in doc.iter("a"):
+            if NEXT_TEXT.match(a.text_content() or ""):
+                # a bare `a` would match any link
+                next_cands.update(c for c in _candidates(a) if re.search(r"[#.\[]", c.split()[-1]))
+
+    def first(doc, sel):
+        found = doc.xpath(to_xpath(sel))
+        return found[0] if found else None
+
+    def content_hits(sel):
+        for doc, n in zip(docs, want):
+            el = first(doc, sel)
+            # must hold most of the main block without being the whole page
+            yield el is not None and el.tag not in ("html", "body") and len(_text(el)) >= n * 0.8
+
+    def title_hits(sel):
+        for doc, page_title in zip(docs, titles):
+            el = first(doc, sel)
+            got = _norm(_text(el)) if el is not None else ""
+            yield bool(got) and (got in page_title or page_title in got)
+
+    content, content_n = _pick(content_cands, content_hits)
+    title, title_n = _pick(title_cands, title_hits)
+    nxt, next_n = _pick(next_cands, lambda sel: (first(doc, sel) is not None for doc in docs))
+    min_chars = 0
+    if content and content_n >= need:
+        matched = [len(_text(first(doc, content))) for doc, ok in zip(docs, content_hits(content)) if ok]
+        min_chars = int(min(max(min(matched) // 2, 50), 500))
+    return {
+        "selectors": {"title": title if title_n >= need else None,
+                      "content": content if content_n >= need else None},
+        "pagination": {"mode": "link-next", "selector": nxt} if nxt else {"mode": "none"},
+        "min_chars": min_chars,
+        "learned": {"pages": len(docs), "content_match": round(content_n / len(docs), 3),
+                    "title_match": round(title_n / len(docs), 3), "pages_with_next": next_n,
+                    "at": int(time.time())},
+    }
+
+def compile_profile(profile: Dict[str, Any] | None) -> Dict[str, Any] | None:
+    """Profile row -> xpaths for `extract`; None unless `learn` found a stable content selector."""
+    sel = (profile or {}).get("selectors") or {}
+    if not (profile or {}).get("learned") or not sel.get("content"):
+        return None
+    try:
+        return {"content": to_xpath(sel["content"]),
+                "title": to_xpath(sel["title"]) if sel.get("title") else "//title",
+                "min_chars": int(profile.get("min_chars") or 50)}
+    except ValueError:
+        return None
+
+def extract(content: bytes, compiled: Dict[str, Any]) -> Tuple[str, str] | None:
+    """(title, text) via the profile, or None when the page does not match it."""
+    try:
+        doc = lxml.html.document_fromstring(content.decode("utf-8", errors="ignore"))
+    except Exception:
+        return None
+    nodes = doc.xpath(compiled["content"])
+    if not nodes:
+        return None
+    text = _text(nodes[0])
+    if len(text) < compiled["min_chars"]:
+        return None
+    titles = doc.xpath(compiled["title"]) or doc.xpath("//title")
+    title = " ".join(_text(titles[0]).split()) if titles else ""
+    return title, text
+
+_cache: Dict[str, Tuple[float, Dict[str, Any] | None]] = {}
+
+async def profile_for(domain: str) -> Dict[str, Any] | None:
+    """Compiled profile of a domain (None if it has no usable one), cached for CACHE_TTL_S."""
+    hit = _cache.get(domain)
+    if hit and hit[0] > time.monotonic():
+        return hit[1]
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT profile FROM site_profiles WHERE domain = %s", (domain,), prepare=True)
+            row = await cur.fetchone()
+    compiled = compile_profile(row[0] if row else None)
+    _cache[domain] = (time.monotonic() + CACHE_TTL_S, compiled)
+    return compiled
+
+def invalidate(domain: str | None = None) -> None:
+    if domain is None:
+        _cache.clear()
+    else:
+        _cache.pop(domain, None)
+
+async def sample_urls(domain: str, n: int) -> List[str]:
+    """Up to `n` HTML page URLs: from crawl_queue, else straight from the sitemaps."""
+    from learner import walk_sitemaps
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT url FROM crawl_queue WHERE domain = %s AND url !~* '\\.(pdf|xml|json|zip|docx?|xlsx?|csv)$' "
+                "ORDER BY seq LIMIT 500",
+                (domain,),
+            )
+            urls = [r[0] for r in await cur.fetchall()]
+    if not urls:
+        async for _, pages in walk_sitemaps(domain, max_urls=500):
+            urls.extend(p.loc for p in pages if not re.search(r"\.(pdf|xml|json|zip|docx?|xlsx?|csv)$", p.loc, re.I))
+    return random.sample(urls, min(n, len(urls)))
+
+async def learn(domain: str, conf: Dict[str, Any], sample_pages: int | None = None) -> Dict[str, Any]:
+    """Fetch sample pages politely (robots.txt, crawl_rate) and infer the domain's profile."""
+    import crawl_queue, robots
+    from fetcher import fetch_url
+    html = conf.get("parsing", {}).get("html", {})
+    n = int(sample_pages or html.get("profile_sample_pages", 10))
+    user_agent = conf.get("user_agent", "OpenDiscourseGovDocs/0.1")
+    politeness_ms = int(conf.get("crawl", {}).get("politeness_ms", 1500))
+    rules = await robots.get_rules(domain, user_agent)
+    pages: List[bytes] = []
+    for url in await sample_urls(domain, n * 2):  # some will be non-HTML or fail
+        if len(pages) >= n:
+            break
+        if not rules.allowed(url):
+            continue
+        interval_ms = max(politeness_ms, int((rules.crawl_delay or 0) * 1000))
+        await asyncio.sleep(await crawl_queue.reserve_slot(domain, interval_ms))
+        try:
+            raw, ctype, _ = await fetch_url(url, user_agent)
+        except Exception as e:
+            log.info("pattern sample %s skipped: %s", url, e)
+            continue
+        if "html" in ctype:
+            pages.append(raw)
+    return await asyncio.to_thread(learn_profile, pages, float(html.get("profile_min_match", 0.8)))
@@ -0,0 +1,129 @@
+"""Sampling profiler for one domain, switched on at runtime through site settings:
+
+    set_site_settings("www.gao.gov", {"profiling": {"enabled": true, "interval_ms": 5, "duration_s": 120}})
+
+Every process that ingests the domain (API and workers) picks the change up via the
+site-settings NOTIFY, samples the stacks working on that domain, and on stop writes
+collapsed stacks (flamegraph.pl / speedscope format) to PROFILE_DIR.
+"""
+from __future__ import annotations
+import functools, logging, os, sys, threading, time
+from collections import Counter
+from typing import Any, Callable, Dict
+from settings import settings
+
+log = logging.getLogger("mcp_govdocs.profiler")
+
+# id(frame of an @attributed call) -> domain; found by walking a sampled stack
+_frame_domain: Dict[int, str] = {}
+# thread id -> domain for work pushed to threads via tagged()
+_thread_domain: Dict[int, str] = {}
+
+def attributed(fn: Callable) -> Callable:
+    """Mark an `async def f(domain, ...)` so samples taken inside it count for `domain`."""
+    @functools.wraps(fn)
+    async def wrapper(domain: str, *args: Any, **kwargs: Any) -> Any:
+        key = id(sys._getframe())
+        _frame_domain[key] = domain
+        try:
+            return await fn(domain, *args, **kwargs)
+        finally:
+            _frame_domain.pop(key, None)
+    return wrapper
+
+def tagged(domain: str, fn: Callable) -> Callable:
+    """Wrap a function run in a worker thread (asyncio.to_thread) so its samples count for `domain`."""
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        tid = threading.get_ident()
+        _thread_domain[tid] = domain
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _thread_domain.pop(tid, None)
+    return wrapper
+
+def _label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    def __init__(self, domain: str, interval_s: float, duration_s: float):
+        self.domain = domain
+        self.interval_s = interval_s
+        self.deadline = time.monotonic() + duration_s
+        self.samples: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{domain}", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _run(self) -> None:
+        global _expired
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            if time.monotonic() > self.deadline:
+                _expired = self.domain  # stays off until profiling is disabled and re-enabled
+                break
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                domain = _thread_domain.get(tid)
+                stack = []
+                f = frame
+                while f is not None:
+                    if domain is None and id(f) in _frame_domain:
+                        domain = _frame_domain[id(f)]
+                    stack.append(_label(f.f_code))
+                    f = f.f_back
+                if domain == self.domain:
+                    self.samples[";".join(reversed(stack))] += 1
+        self._dump()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _dump(self) -> None:
+        if not self.samples:
+            log.info("profile for %s: no samples", self.domain)
+            return
+        os.makedirs(settings.profile_dir, exist_ok=True)
+        path = os.path.join(settings.profile_dir, f"{self.domain}-{os.getpid()}-{int(time.time())}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in self.samples.most_common():
+                f.write(f"{stack} {n}\n")
+        top = ", ".join(f"{s.rsplit(';', 1)[-1]}={n}" for s, n in self.samples.most_common(5))
+        log.info("profile for %s: %d samples -> %s (top leaves: %s)", self.domain,
+                 sum(self.samples.values()), path, top)
+
+_active: SamplingProfiler | None = None
+_expired: str | None = None
+_lock = threading.Lock()
+
+def sync(domain: str, conf: Dict[str, Any]) -> None:
+    """Start or stop the profiler to match the domain's `profiling` settings (cheap when unchanged)."""
+    global _active, _expired
+    prof = conf.get("profiling") or {}
+    running = _active is not None and _active._thread.is_alive()
+    if not prof.get("enabled"):
+        if _expired == domain:
+            _expired = None
+        if running and _active.domain == domain:
+            stop()
+        return
+    if not running and _expired != domain:
+        with _lock:
+            if _active is None or not _active._thread.is_alive():
+                _active = SamplingProfiler(domain, float(prof.get("interval_ms", 10)) / 1000.0,
+                                           float(prof.get("duration_s", 300)))
+                _active.start()
+                log.info("profiling %s in pid %d", domain, os.getpid())
+
+def stop() -> None:
+    global _active
+    with _lock:
+        prof, _active = _active, None
+    if prof is not None:
+        prof.stop()
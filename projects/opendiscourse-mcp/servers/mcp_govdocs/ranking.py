@@ -0,0 +1,94 @@
+from __future__ import annotations
+import time
+from typing import Any, Dict, List
+import result_cache
+from config_loader import load_settings_for
+from db_pool import pool
+
+FEATURES = ("volume", "freshness", "quality", "reliability")
+
+# One pass over documents (+ crawl outcomes) per refresh; every feature lands in [0, 1]:
+#   volume      log(1 + docs), relative to the largest domain
+#   freshness   0.5 ** (days since the newest document / half-life)
+#   quality     share of documents whose extracted text has at least min_text_chars
+#               (octet_length reads the TOAST header, the text is not decompressed)
+#   reliability evaluate_domain's score, averaged with the crawl success rate once there is one
+REFRESH_SQL = """
+WITH docs AS (
+    SELECT d.domain, count(*) AS n, max(COALESCE(d.published_at, d.retrieved_at)) AS last_doc_at,
+           avg((COALESCE(octet_length(t.text), 0) >= %(min_chars)s)::int) AS quality
+    FROM documents d LEFT JOIN document_text t ON t.doc_id = d.id
+    GROUP BY d.domain
+), crawl AS (
+    SELECT domain, count(*) FILTER (WHERE state = 'done') AS ok, count(*) AS finished
+    FROM crawl_queue WHERE state IN ('done', 'failed') GROUP BY domain
+), feats AS (
+    SELECT g.domain, COALESCE(docs.n, 0) AS n, docs.last_doc_at,
+           COALESCE(ln(1 + docs.n) / NULLIF(max(ln(1 + docs.n)) OVER (), 0), 0) AS volume,
+           COALESCE(power(0.5, extract(epoch FROM now() - docs.last_doc_at) / 86400.0 / %(half_life)s), 0) AS freshness,
+           COALESCE(docs.quality, 0) AS quality,
+           LEAST(GREATEST(CASE WHEN crawl.finished > 0
+                               THEN (COALESCE(g.reliability_score, 0) + crawl.ok::float8 / crawl.finished) / 2
+                               ELSE COALESCE(g.reliability_score, 0) END, 0), 1) AS reliability
+    FROM gov_domains g LEFT JOIN docs USING (domain) LEFT JOIN crawl USING (domain)
+)
+INSERT INTO domain_scores AS s (domain, score, volume, freshness, quality, reliability, docs, last_doc_at, computed_at)
+SELECT domain,
+       %(volume)s * volume + %(freshness)s * freshness + %(quality)s * quality + %(reliability)s * reliability,
+       volume, freshness, quality, reliability, n, last_doc_at, now()
+FROM feats
+ON CONFLICT (domain) DO UPDATE SET
+    score = EXCLUDED.score, volume = EXCLUDED.volume, freshness = EXCLUDED.freshness,
+    quality = EXCLUDED.quality, reliability = EXCLUDED.reliability, docs = EXCLUDED.docs,
+    last_doc_at = EXCLUDED.last_doc_at, computed_at = EXCLUDED.computed_at
+"""
+
+def weights_from(conf: Dict[str, Any], override: Dict[str, float] | None = None) -> Dict[str, float]:
+    """ranking.weights (optionally overridden), normalized to sum to 1."""
+    w = {k: float(v) for k, v in (conf.get("ranking", {}).get("weights") or {}).items() if k in FEATURES}
+    w.update({k: float(v) for k, v in (override or {}).items() if k in FEATURES})
+    if any(v < 0 for v in w.values()):
+        raise ValueError("ranking weights must be >= 0")
+    total = sum(w.values())
+    if total <= 0:
+        raise ValueError("at least one ranking weight must be > 0")
+    return {k: w.get(k, 0.0) / total for k in FEATURES}
+
+async def refresh_scores(weights: Dict[str, float] | None = None) -> Dict[str, Any]:
+    conf = load_settings_for()
+    w = weights_from(conf, weights)
+    params = {
+        **w,
+        "min_chars": int(conf.get("parsing", {}).get("html", {}).get("min_text_chars", 500)),
+        "half_life": float(conf.get("ranking", {}).get("freshness_half_life_days", 30)),
+    }
+    t0 = time.perf_counter()
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SET LOCAL statement_timeout = 0")
+            await cur.execute(REFRESH_SQL, params)
+            n = cur.rowcount
+        await conn.commit()
+    await result_cache.invalidate("domain_scores")
+    return {"domains": n, "weights": w, "seconds": round(time.perf_counter() - t0, 3)}
+
+async def top_domains(limit: int = 20) -> List[Dict[str, Any]]:
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT domain, score, volume, freshness, quality, reliability, docs, last_doc_at, computed_at "
+                "FROM domain_scores ORDER BY score DESC, domain LIMIT %s",
+                (limit,),
+                prepare=True,
+            )
+            rows = await cur.fetchall()
+    keys = ("domain", "score", "volume", "freshness", "quality", "reliability", "docs", "last_doc_at", "computed_at")
+    out = []
+    for row in rows:
+        item = dict(zip(keys, row))
+        for k in ("last_doc_at", "computed_at"):
+            item[k] = item[k].isoformat() if item[k] else None
+        for k in ("score",) + FEATURES:
+            item[k] = round(float(item[k]), 4)
+        out.append(item)
+    return out
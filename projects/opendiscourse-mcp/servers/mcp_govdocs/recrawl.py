@@ -0,0 +1,109 @@
+"""Adaptive re-crawl scheduling.
+
+Each visit of a URL records whether its content hash changed. The change rate is estimated
+as (changes + 1) / (days observed + prior days), the prior coming from the sitemap's
+<changefreq> (or crawl.recrawl_default_days), and the next visit is due after 1 / rate days,
+clamped to [recrawl_min_hours, recrawl_max_days]. Press-release pages that change on most
+visits converge to the minimum; pages that never change back off towards the maximum.
+
+The scheduler tick requeues due URLs in priority order (how overdue x domain score) up to the
+global hourly budget and queues crawl jobs for them. It also re-walks domain sitemaps, more
+often while walks keep finding new URLs.
+"""
+from __future__ import annotations
+import math
+from typing import Any, Dict, Iterable, List, Tuple
+import crawl_queue
+from db_pool import pool
+
+CHANGEFREQ_DAYS = {"always": 1 / 24, "hourly": 1 / 24, "daily": 1.0, "weekly": 7.0, "monthly": 30.0,
+                   "yearly": 365.0, "never": 3650.0}
+RESEED_MIN_DAYS = 0.25
+RESEED_MAX_DAYS = 30.0
+
+def recrawl_config(conf: Dict[str, Any]) -> Dict[str, float]:
+    crawl = conf.get("crawl", {})
+    return {
+        "default_days": float(crawl.get("recrawl_default_days", 7)),
+        "min_days": float(crawl.get("recrawl_min_hours", 1)) / 24,
+        "max_days": float(crawl.get("recrawl_max_days", 90)),
+    }
+
+def revisit_interval(changes: int, observed_days: float, changefreq: str | None,
+                     cfg: Dict[str, float]) -> Tuple[float, float]:
+    """-> (estimated changes per day, days until the next visit)."""
+    prior = CHANGEFREQ_DAYS.get((changefreq or "").lower(), cfg["default_days"])
+    rate = (changes + 1) / (max(observed_days, 0.0) + prior)
+    return rate, min(max(1 / rate, cfg["min_days"]), cfg["max_days"])
+
+async def record_visits(cur, domain: str, ok: List[int], changed: Iterable[int], cfg: Dict[str, float]) -> int:
+    """Mark fetched URLs done, update their change history and schedule the next visit."""
+    await cur.execute(
+        "UPDATE crawl_queue SET state = 'done', last_error = NULL, visits = visits + 1, "
+        "changes = changes + CASE WHEN visits > 0 AND seq = ANY(%s) THEN 1 ELSE 0 END, "
+        "first_visit_at = COALESCE(first_visit_at, now()), last_visit_at = now() "
+        "WHERE domain = %s AND seq = ANY(%s) AND state = 'running' "
+        "RETURNING seq, changes, extract(epoch FROM now() - first_visit_at) / 86400.0, changefreq",
+        (list(changed), domain, ok),
+    )
+    rows = await cur.fetchall()
+    if rows:
+        plan = [(seq, *revisit_interval(int(ch), float(days), freq, cfg)) for seq, ch, days, freq in rows]
+        await cur.execute(
+            "UPDATE crawl_queue q SET change_rate = p.rate, next_visit_at = now() + make_interval(secs => p.days * 86400) "
+            "FROM unnest(%s::bigint[], %s::float8[], %s::float8[]) AS p(seq, rate, days) "
+            "WHERE q.domain = %s AND q.seq = p.seq",
+            ([p[0] for p in plan], [p[1] for p in plan], [p[2] for p in plan], domain),
+        )
+    return len(rows)
+
+def next_reseed_days(current: float, added: int) -> float:
+    """Halve the sitemap re-walk interval while walks find new URLs, double it while they don't."""
+    days = current / 2 if added > 0 else current * 2
+    return min(max(days, RESEED_MIN_DAYS), RESEED_MAX_DAYS)
+
+REQUEUE_SQL = """
+WITH due AS (
+    SELECT q.domain, q.seq FROM crawl_queue q LEFT JOIN domain_scores s ON s.domain = q.domain
+    WHERE q.state = 'done' AND q.next_visit_at <= now()
+    -- overdue relative to the planned interval, weighted by domain value
+    ORDER BY (extract(epoch FROM now() - q.next_visit_at)
+              / GREATEST(extract(epoch FROM q.next_visit_at - COALESCE(q.last_visit_at, q.next_visit_at)), 3600) + 1)
+             * (0.5 + COALESCE(s.score, 0)) DESC
+    LIMIT %s
+    FOR UPDATE OF q SKIP LOCKED
+), requeued AS (
+    UPDATE crawl_queue q SET state = 'pending', attempts = 0
+    FROM due WHERE q.domain = due.domain AND q.seq = due.seq
+    RETURNING q.domain
+)
+SELECT domain, count(*) FROM requeued GROUP BY domain
+"""
+
+async def tick(budget_per_hour: int, tick_s: float) -> Dict[str, Any]:
+    """Queue this tick's share of the hourly revisit budget, most valuable work first."""
+    quota = max(1, math.floor(budget_per_hour * tick_s / 3600))
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(REQUEUE_SQL, (quota,))
+            revisits = {d: int(n) for d, n in await cur.fetchall()}
+            for domain, n in revisits.items():
+                await cur.execute("UPDATE crawl_cursors SET pos = GREATEST(pos - %s, 0) WHERE domain = %s", (n, domain))
+            await cur.execute(
+                "UPDATE crawl_cursors SET seeded_at = NULL "
+                "WHERE seeded_at < now() - make_interval(secs => reseed_days * 86400) RETURNING domain"
+            )
+            reseed = [r[0] for r in await cur.fetchall()]
+            if reseed:
+                # sitemaps without <lastmod> can't tell us they changed: read them again
+                await cur.execute("DELETE FROM sitemap_walk WHERE domain = ANY(%s) AND lastmod IS NULL", (reseed,))
+        await conn.commit()
+    left = quota - sum(revisits.values())
+    jobs = []
+    for domain in sorted(set(revisits) | set(reseed)):
+        n = revisits.get(domain, 0)
+        if domain in reseed:
+            # the job re-walks the sitemaps first; give new URLs a share of what is left
+            n += max(1, left // max(len(reseed), 1))
+        jobs.append((await crawl_queue.submit_job(domain, n, True))["job_id"])
+    return {"quota": quota, "revisits": sum(revisits.values()), "reseeded": reseed, "jobs": len(jobs)}
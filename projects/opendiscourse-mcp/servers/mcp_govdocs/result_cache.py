@@ -0,0 +1,132 @@
+"""Result cache for read-only MCP tools: in-process LRU, plus Redis when REDIS_URL is set.
+
+Tools opt in with @cached(ttl_s, tags). Entries are keyed by tool, params and the current
+generation of each of the call's tags; write paths call `invalidate(tag, ...)`, which bumps
+the generations so older entries are never read again and age out of the LRU/TTL.
+
+Tags in use:
+    docs:*         any document text changed (ingest, OCR, bulk load)
+    docs:<domain>  a document of that domain changed
+    vectors        document_chunks changed (vectorize / revectorize)
+    settings:<domain>, domain_scores
+
+With Redis the generations live there too, so ingests by workers invalidate the API's
+cache; without it each process only sees its own writes and TTLs bound the staleness.
+"""
+from __future__ import annotations
+import functools, hashlib, json, logging, time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Tuple
+import metrics
+from settings import settings
+
+log = logging.getLogger("mcp_govdocs.result_cache")
+
+PREFIX = "govdocs:rc:"
+
+def cached(ttl_s: float, tags: Callable[..., Iterable[str]] | Iterable[str] = ()) -> Callable:
+    """Declare a tool cacheable; `tags` is a list or a function of the tool's params."""
+    def mark(fn: Callable) -> Callable:
+        fn.cache_ttl_s = ttl_s
+        fn.cache_tags = tags
+        return fn
+    return mark
+
+class ResultCache:
+    def __init__(self, max_entries: int, redis_url: str = ""):
+        self.max_entries = max_entries
+        self._lru: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        self._gens: Dict[str, int] = {}
+        self._redis = None
+        if redis_url:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._redis_down_until = 0.0
+
+    def _redis_ok(self) -> bool:
+        return self._redis is not None and time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, e: Exception) -> None:
+        # local-only for a while instead of paying a timeout on every call
+        log.warning("result cache: redis unavailable (%s); local only for 30s", e)
+        self._redis_down_until = time.monotonic() + 30
+
+    async def _generations(self, tags: List[str]) -> List[int]:
+        if tags and self._redis_ok():
+            try:
+                vals = await self._redis.mget([f"{PREFIX}gen:{t}" for t in tags])
+                return [int(v or 0) for v in vals]
+            except Exception as e:
+                self._redis_failed(e)
+        return [self._gens.get(t, 0) for t in tags]
+
+    async def _key(self, tool: str, params: Dict[str, Any], tags: List[str]) -> str:
+        gens = await self._generations(tags)
+        blob = json.dumps([params, tags, gens], sort_keys=True, default=str)
+        return f"{PREFIX}{tool}:{hashlib.sha256(blob.encode()).hexdigest()}"
+
+    async def get_or_call(self, tool: str, params: Dict[str, Any], ttl_s: float, tags: List[str],
+                          call: Callable[[], Awaitable[Any]]) -> Any:
+        key = await self._key(tool, params, tags)
+        hit = self._lru.get(key)
+        if hit and hit[0] > time.monotonic():
+            self._lru.move_to_end(key)
+            metrics.result_cache_requests.labels(tool, "hit_local").inc()
+            return hit[1]
+        if self._redis_ok():
+            try:
+                raw = await self._redis.get(key)
+                if raw is not None:
+                    value = json.loads(raw)
+                    self._put(key, value, ttl_s)
+                    metrics.result_cache_requests.labels(tool, "hit_redis").inc()
+                    return value
+            except Exception as e:
+                self._redis_failed(e)
+        metrics.result_cache_requests.labels(tool, "miss").inc()
+        value = await call()
+        self._put(key, value, ttl_s)
+        if self._redis_ok():
+            try:
+                await self._redis.set(key, json.dumps(value, default=str), px=int(ttl_s * 1000))
+            except Exception as e:
+                self._redis_failed(e)
+        return value
+
+    def _put(self, key: str, value: Any, ttl_s: float) -> None:
+        self._lru[key] = (time.monotonic() + ttl_s, value)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    async def invalidate(self, *tags: str) -> None:
+        for t in tags:
+            self._gens[t] = self._gens.get(t, 0) + 1
+        if tags and self._redis_ok():
+            try:
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    for t in tags:
+                        pipe.incr(f"{PREFIX}gen:{t}")
+                    await pipe.execute()
+            except Exception as e:
+                self._redis_failed(e)
+        metrics.result_cache_invalidations.inc(len(tags))
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+
+cache = ResultCache(settings.result_cache_max_entries, settings.redis_url)
+
+async def invalidate(*tags: str) -> None:
+    """Bump tag generations; never fails the write path that calls it."""
+    try:
+        await cache.invalidate(*tags)
+    except Exception:
+        log.exception("result cache invalidation failed")
+
+async def invalidate_docs(domains: Iterable[str]) -> None:
+    await invalidate("docs:*", *(f"docs:{d}" for d in set(domains)))
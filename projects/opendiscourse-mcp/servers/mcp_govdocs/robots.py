@@ -0,0 +1,135 @@
+from __future__ import annotations
+import asyncio, logging, re, time, urllib.parse
+from typing import Dict, List, Tuple
+import httpx
+from settings import settings
+
+log = logging.getLogger("mcp_govdocs.robots")
+
+TTL_S = 24 * 3600        # RFC 9309 suggests caching up to 24h
+ERROR_TTL_S = 600        # retry sooner after 5xx / network errors
+MAX_ROBOTS_BYTES = 500 * 1024
+
+class RobotsRules:
+    """Rules of the robots.txt group that applies to one user agent.
+
+    Matching follows RFC 9309: the longest matching pattern wins and Allow wins ties. Rules
+    are pre-sorted in that order and wildcard patterns pre-compiled, so `allowed` is a scan
+    of plain `startswith` checks for the common case.
+    """
+
+    def __init__(self, rules: List[Tuple[bool, str]] | None = None, crawl_delay: float | None = None,
+                 sitemaps: List[str] | None = None, disallow_all: bool = False):
+        self.crawl_delay = crawl_delay
+        self.sitemaps = sitemaps or []
+        self.disallow_all = disallow_all
+        self._rules: List[Tuple[bool, str, re.Pattern | None]] = []
+        for allow, pattern in sorted(rules or [], key=lambda r: (-len(r[1]), not r[0])):
+            compiled = None
+            if "*" in pattern or pattern.endswith("$"):
+                body = pattern[:-1] if pattern.endswith("$") else pattern
+                rx = ".*".join(re.escape(part) for part in body.split("*"))
+                compiled = re.compile(rx + ("$" if pattern.endswith("$") else ""))
+            self._rules.append((allow, pattern, compiled))
+
+    def allowed(self, url: str) -> bool:
+        if self.disallow_all:
+            return False
+        parts = urllib.parse.urlsplit(url)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        if path == "/robots.txt":
+            return True
+        for allow, pattern, compiled in self._rules:
+            if compiled.match(path) if compiled else path.startswith(pattern):
+                return allow
+        return True
+
+def _agent_token(user_agent: str) -> str:
+    # "OpenDiscourseGovDocs/0.1 (+https://...)" -> "opendiscoursegovdocs"
+    return re.split(r"[/\s]", user_agent.strip(), 1)[0].lower()
+
+def parse_robots(text: str, user_agent: str) -> RobotsRules:
+    """Pick the group naming our product token (else `*`) and merge its rules."""
+    token = _agent_token(user_agent)
+    groups: Dict[str, Dict[str, list]] = {}
+    sitemaps: List[str] = []
+    agents: List[str] = []
+    in_rules = False
+    for raw in text.splitlines():
+        line = raw.split("#", 1)[0].strip()
+        if ":" not in line:
+            continue
+        field, value = (x.strip() for x in line.split(":", 1))
+        field = field.lower()
+        if field == "sitemap":
+            sitemaps.append(value)
+        elif field == "user-agent":
+            if in_rules:  # a user-agent after rules starts a new group
+                agents, in_rules = [], False
+            agents.append(value.lower())
+            groups.setdefault(value.lower(), {"rules": [], "delay": []})
+        elif field in ("allow", "disallow", "crawl-delay") and agents:
+            in_rules = True
+            for agent in agents:
+                group = groups[agent]
+                if field == "crawl-delay":
+                    try:
+                        group["delay"].append(float(value))
+                    except ValueError:
+                        pass
+                elif value:  # "Disallow:" with no path allows everything
+                    group["rules"].append((field == "allow", value))
+    matched = groups.get(token) if token != "*" else None
+    group = matched or groups.get("*") or {"rules": [], "delay": []}
+    delay = max(group["delay"]) if group["delay"] else None
+    return RobotsRules(group["rules"], delay, sitemaps)
+
+def origin(domain: str) -> str:
+    """https://<domain>, unless CRAWL_ORIGINS maps it elsewhere ("*.bench.gov=http://fixture:8080,...");
+    used by benchmarks and for internal mirrors."""
+    for entry in filter(None, (e.strip() for e in settings.crawl_origins.split(","))):
+        pattern, _, target = entry.partition("=")
+        pattern = pattern.strip()
+        if domain == pattern or (pattern.startswith("*.") and domain.endswith(pattern[1:])):
+            return target.strip().rstrip("/")
+    return f"https://{domain}"
+
+# keyed by (domain, agent token): the group parse_robots picks depends on the user agent
+_cache: Dict[Tuple[str, str], Tuple[float, RobotsRules]] = {}
+_inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+
+async def _fetch(domain: str, user_agent: str) -> Tuple[RobotsRules, float]:
+    url = f"{origin(domain)}/robots.txt"
+    try:
+        async with httpx.AsyncClient(follow_redirects=True, timeout=15.0,
+                                     headers={"User-Agent": user_agent}) as client:
+            r = await client.get(url)
+    except httpx.HTTPError as e:
+        log.warning("robots.txt for %s unreachable (%s); crawling paused", domain, e)
+        return RobotsRules(disallow_all=True), ERROR_TTL_S
+    if r.status_code >= 500:
+        return RobotsRules(disallow_all=True), ERROR_TTL_S
+    if r.status_code >= 400:  # no robots.txt: everything is allowed
+        return RobotsRules(), TTL_S
+    return parse_robots(r.content[:MAX_ROBOTS_BYTES].decode("utf-8", errors="ignore"), user_agent), TTL_S
+
+async def get_rules(domain: str, user_agent: str = "OpenDiscourseGovDocs/0.1") -> RobotsRules:
+    """Cached robots rules for a domain and user agent; concurrent misses share one fetch."""
+    key = (domain, _agent_token(user_agent))
+    hit = _cache.get(key)
+    if hit and hit[0] > time.monotonic():
+        return hit[1]
+    task = _inflight.get(key)
+    if task is None:
+        task = _inflight[key] = asyncio.create_task(_fetch(domain, user_agent))
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    rules, ttl = await asyncio.shield(task)
+    _cache[key] = (time.monotonic() + ttl, rules)
+    return rules
+
+def invalidate(domain: str | None = None) -> None:
+    if domain is None:
+        _cache.clear()
+    else:
+        for key in [k for k in _cache if k[0] == domain]:
+            _cache.pop(key, None)
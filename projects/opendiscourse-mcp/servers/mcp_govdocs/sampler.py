@@ -0,0 +1,183 @@
+"""Sample ingest for many domains at once (onboarding).
+
+A run samples up to `concurrency` domains concurrently. Within a domain, sitemap discovery
+and page fetches share `per_host` connections and the global crawl_rate politeness slots.
+Each domain's result lands in sample_results as soon as it finishes; get_sample_run and
+GET /sample_runs/{id}/events stream them back in commit order (`seq`). The running process
+heartbeats the run; readers mark a run whose heartbeat is older than SAMPLE_RUN_LEASE_S failed.
+"""
+from __future__ import annotations
+import asyncio, hashlib, json, logging
+from typing import Any, Dict, List
+import crawl_queue, robots, site_settings
+from db_pool import pool
+from settings import settings
+
+log = logging.getLogger("mcp_govdocs.sampler")
+
+# run id -> task; runs live in the API process that started them
+_runs: Dict[str, asyncio.Task] = {}
+
+async def _stored_samples(domain: str) -> List[str]:
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT profile FROM site_profiles WHERE domain = %s", (domain,))
+            row = await cur.fetchone()
+    return list((row[0] or {}).get("samples", [])) if row else []
+
+async def _store_samples(domain: str, samples: List[str]) -> None:
+    # merged into the profile so later samples (and crawl_sample) skip discovery
+    part = json.dumps({"samples": samples}, sort_keys=True)
+    async with pool.connection() as conn:
+        await conn.execute(
+            "INSERT INTO site_profiles (domain, profile, profile_hash) VALUES (%s, %s::jsonb, %s) "
+            "ON CONFLICT (domain) DO UPDATE SET profile = site_profiles.profile || EXCLUDED.profile",
+            (domain, part, hashlib.sha256(part.encode()).hexdigest()),
+        )
+        await conn.commit()
+
+async def sample_domain(domain: str, max_docs: int, per_host: int = 2) -> Dict[str, Any]:
+    """Ingest up to `max_docs` sitemap URLs of one domain; discovery only when none are stored."""
+    from fetcher import ingest_url
+    from learner import walk_sitemaps
+    conf = await site_settings.effective(domain)
+    user_agent = conf.get("user_agent", "OpenDiscourseGovDocs/0.1")
+    politeness_ms = int(conf.get("crawl", {}).get("politeness_ms", 1500))
+    rules = await robots.get_rules(domain, user_agent)
+    samples = [u for u in await _stored_samples(domain) if rules.allowed(u)][:max_docs]
+    if not samples:
+        found: List[str] = []
+        # sitemaps are fetched `per_host` at a time and the walk stops once enough URLs are in
+        async for _, pages in walk_sitemaps(domain, concurrency=per_host, max_urls=max(max_docs * 5, 50)):
+            found.extend(p.loc for p in pages)
+        if found:
+            await _store_samples(domain, found[:50])
+        samples = [u for u in found if rules.allowed(u)][:max_docs]
+    interval_ms = max(politeness_ms, int((rules.crawl_delay or 0) * 1000))
+    limit = asyncio.Semaphore(per_host)
+
+    async def one(url: str) -> Dict[str, Any]:
+        async with limit:
+            await asyncio.sleep(await crawl_queue.reserve_slot(domain, interval_ms))
+            try:
+                return await ingest_url(domain, url)
+            except Exception as e:
+                return {"ingested": 0, "error": str(e), "url": url}
+
+    results = await asyncio.gather(*(one(u) for u in samples))
+    return {"domain": domain, "attempted": len(samples), "ingested": sum(r.get("ingested", 0) for r in results),
+            "errors": sum(1 for r in results if "error" in r), "last": results[-1] if results else None}
+
+async def _record(run_id: str, domain: str, res: Dict[str, Any] | None, error: str | None) -> None:
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            # the run's row lock serializes writers until commit, so seq order is visibility order
+            await cur.execute("UPDATE sample_runs SET recorded = recorded + 1, heartbeat_at = now() "
+                              "WHERE id = %s RETURNING recorded", (run_id,))
+            seq = (await cur.fetchone())[0]
+            await cur.execute(
+                "INSERT INTO sample_results (run_id, seq, domain, attempted, ingested, error, result) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s::jsonb) ON CONFLICT (run_id, domain) DO NOTHING",
+                (run_id, seq, domain, (res or {}).get("attempted", 0), (res or {}).get("ingested", 0), error,
+                 json.dumps(res, default=str) if res else None),
+            )
+        await conn.commit()
+
+async def _heartbeat(run_id: str) -> None:
+    while True:
+        await asyncio.sleep(settings.sample_run_lease_s / 3)
+        try:
+            async with pool.connection() as conn:
+                await conn.execute("UPDATE sample_runs SET heartbeat_at = now() WHERE id = %s AND state = 'running'",
+                                   (run_id,))
+                await conn.commit()
+        except Exception as e:
+            log.warning("sample run %s heartbeat failed: %s", run_id, e)
+
+async def _run(run_id: str, domains: List[str], max_docs: int, concurrency: int, per_host: int) -> None:
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(domain: str) -> None:
+        async with limit:
+            try:
+                res, error = await sample_domain(domain, max_docs, per_host), None
+            except Exception as e:
+                log.warning("sampling %s failed: %s", domain, e)
+                res, error = None, str(e)[:2000]
+            try:
+                await _record(run_id, domain, res, error)
+            except Exception as e:
+                # one lost result must not abort the run (and orphan the other domains' tasks)
+                log.warning("recording %s for sample run %s failed: %s", domain, run_id, e)
+
+    state = "cancelled"
+    beat = asyncio.create_task(_heartbeat(run_id))
+    tasks = [asyncio.create_task(one(d)) for d in domains]
+    try:
+        await asyncio.gather(*tasks)
+        state = "done"
+    except Exception:
+        log.exception("sample run %s failed", run_id)
+        state = "failed"
+    finally:
+        beat.cancel()
+        for t in tasks:  # nothing writes to the run once it is finished
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        async with pool.connection() as conn:
+            await conn.execute("UPDATE sample_runs SET state = %s, finished_at = now() WHERE id = %s",
+                               (state, run_id))
+            await conn.commit()
+        _runs.pop(run_id, None)
+
+async def start(domains: List[str], max_docs: int, concurrency: int, per_host: int) -> str:
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.executemany("INSERT INTO gov_domains (domain) VALUES (%s) ON CONFLICT (domain) DO NOTHING",
+                                  [(d,) for d in domains])
+            await cur.execute("INSERT INTO sample_runs (domains, max_docs) VALUES (%s, %s) RETURNING id::text",
+                              (len(domains), max_docs))
+            run_id = (await cur.fetchone())[0]
+        await conn.commit()
+    _runs[run_id] = asyncio.create_task(_run(run_id, domains, max_docs, concurrency, per_host))
+    return run_id
+
+async def progress(run_id: str, after: int = 0, limit: int = 500) -> Dict[str, Any] | None:
+    """Run state plus the results recorded after seq `after` (pass back `next`)."""
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            # the owning process died (no heartbeat within the lease): the run won't finish
+            await cur.execute(
+                "UPDATE sample_runs SET state = 'failed', finished_at = now() WHERE id = %s AND state = 'running' "
+                "AND heartbeat_at < now() - make_interval(secs => %s)",
+                (run_id, settings.sample_run_lease_s),
+            )
+            await conn.commit()
+            await cur.execute(
+                "SELECT r.state, r.domains, count(s.id), COALESCE(sum(s.ingested), 0), count(s.error) "
+                "FROM sample_runs r LEFT JOIN sample_results s ON s.run_id = r.id WHERE r.id = %s GROUP BY r.id",
+                (run_id,),
+            )
+            head = await cur.fetchone()
+            if head is None:
+                return None
+            await cur.execute(
+                "SELECT seq, domain, attempted, ingested, error FROM sample_results "
+                "WHERE run_id = %s AND seq > %s ORDER BY seq LIMIT %s",
+                (run_id, after, limit),
+            )
+            rows = await cur.fetchall()
+    state, total, done, ingested, failed = head
+    return {
+        "run_id": run_id, "state": state, "domains": total, "finished": done, "ingested": int(ingested),
+        "failed": failed,
+        "results": [{"domain": d, "attempted": a, "ingested": i, "error": e} for _, d, a, i, e in rows],
+        "next": rows[-1][0] if rows else after,
+    }
+
+async def shutdown() -> None:
+    """Cancel runs of this process; finished domains stay recorded, the run ends 'cancelled'."""
+    tasks = list(_runs.values())
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
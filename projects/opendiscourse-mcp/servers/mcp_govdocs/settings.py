@@ -7,5 +7,32 @@ class Settings(BaseModel):
     postgres_db: str = Field(default=os.environ.get("POSTGRES_DB", "opendiscourse"))
     postgres_user: str = Field(default=os.environ.get("POSTGRES_USER", "opendiscourse"))
     postgres_password: str = Field(default=os.environ.get("POSTGRES_PASSWORD", "opendiscourse"))
+    db_pool_min_size: int = Field(default=int(os.environ.get("DB_POOL_MIN_SIZE", "2")))
+    db_pool_max_size: int = Field(default=int(os.environ.get("DB_POOL_MAX_SIZE", "10")))
+    db_pool_timeout_s: float = Field(default=float(os.environ.get("DB_POOL_TIMEOUT_S", "10")))
+    db_statement_timeout_ms: int = Field(default=int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "15000")))
+    db_prepare_threshold: int = Field(default=int(os.environ.get("DB_PREPARE_THRESHOLD", "5")))
+    mcp_batch_max: int = Field(default=int(os.environ.get("MCP_BATCH_MAX", "500")))
+    mcp_batch_concurrency: int = Field(default=int(os.environ.get("MCP_BATCH_CONCURRENCY", "8")))
+    mcp_call_timeout_s: float = Field(default=float(os.environ.get("MCP_CALL_TIMEOUT_S", "120")))
+    mcp_long_call_timeout_s: float = Field(default=float(os.environ.get("MCP_LONG_CALL_TIMEOUT_S", "0")))
+    worker_concurrency: int = Field(default=int(os.environ.get("WORKER_CONCURRENCY", "4")))
+    worker_poll_s: float = Field(default=float(os.environ.get("WORKER_POLL_S", "2")))
+    worker_job_lease_s: int = Field(default=int(os.environ.get("WORKER_JOB_LEASE_S", "300")))
+    rank_refresh_s: float = Field(default=float(os.environ.get("RANK_REFRESH_S", "3600")))
+    recrawl_budget_per_hour: int = Field(default=int(os.environ.get("RECRAWL_BUDGET_PER_HOUR", "2000")))
+    recrawl_tick_s: float = Field(default=float(os.environ.get("RECRAWL_TICK_S", "300")))
+    crawl_origins: str = Field(default=os.environ.get("CRAWL_ORIGINS", ""))
+    redis_url: str = Field(default=os.environ.get("REDIS_URL", ""))
+    result_cache_max_entries: int = Field(default=int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "2048")))
+    sample_concurrency: int = Field(default=int(os.environ.get("SAMPLE_CONCURRENCY", "16")))
+    sample_per_host: int = Field(default=int(os.environ.get("SAMPLE_PER_HOST", "2")))
+    sample_run_lease_s: float = Field(default=float(os.environ.get("SAMPLE_RUN_LEASE_S", "60")))
+    ocr_runners: int = Field(default=int(os.environ.get("OCR_RUNNERS", "1")))
+    worker_metrics_port: int = Field(default=int(os.environ.get("WORKER_METRICS_PORT", "9101")))
+    otel_enabled: bool = Field(default=os.environ.get("OTEL_ENABLED", "").lower() in ("1", "true", "yes"))
+    bulk_ingest_root: str = Field(default=os.environ.get("BULK_INGEST_ROOT", "/data/bulk"))
+    bulk_ingest_max_inflight_bytes: int = Field(default=int(os.environ.get("BULK_INGEST_MAX_INFLIGHT_BYTES", str(512 * 1024 * 1024))))
+    profile_dir: str = Field(default=os.environ.get("PROFILE_DIR", "/tmp/govdocs-profiles"))
 
 settings = Settings()
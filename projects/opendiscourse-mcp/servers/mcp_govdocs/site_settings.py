@@ -0,0 +1,91 @@
+from __future__ import annotations
+import asyncio, logging
+from typing import Any, Dict, Tuple
+import psycopg
+from config_loader import deep_merge, load_settings_for
+from db import get_db_dsn
+from db_pool import pool
+
+log = logging.getLogger("mcp_govdocs.site_settings")
+
+CHANNEL = "site_settings_changed"  # see 0007_site_settings_notify.sql
+
+# domain -> DB override ({} when the domain has no site_settings row)
+_overrides: Dict[str, Dict[str, Any]] = {}
+# domain -> (file-settings dict it was built from, merged); config_loader replaces that
+# dict when a YAML file changes, so identity tells us whether the file layer is stale.
+_effective: Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+_listener: asyncio.Task | None = None
+# bumped by every invalidation; a read that raced one (NOTIFY during its SELECT) isn't cached
+_generation = 0
+
+def invalidate(domain: str | None = None) -> None:
+    """Drop the DB layer for one domain (or all) so the next read refetches it."""
+    global _generation
+    _generation += 1
+    if domain is None:
+        _overrides.clear()
+        _effective.clear()
+    else:
+        _overrides.pop(domain, None)
+        _effective.pop(domain, None)
+
+async def _override_for(domain: str) -> Dict[str, Any]:
+    if domain in _overrides:
+        return _overrides[domain]
+    gen = _generation
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT settings FROM site_settings WHERE domain = %s", (domain,), prepare=True)
+            row = await cur.fetchone()
+    override = row[0] if row and row[0] else {}
+    if gen == _generation:
+        _overrides[domain] = override
+    return override
+
+async def effective(domain: str) -> Dict[str, Any]:
+    """default.yml <- sites/<domain>.yml <- site_settings row, deep-merged and served from memory.
+
+    Treat the result as read-only; it is shared between callers.
+    """
+    files = load_settings_for(domain)
+    cached = _effective.get(domain)
+    if cached and cached[0] is files:
+        return cached[1]
+    gen = _generation
+    override = await _override_for(domain)
+    merged = deep_merge(files, override) if override else files
+    if gen == _generation:
+        _effective[domain] = (files, merged)
+    return merged
+
+async def _listen() -> None:
+    backoff = 1.0
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(get_db_dsn(), autocommit=True) as conn:
+                await conn.execute(f"LISTEN {CHANNEL}")
+                # anything cached before LISTEN took effect may be stale
+                invalidate()
+                backoff = 1.0
+                async for note in conn.notifies():
+                    invalidate(note.payload or None)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.warning("site_settings listener lost, retrying in %.0fs", backoff, exc_info=True)
+            invalidate()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+def start_listener() -> None:
+    global _listener
+    if _listener is None or _listener.done():
+        _listener = asyncio.create_task(_listen())
+
+async def stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.cancel()
+        await asyncio.gather(_listener, return_exceptions=True)
+        _listener = None
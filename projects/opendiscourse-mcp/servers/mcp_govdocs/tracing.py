@@ -0,0 +1,42 @@
+from __future__ import annotations
+import logging
+from contextlib import contextmanager, nullcontext
+from typing import Any, Iterator
+from settings import settings
+
+log = logging.getLogger("mcp_govdocs.tracing")
+
+_tracer = None
+
+def setup_tracing(service_name: str) -> None:
+    """Enable OpenTelemetry spans when OTEL_ENABLED is set and the SDK is installed.
+
+    Spans go to the OTLP exporter configured by the standard OTEL_EXPORTER_OTLP_* env vars.
+    """
+    global _tracer
+    if not settings.otel_enabled:
+        return
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        log.warning("OTEL_ENABLED is set but opentelemetry-sdk / the OTLP exporter are not installed")
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("mcp_govdocs")
+
+def span(name: str, **attributes: Any):
+    """A span when tracing is enabled, otherwise a no-op context manager."""
+    if _tracer is None:
+        return nullcontext()
+    return _span(name, attributes)
+
+@contextmanager
+def _span(name: str, attributes: dict) -> Iterator[Any]:
+    with _tracer.start_as_current_span(name, attributes={k: v for k, v in attributes.items() if v is not None}) as s:
+        yield s
@@ -0,0 +1,75 @@
+from __future__ import annotations
+import asyncio, uuid
+from typing import Any, Dict, Iterable, List, Tuple
+import numpy as np
+import result_cache
+from db_pool import pool
+from config_loader import load_settings_for
+from embeddings import Chunk, chunk_text, get_embedder
+
+COPY_CHUNKS = (
+    "COPY document_chunks (doc_id, chunk_index, content, embedding, start_char, end_char) "
+    "FROM STDIN WITH (FORMAT BINARY)"
+)
+
+def _chunk_cfg() -> Tuple[int, int, int]:
+    cfg = load_settings_for().get("embedding", {})
+    return int(cfg.get("chunk_chars", 1200)), int(cfg.get("chunk_overlap", 200)), int(cfg.get("batch_size", 64))
+
+def embed_docs(docs: Iterable[Tuple[uuid.UUID, str]]) -> List[Tuple[uuid.UUID, List[Chunk], np.ndarray]]:
+    """Chunk every document and embed all chunks of the batch in fixed-size model batches."""
+    size, overlap, batch_size = _chunk_cfg()
+    chunked = [(doc_id, chunk_text(text or "", size, overlap)) for doc_id, text in docs]
+    flat = [c[2] for _, chunks in chunked for c in chunks]
+    embedder = get_embedder()
+    if flat:
+        vecs = np.concatenate([embedder.embed(flat[i:i + batch_size]) for i in range(0, len(flat), batch_size)])
+    else:
+        vecs = np.zeros((0, embedder.dim), dtype=np.float32)
+    out, pos = [], 0
+    for doc_id, chunks in chunked:
+        out.append((doc_id, chunks, vecs[pos:pos + len(chunks)]))
+        pos += len(chunks)
+    return out
+
+async def write_chunks(conn, embedded: List[Tuple[uuid.UUID, List[Chunk], np.ndarray]]) -> int:
+    """Replace the chunks of each document with a single binary COPY; caller commits."""
+    doc_ids = [doc_id for doc_id, _, _ in embedded]
+    written = 0
+    async with conn.cursor() as cur:
+        await cur.execute("DELETE FROM document_chunks WHERE doc_id = ANY(%s)", (doc_ids,))
+        async with cur.copy(COPY_CHUNKS) as copy:
+            copy.set_types(["uuid", "int4", "text", "vector", "int4", "int4"])
+            for doc_id, chunks, vecs in embedded:
+                for i, ((start, end, content), vec) in enumerate(zip(chunks, vecs)):
+                    await copy.write_row((doc_id, i, content, vec, start, end))
+                    written += 1
+    return written
+
+async def vectorize_text(doc_id: uuid.UUID, text: str) -> int:
+    embedded = await asyncio.to_thread(embed_docs, [(doc_id, text)])
+    async with pool.connection() as conn:
+        written = await write_chunks(conn, embedded)
+        await conn.commit()
+    await result_cache.invalidate("vectors")
+    return written
+
+async def revectorize(domain: str | None = None, batch_docs: int = 200) -> Dict[str, Any]:
+    """Re-embed document_text in server-side cursor batches, one write transaction per batch."""
+    docs = chunks = 0
+    where, params = ("JOIN documents d ON d.id = t.doc_id WHERE d.domain = %s", (domain,)) if domain else ("", ())
+    async with pool.connection() as read_conn:
+        async with read_conn.cursor(name="revectorize_scan") as cur:
+            cur.itersize = batch_docs
+            await cur.execute(f"SELECT t.doc_id, t.text FROM document_text t {where}", params)
+            while True:
+                rows = await cur.fetchmany(batch_docs)
+                if not rows:
+                    break
+                embedded = await asyncio.to_thread(embed_docs, rows)
+                async with pool.connection() as write_conn:
+                    chunks += await write_chunks(write_conn, embedded)
+                    await write_conn.commit()
+                docs += len(rows)
+    await result_cache.invalidate("vectors")
+    return {"docs": docs, "chunks": chunks, "embedder": get_embedder().name}
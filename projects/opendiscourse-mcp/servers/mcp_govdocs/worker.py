@@ -0,0 +1,227 @@
+"""Crawl worker: executes crawl_jobs queued by run_crawl_batch.
+
+    python -m worker            # from servers/mcp_govdocs (or the image's /app)
+
+Run as many processes, on as many hosts, as Postgres can take: jobs and URLs are claimed
+with SKIP LOCKED and per-domain politeness is booked in crawl_rate, so it holds globally.
+"""
+from __future__ import annotations
+import asyncio, logging, os, signal, socket
+import psycopg
+from typing import Any, Dict, List
+import crawl_queue, metrics, ocr, profiler, ranking, recrawl, robots, site_settings, tracing
+from prometheus_client import start_http_server
+from db import get_db_dsn
+from db_pool import pool
+from fetcher import ingest_url
+from learner import USER_AGENT, walk_sitemaps
+from logging_config import configure_logging
+from minio_utils import upload_queue
+from settings import settings
+
+log = logging.getLogger("mcp_govdocs.worker")
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+CLAIM_CHUNK = 25  # URLs claimed (and finished) at a time
+
+async def seed_queue(domain: str, rules: robots.RobotsRules) -> None:
+    """Enumerate the domain's sitemaps into crawl_queue once, even with many workers racing.
+
+    Each page sitemap is committed together with its URLs, so a walk interrupted by a crash
+    or restart resumes with the sitemaps it had not finished. The advisory lock lives on its
+    own connection (no pool connection or statement_timeout for the walk); a worker that finds
+    it taken polls until the seeding worker is done, its job lease kept by the heartbeat.
+    """
+    if await crawl_queue.is_seeded(domain):
+        return
+    key = f"crawl_seed:{domain}"
+    async with await psycopg.AsyncConnection.connect(get_db_dsn(), autocommit=True) as conn:
+        while not (await (await conn.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (key,))).fetchone())[0]:
+            await asyncio.sleep(settings.worker_poll_s)
+        try:
+            if not await crawl_queue.is_seeded(domain):
+                done = await crawl_queue.walked_sitemaps(domain)
+                added = 0
+                async for sitemap, pages in walk_sitemaps(domain, done=done):
+                    # disallowed URLs never enter the queue
+                    added += await crawl_queue.enqueue(domain, [p for p in pages if rules.allowed(p.loc)], sitemap=sitemap)
+                await crawl_queue.mark_seeded(domain, added)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock(hashtext(%s))", (key,))
+
+async def run_job(domain: str, limit: int, vectorize: bool, counts: Dict[str, Any]) -> Dict[str, Any]:
+    from mcp_tools import MCPRouter
+    conf = await site_settings.effective(domain)
+    politeness_ms = int(conf.get("crawl", {}).get("politeness_ms", 1500))
+    user_agent = conf.get("user_agent", USER_AGENT)
+    rules = await robots.get_rules(domain, user_agent)
+    if rules.disallow_all:
+        # robots.txt errored (5xx/unreachable): back off rather than crawl or seed blind
+        raise RuntimeError(f"robots.txt for {domain} unavailable; retry later")
+    await seed_queue(domain, rules)
+    last = None
+    claimed = 0
+    disallowed = 0
+    progress = None
+    while claimed < limit:
+        # small chunks: a crash loses little, and rows are finished long before their LEASE
+        chunk = await crawl_queue.claim(domain, min(CLAIM_CHUNK, limit - claimed))
+        if not chunk:
+            break
+        claimed += len(chunk)
+        counts["seqs"] = [seq for seq, _ in chunk]
+        results: Dict[int, str | None] = {}
+        final: List[int] = []
+        changed: List[int] = []  # content hash not seen before for the URL
+        for seq, url in chunk:
+            # rules may have changed since the URL was queued; the cache makes this a dict hit
+            rules = await robots.get_rules(domain, user_agent)
+            if rules.disallow_all:
+                results[seq] = "robots.txt unavailable"  # retried later, not final
+                continue
+            if not rules.allowed(url):
+                results[seq] = "disallowed by robots.txt"
+                final.append(seq)
+                continue
+            interval_ms = max(politeness_ms, int((rules.crawl_delay or 0) * 1000))
+            await asyncio.sleep(await crawl_queue.reserve_slot(domain, interval_ms))
+            try:
+                res = await ingest_url(domain, url)
+                counts["attempted"] += 1
+                counts["ingested"] += res.get("ingested", 0)
+                last = res
+                results[seq] = None
+                if res.get("ingested"):
+                    changed.append(seq)
+                if vectorize and res.get("doc_id"):
+                    with metrics.stage("vectorize", domain):
+                        await MCPRouter().vectorize_doc(doc_id=res["doc_id"])
+            except Exception as e:
+                last = {"error": str(e), "url": url}
+                results.setdefault(seq, str(e))
+        progress = await crawl_queue.finish(domain, results, final=final, changed=changed, conf=conf)
+        counts["seqs"] = []
+        disallowed += len(final)
+        if rules.disallow_all:
+            break  # don't burn the rest of the queue's attempts while robots.txt is down
+    if progress is None:
+        progress = await crawl_queue.finish(domain, {}, conf=conf)
+    return {"domain": domain, "attempted": counts["attempted"], "ingested": counts["ingested"],
+            "claimed": claimed, "disallowed": disallowed, **progress, "last": last}
+
+async def heartbeat(job_id: str, domain: str, counts: Dict[str, Any], work: asyncio.Task) -> bool:
+    """Renew the job's lease, and the claimed URL rows', every WORKER_JOB_LEASE_S / 3, however
+    slowly its URLs go (crawl-delay, a shared politeness schedule, a long sitemap walk). Cancels
+    `work` and returns True once another worker has taken the job over."""
+    while True:
+        await asyncio.sleep(settings.worker_job_lease_s / 3)
+        try:
+            owned = await crawl_queue.heartbeat_job(job_id, WORKER_ID, counts["attempted"], counts["ingested"],
+                                                    domain, counts["seqs"])
+        except Exception as e:
+            log.warning("job %s: heartbeat failed: %s", job_id, e)
+            continue
+        if not owned:
+            log.warning("job %s: lease lost to another worker; stopping", job_id)
+            work.cancel()
+            return True
+
+async def runner(stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        try:
+            job = await crawl_queue.claim_job(WORKER_ID, settings.worker_job_lease_s)
+        except Exception:
+            log.exception("claiming a crawl job failed")
+            job = None
+        if job is None:
+            try:
+                await asyncio.wait_for(stop.wait(), settings.worker_poll_s)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        job_id, domain, limit, vectorize = job
+        log.info("job %s: crawling up to %d URLs of %s", job_id, limit, domain)
+        counts: Dict[str, Any] = {"attempted": 0, "ingested": 0, "seqs": []}
+        try:
+            with tracing.span("crawl_job", **{"crawl.job_id": job_id, "crawl.domain": domain}):
+                # created inside the span so the job's own spans nest under it
+                work = asyncio.create_task(run_job(domain, limit, vectorize, counts))
+                beat = asyncio.create_task(heartbeat(job_id, domain, counts, work))
+                result = await work
+            state = "done"
+        except asyncio.CancelledError:
+            if not (beat.done() and beat.result()):
+                raise
+            continue  # the new owner runs and finishes it
+        except Exception as e:
+            log.exception("job %s failed", job_id)
+            state, result = "failed", {"error": str(e)}
+        finally:
+            beat.cancel()
+            work.cancel()
+        try:
+            if not await crawl_queue.finish_job(job_id, WORKER_ID, state, result):
+                log.warning("job %s: finished after losing its lease; result dropped", job_id)
+        except Exception:
+            log.exception("job %s: recording the result failed", job_id)  # rerun once the lease expires
+
+async def periodic(stop: asyncio.Event, name: str, every_s: float, fn) -> None:
+    """Run `fn` about once per `every_s` across all workers: every worker loops, but an
+    advisory lock plus worker_periodic.last_run_at let only one of them run each period."""
+    while not stop.is_set():
+        try:
+            async with pool.connection() as conn:
+                got = (await (await conn.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (name,))).fetchone())[0]
+                if got:
+                    try:
+                        cur = await conn.execute(
+                            "SELECT COALESCE(max(last_run_at) < now() - make_interval(secs => %s), true) "
+                            "FROM worker_periodic WHERE name = %s",
+                            (every_s * 0.9, name),
+                        )
+                        if (await cur.fetchone())[0]:  # not already run by another worker this period
+                            log.info("%s: %s", name, await fn())
+                            await conn.execute(
+                                "INSERT INTO worker_periodic (name, last_run_at) VALUES (%s, now()) "
+                                "ON CONFLICT (name) DO UPDATE SET last_run_at = now()",
+                                (name,),
+                            )
+                    finally:
+                        await conn.execute("SELECT pg_advisory_unlock(hashtext(%s))", (name,))
+                        await conn.commit()
+        except Exception:
+            log.exception("%s failed", name)
+        try:
+            await asyncio.wait_for(stop.wait(), every_s)
+        except asyncio.TimeoutError:
+            pass
+
+async def main() -> None:
+    configure_logging()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    tracing.setup_tracing("govdocs_worker")
+    if settings.worker_metrics_port:
+        metrics.registry.register(metrics.PoolCollector(pool))
+        start_http_server(settings.worker_metrics_port, registry=metrics.registry)
+    await pool.open(wait=True)
+    site_settings.start_listener()
+    log.info("worker %s started with %d runners", WORKER_ID, settings.worker_concurrency)
+    try:
+        # runners finish their current job before exiting on SIGTERM
+        await asyncio.gather(*(runner(stop) for _ in range(settings.worker_concurrency)),
+                             *(ocr.runner(stop, settings.worker_poll_s) for _ in range(settings.ocr_runners)),
+                             periodic(stop, "rank_refresh", settings.rank_refresh_s, ranking.refresh_scores),
+                             periodic(stop, "recrawl_tick", settings.recrawl_tick_s,
+                                      lambda: recrawl.tick(settings.recrawl_budget_per_hour, settings.recrawl_tick_s)))
+    finally:
+        profiler.stop()
+        ocr.shutdown()
+        await upload_queue.close()
+        await site_settings.stop_listener()
+        await pool.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
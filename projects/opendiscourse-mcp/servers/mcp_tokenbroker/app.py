@@ -1,9 +1,16 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import Any, Dict
-import uvicorn
+import hmac, logging, os, uvicorn
+from broker import InvalidParams, TokenBroker
+from secret_store import SecretStore, load_kek
+from settings import settings
 
-app = FastAPI(title="MCP TokenBroker", version="0.2.0")
+log = logging.getLogger("mcp_tokenbroker")
+
+app = FastAPI(title="MCP TokenBroker", version="0.3.0")
+broker: TokenBroker | None = None
 
 class JSONRPCRequest(BaseModel):
     jsonrpc: str
@@ -11,29 +18,68 @@ class JSONRPCRequest(BaseModel):
     params: Dict[str, Any] | None = None
     id: str | int | None = None
 
+@app.on_event("startup")
+async def startup():
+    global broker
+    if settings.storage_backend != "sqlite":
+        raise RuntimeError(f"secrets backend {settings.storage_backend!r} is not implemented; use sqlite")
+    if not settings.api_token:
+        raise RuntimeError("TOKENBROKER_API_TOKEN is not set; /mcp returns plaintext secrets and needs a caller token")
+    if os.path.dirname(os.path.abspath(settings.key_file)) == os.path.dirname(os.path.abspath(settings.store_path)):
+        log.warning("master key file %s sits next to the store; keep it on a separate volume or use TOKENBROKER_MASTER_KEY",
+                    settings.key_file)
+    store = SecretStore(settings.store_path, load_kek(settings.master_key, settings.key_file))
+    broker = TokenBroker(store, settings.cache_ttl_s, settings.refresh_margin_s)
+
+@app.on_event("shutdown")
+async def shutdown():
+    if broker is not None:
+        broker.store.close()
+
 @app.get("/healthz")
 async def healthz():
-    return {"ok": True, "name": "mcp_tokenbroker"}
+    return {"ok": broker is not None, "name": "mcp_tokenbroker"}
 
 class MethodNotFound(Exception): ...
 
 async def dispatch(method: str, params: Dict[str, Any]):
-    if method == "record_flow":
-        return {"flow_id": "stub-flow"}
-    if method == "replay_flow":
-        return {"status": "ok", "token_ref": "secret://stub/ref"}
-    if method == "store_secret":
-        return {"ok": True, "ref": params.get("ref", "secret://stub/ref")}
-    raise MethodNotFound(f"Unknown tool: {method}")
+    tools = {
+        "record_flow": broker.record_flow,
+        "replay_flow": broker.replay_flow,
+        "store_secret": broker.store_secret,
+        "delete_secret": broker.delete_secret,
+        "resolve": broker.resolve,
+        "resolve_many": broker.resolve_many,
+    }
+    if method not in tools:
+        raise MethodNotFound(f"Unknown tool: {method}")
+    if method == "resolve_many" and not isinstance(params.get("refs"), list):
+        raise InvalidParams("refs must be a list")
+    try:
+        return await tools[method](**params)
+    except (TypeError, KeyError, ValueError) as e:
+        # wrong/missing params or malformed flow params; the message never carries secret values
+        raise InvalidParams(f"{type(e).__name__}: {e}")
+
+def _authorized(authorization: str | None) -> bool:
+    scheme, _, token = (authorization or "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), settings.api_token.encode())
 
 @app.post("/mcp")
-async def mcp(req: JSONRPCRequest):
+async def mcp(req: JSONRPCRequest, authorization: str | None = Header(None)):
+    if not _authorized(authorization):
+        return JSONResponse({"jsonrpc": "2.0", "error": {"code": -32001, "message": "Unauthorized"}, "id": req.id},
+                            status_code=401, headers={"WWW-Authenticate": "Bearer"})
     try:
         res = await dispatch(req.method, req.params or {})
         return {"jsonrpc": "2.0", "result": res, "id": req.id}
     except MethodNotFound as e:
         return {"jsonrpc": "2.0", "error": {"code": -32601, "message": str(e)}, "id": req.id}
+    except InvalidParams as e:
+        return {"jsonrpc": "2.0", "error": {"code": -32602, "message": str(e)}, "id": req.id}
     except Exception:
+        # never log params: they may carry secret values
+        log.exception("Internal error in %s", req.method)
         return {"jsonrpc": "2.0", "error": {"code": -32603, "message": "Internal error"}, "id": req.id}
 
 if __name__ == "__main__":
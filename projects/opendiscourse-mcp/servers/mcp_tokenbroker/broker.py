@@ -0,0 +1,161 @@
+"""Token broker: resolves secret refs from the encrypted store through an in-memory TTL cache
+and re-runs the ref's flow when a token is about to expire.
+
+Refreshes are single-flight per ref: concurrent resolves of an expiring token share one
+upstream flow run instead of each replaying it.
+"""
+from __future__ import annotations
+import asyncio, json, logging, time, uuid
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+import httpx
+from secret_store import SecretStore
+
+log = logging.getLogger("mcp_tokenbroker.broker")
+
+class InvalidParams(Exception): ...
+
+# flow kind -> async (flow, broker) -> (token, expires_at)
+Refresher = Callable[[Dict[str, Any], "TokenBroker"], Awaitable[Tuple[str, float | None]]]
+
+async def oauth2_refresh(flow: Dict[str, Any], broker: "TokenBroker") -> Tuple[str, float | None]:
+    """OAuth2 refresh_token grant. params: token_url (default provider_url), client_id,
+    refresh_ref, optional client_secret_ref and scope. A rotated refresh token is stored back."""
+    p = flow["params"]
+    refs = [p["refresh_ref"]] + ([p["client_secret_ref"]] if p.get("client_secret_ref") else [])
+    got = await broker.resolve_many(refs, refresh=False)
+    if got["missing"]:
+        raise InvalidParams(f"flow secrets missing: {', '.join(got['missing'])}")
+    form = {"grant_type": "refresh_token", "refresh_token": got["secrets"][p["refresh_ref"]]["value"],
+            "client_id": p.get("client_id", "")}
+    if p.get("client_secret_ref"):
+        form["client_secret"] = got["secrets"][p["client_secret_ref"]]["value"]
+    if p.get("scope"):
+        form["scope"] = p["scope"]
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        r = await client.post(p.get("token_url") or flow["provider_url"], data=form)
+        r.raise_for_status()
+        body = r.json()
+    if body.get("refresh_token"):
+        await broker.store_secret(p["refresh_ref"], body["refresh_token"])
+    expires_in = body.get("expires_in")
+    return body["access_token"], (time.time() + float(expires_in)) if expires_in else None
+
+class TokenBroker:
+    def __init__(self, store: SecretStore, cache_ttl_s: float = 300.0, refresh_margin_s: float = 60.0,
+                 refreshers: Dict[str, Refresher] | None = None):
+        self.store = store
+        self.cache_ttl_s = cache_ttl_s
+        self.refresh_margin_s = refresh_margin_s
+        self.refreshers: Dict[str, Refresher] = {"oauth2_refresh": oauth2_refresh, **(refreshers or {})}
+        # ref -> (monotonic deadline, entry); entries hold decrypted values, memory only
+        self._cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def _needs_refresh(self, expires_at: float | None) -> bool:
+        return expires_at is not None and expires_at - time.time() < self.refresh_margin_s
+
+    def _remember(self, ref: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        ttl = self.cache_ttl_s
+        if entry["expires_at"] is not None:
+            # drop out of the cache in time for the refresh
+            ttl = min(ttl, entry["expires_at"] - time.time() - self.refresh_margin_s)
+        if ttl > 0:
+            self._cache[ref] = (time.monotonic() + ttl, entry)
+        return entry
+
+    async def store_secret(self, ref: str, value: str, expires_at: float | None = None,
+                           flow_id: str | None = None) -> Dict[str, Any]:
+        await asyncio.to_thread(self.store.put, ref, value, expires_at, flow_id)
+        self._cache.pop(ref, None)
+        return {"ok": True, "ref": ref, "expires_at": expires_at}
+
+    async def delete_secret(self, ref: str) -> Dict[str, Any]:
+        self._cache.pop(ref, None)
+        return {"ok": await asyncio.to_thread(self.store.delete, ref), "ref": ref}
+
+    async def resolve_many(self, refs: List[str], refresh: bool = True) -> Dict[str, Any]:
+        """-> {"secrets": {ref: {value, expires_at}}, "missing": [...], "errors": {ref: message}}.
+
+        Cache hits cost nothing; all misses are read and decrypted in one store call, and
+        expiring tokens with a flow are refreshed concurrently.
+        """
+        now = time.monotonic()
+        secrets: Dict[str, Dict[str, Any]] = {}
+        misses = []
+        for ref in dict.fromkeys(refs):
+            hit = self._cache.get(ref)
+            if hit and hit[0] > now:
+                secrets[ref] = hit[1]
+            else:
+                misses.append(ref)
+        rows = await asyncio.to_thread(self.store.get_many, misses)
+        errors: Dict[str, str] = {}
+        stale = []
+        for ref, (value, expires_at, flow_id) in rows.items():
+            if refresh and flow_id and self._needs_refresh(expires_at):
+                stale.append((ref, flow_id, value, expires_at))
+            else:
+                secrets[ref] = self._remember(ref, {"value": value, "expires_at": expires_at})
+        results = await asyncio.gather(*(self._refresh(ref, flow_id) for ref, flow_id, _, _ in stale),
+                                       return_exceptions=True)
+        for (ref, _, value, expires_at), res in zip(stale, results):
+            if not isinstance(res, BaseException):
+                secrets[ref] = res
+            elif expires_at is not None and expires_at > time.time():
+                # still valid: serve it (uncached, so the next resolve retries the refresh)
+                log.warning("refreshing %s failed: %s; serving the current token", ref, type(res).__name__)
+                secrets[ref] = {"value": value, "expires_at": expires_at}
+            else:
+                log.warning("refreshing %s failed: %s", ref, type(res).__name__)
+                errors[ref] = f"refresh failed: {res}"
+        for ref, entry in list(secrets.items()):
+            if entry["expires_at"] is not None and entry["expires_at"] <= time.time():
+                errors[ref] = "expired"
+                del secrets[ref]
+        return {"secrets": secrets, "missing": [r for r in misses if r not in rows], "errors": errors}
+
+    async def resolve(self, ref: str) -> Dict[str, Any]:
+        got = await self.resolve_many([ref])
+        if ref in got["errors"]:
+            raise InvalidParams(f"{ref}: {got['errors'][ref]}")
+        if ref not in got["secrets"]:
+            raise InvalidParams(f"unknown ref: {ref}")
+        return {"ref": ref, **got["secrets"][ref]}
+
+    async def _refresh(self, ref: str, flow_id: str, force: bool = False) -> Dict[str, Any]:
+        task = self._inflight.get(ref)
+        if task is None:
+            task = self._inflight[ref] = asyncio.create_task(self._run_flow(ref, flow_id, force))
+            task.add_done_callback(lambda _: self._inflight.pop(ref, None))
+        # shielded: a caller timing out must not cancel the refresh the others wait on
+        return await asyncio.shield(task)
+
+    async def _run_flow(self, ref: str, flow_id: str, force: bool) -> Dict[str, Any]:
+        if not force:
+            # another broker process sharing the store may have refreshed it already
+            row = (await asyncio.to_thread(self.store.get_many, [ref])).get(ref)
+            if row and not self._needs_refresh(row[1]):
+                return self._remember(ref, {"value": row[0], "expires_at": row[1]})
+        flow = await asyncio.to_thread(self.store.get_flow, flow_id)
+        if flow is None:
+            raise InvalidParams(f"unknown flow_id: {flow_id}")
+        refresher = self.refreshers.get(flow["kind"])
+        if refresher is None:
+            raise InvalidParams(f"flow kind {flow['kind']!r} can't be replayed")
+        value, expires_at = await refresher({**flow, "params": json.loads(flow["params"])}, self)
+        await self.store_secret(ref, value, expires_at, flow_id)
+        return self._remember(ref, {"value": value, "expires_at": expires_at})
+
+    async def record_flow(self, provider_url: str, kind: str = "oauth2_refresh",
+                          params: Dict[str, Any] | None = None) -> Dict[str, Any]:
+        if kind not in self.refreshers:
+            raise InvalidParams(f"unsupported flow kind: {kind} (known: {', '.join(sorted(self.refreshers))})")
+        flow_id = uuid.uuid4().hex
+        await asyncio.to_thread(self.store.put_flow, flow_id, kind, provider_url, json.dumps(params or {}))
+        return {"flow_id": flow_id}
+
+    async def replay_flow(self, flow_id: str, ref: str | None = None) -> Dict[str, Any]:
+        """Run the flow now and store its token under `ref` (default secret://flows/<flow_id>)."""
+        ref = ref or f"secret://flows/{flow_id}"
+        entry = await self._refresh(ref, flow_id, force=True)
+        return {"status": "ok", "token_ref": ref, "expires_at": entry["expires_at"]}
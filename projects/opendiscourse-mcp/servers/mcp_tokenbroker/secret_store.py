@@ -0,0 +1,122 @@
+"""Local encrypted secret store: one sqlite file, envelope encryption with AES-256-GCM.
+
+Every secret gets its own data key; the data key is wrapped with the master key (KEK) and
+stored next to the ciphertext, and both are bound to the secret's ref as associated data,
+so rows can't be swapped between refs. Rotating the KEK only rewraps data keys.
+"""
+from __future__ import annotations
+import base64, logging, os, sqlite3, threading, time
+from typing import Any, Dict, List, Tuple
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+log = logging.getLogger("mcp_tokenbroker.store")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS secrets (
+  ref TEXT PRIMARY KEY,
+  kek_id TEXT NOT NULL,
+  wrapped_key BLOB NOT NULL,   -- nonce || AES-GCM(KEK, data key)
+  ciphertext BLOB NOT NULL,    -- nonce || AES-GCM(data key, value)
+  expires_at REAL,             -- unix time the token stops working, if known
+  flow_id TEXT,                -- flow that can mint a fresh value
+  updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS flows (
+  flow_id TEXT PRIMARY KEY,
+  kind TEXT NOT NULL,
+  provider_url TEXT NOT NULL,
+  params TEXT NOT NULL,        -- JSON; secrets are referenced by ref, never inlined
+  created_at REAL NOT NULL
+);
+"""
+
+def load_kek(key_b64: str | None, key_file: str) -> bytes:
+    """Master key from TOKENBROKER_MASTER_KEY (urlsafe base64, 32 bytes), else from `key_file`,
+    which is created on first start."""
+    if key_b64:
+        key = base64.urlsafe_b64decode(key_b64 + "=" * (-len(key_b64) % 4))
+    elif os.path.exists(key_file):
+        with open(key_file, "rb") as f:
+            key = base64.urlsafe_b64decode(f.read().strip())
+    else:
+        key = AESGCM.generate_key(bit_length=256)
+        os.makedirs(os.path.dirname(key_file) or ".", exist_ok=True)
+        fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(base64.urlsafe_b64encode(key))
+        log.warning("generated a new master key in %s; set TOKENBROKER_MASTER_KEY to keep it off the volume", key_file)
+    if len(key) != 32:
+        raise ValueError("master key must be 32 bytes")
+    return key
+
+def _seal(key: bytes, data: bytes, aad: bytes) -> bytes:
+    nonce = os.urandom(12)
+    return nonce + AESGCM(key).encrypt(nonce, data, aad)
+
+def _open(key: bytes, blob: bytes, aad: bytes) -> bytes:
+    return AESGCM(key).decrypt(blob[:12], blob[12:], aad)
+
+class SecretStore:
+    """Blocking API; callers run it in a thread. One connection guarded by a lock."""
+
+    def __init__(self, path: str, kek: bytes, kek_id: str = "v1"):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._kek, self._kek_id = kek, kek_id
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def put(self, ref: str, value: str, expires_at: float | None = None, flow_id: str | None = None) -> None:
+        data_key = AESGCM.generate_key(bit_length=256)
+        aad = ref.encode()
+        row = (ref, self._kek_id, _seal(self._kek, data_key, aad), _seal(data_key, value.encode(), aad),
+               expires_at, flow_id, time.time())
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO secrets (ref, kek_id, wrapped_key, ciphertext, expires_at, flow_id, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (ref) DO UPDATE SET kek_id = excluded.kek_id, "
+                "wrapped_key = excluded.wrapped_key, ciphertext = excluded.ciphertext, "
+                "expires_at = excluded.expires_at, flow_id = COALESCE(excluded.flow_id, secrets.flow_id), "
+                "updated_at = excluded.updated_at",
+                row,
+            )
+
+    def get_many(self, refs: List[str]) -> Dict[str, Tuple[str, float | None, str | None]]:
+        """ref -> (value, expires_at, flow_id) for the refs that exist."""
+        if not refs:
+            return {}
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT ref, wrapped_key, ciphertext, expires_at, flow_id FROM secrets "
+                f"WHERE ref IN ({','.join('?' * len(refs))})",
+                refs,
+            ).fetchall()
+        out = {}
+        for ref, wrapped, ciphertext, expires_at, flow_id in rows:
+            aad = ref.encode()
+            data_key = _open(self._kek, wrapped, aad)
+            out[ref] = (_open(data_key, ciphertext, aad).decode(), expires_at, flow_id)
+        return out
+
+    def delete(self, ref: str) -> bool:
+        with self._lock:
+            return self._db.execute("DELETE FROM secrets WHERE ref = ?", (ref,)).rowcount > 0
+
+    def put_flow(self, flow_id: str, kind: str, provider_url: str, params: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO flows (flow_id, kind, provider_url, params, created_at) VALUES (?, ?, ?, ?, ?)",
+                (flow_id, kind, provider_url, params, time.time()),
+            )
+
+    def get_flow(self, flow_id: str) -> Dict[str, Any] | None:
+        with self._lock:
+            row = self._db.execute("SELECT kind, provider_url, params FROM flows WHERE flow_id = ?",
+                                   (flow_id,)).fetchone()
+        return {"kind": row[0], "provider_url": row[1], "params": row[2]} if row else None
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
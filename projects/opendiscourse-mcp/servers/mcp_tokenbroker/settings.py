@@ -1,9 +1,28 @@
-import os, yaml
+import os, re, yaml
 from pydantic import BaseModel, Field
 from typing import Any, Dict
 
+# ${VAR} / ${VAR:-default}, as in the govdocs config loader
+_ENV_RE = re.compile(r"\$\{([^}:]+)(:-([^}]*))?\}")
+
+def _expand(val: Any) -> Any:
+    if isinstance(val, str):
+        return _ENV_RE.sub(lambda m: os.environ.get(m.group(1), m.group(3) or ""), val)
+    if isinstance(val, dict):
+        return {k: _expand(v) for k, v in val.items()}
+    if isinstance(val, list):
+        return [_expand(v) for v in val]
+    return val
+
 class TBSettings(BaseModel):
-    storage_backend: str = Field(default=os.environ.get("SECRETS_BACKEND", "vault"))
+    storage_backend: str = Field(default=os.environ.get("SECRETS_BACKEND", "sqlite"))
+    store_path: str = Field(default=os.environ.get("TOKENBROKER_STORE", "/data/tokenbroker.sqlite"))
+    # not on the store's /data volume: a copy of the database alone doesn't decrypt
+    key_file: str = Field(default=os.environ.get("TOKENBROKER_KEY_FILE", "/keys/tokenbroker.key"))
+    master_key: str = Field(default=os.environ.get("TOKENBROKER_MASTER_KEY", ""))
+    api_token: str = Field(default=os.environ.get("TOKENBROKER_API_TOKEN", ""))  # Bearer token /mcp callers must send
+    cache_ttl_s: float = Field(default=float(os.environ.get("TOKENBROKER_CACHE_TTL_S", "300")))
+    refresh_margin_s: float = Field(default=float(os.environ.get("TOKENBROKER_REFRESH_MARGIN_S", "60")))
     policy: Dict[str, Any] = Field(default_factory=dict)
 
 def load_tb_settings() -> TBSettings:
@@ -11,7 +30,7 @@ def load_tb_settings() -> TBSettings:
     cfg = {}
     if os.path.exists(path):
         with open(path, "r", encoding="utf-8") as f:
-            cfg = yaml.safe_load(f) or {}
+            cfg = _expand(yaml.safe_load(f) or {})
     return TBSettings(**cfg)
 
 settings = load_tb_settings()
@@ -87,4 +87,5 @@ CREATE TABLE IF NOT EXISTS document_chunks (
   embedding vector(256),
   start_char INT, end_char INT
 );
-CREATE INDEX IF NOT EXISTS document_chunks_embedding_idx ON document_chunks USING ivfflat (embedding vector_cosine_ops);
+-- The ANN index is built after data is loaded (IVFFlat centroids trained on an empty
+-- table are useless); see the build_vector_index tool and 0005_ann_index_state.sql.
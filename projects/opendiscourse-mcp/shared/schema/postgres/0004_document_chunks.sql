@@ -0,0 +1,2 @@
+-- 0004_document_chunks.sql: look up / replace a document's chunks without scanning
+CREATE INDEX IF NOT EXISTS document_chunks_doc_idx ON document_chunks (doc_id, chunk_index);
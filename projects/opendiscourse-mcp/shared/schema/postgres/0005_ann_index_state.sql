@@ -0,0 +1,12 @@
+-- 0005_ann_index_state.sql: parameters of the current document_chunks ANN index
+-- (written by build_vector_index) and its recall/latency calibration curve.
+CREATE TABLE IF NOT EXISTS ann_index_state (
+  id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+  kind TEXT NOT NULL CHECK (kind IN ('ivfflat', 'hnsw')),
+  lists INT,
+  m INT,
+  ef_construction INT,
+  row_count BIGINT,
+  built_at TIMESTAMPTZ,
+  calibration JSONB NOT NULL DEFAULT '[]'
+);
@@ -0,0 +1,40 @@
+-- 0006_fulltext.sql: full-text search over titles and document text
+
+-- Titles are short: a generated column is cheap to add and always in sync.
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS title_tsv tsvector
+  GENERATED ALWAYS AS (to_tsvector('english', coalesce(title, ''))) STORED;
+CREATE INDEX IF NOT EXISTS documents_title_tsv_idx ON documents USING gin (title_tsv);
+
+-- Body text can be large: a generated column would rewrite the whole table under an
+-- exclusive lock, so it is a plain column kept current by a trigger for new rows and
+-- filled for existing rows by the backfill_search_vectors tool.
+CREATE OR REPLACE FUNCTION document_text_tsv(body TEXT) RETURNS tsvector
+  LANGUAGE sql IMMUTABLE PARALLEL SAFE
+  AS $$ SELECT to_tsvector('english', left(body, 500000)) $$;
+
+ALTER TABLE document_text ADD COLUMN IF NOT EXISTS tsv tsvector;
+
+CREATE OR REPLACE FUNCTION document_text_tsv_trigger() RETURNS trigger
+  LANGUAGE plpgsql AS $$
+BEGIN
+  NEW.tsv := document_text_tsv(NEW.text);
+  RETURN NEW;
+END $$;
+
+DROP TRIGGER IF EXISTS document_text_tsv_update ON document_text;
+CREATE TRIGGER document_text_tsv_update BEFORE INSERT OR UPDATE OF text ON document_text
+  FOR EACH ROW EXECUTE FUNCTION document_text_tsv_trigger();
+
+CREATE INDEX IF NOT EXISTS document_text_tsv_idx ON document_text USING gin (tsv);
+CREATE INDEX IF NOT EXISTS document_text_tsv_missing_idx ON document_text (doc_id) WHERE tsv IS NULL;
+
+-- Optional: trigram indexes so substring lookups on title/url (doc numbers, URL
+-- fragments) stay indexed. Skipped if pg_trgm is not available.
+DO $$
+BEGIN
+  CREATE EXTENSION IF NOT EXISTS pg_trgm;
+  CREATE INDEX IF NOT EXISTS documents_title_trgm_idx ON documents USING gin (title gin_trgm_ops);
+  CREATE INDEX IF NOT EXISTS documents_url_trgm_idx ON documents USING gin (url gin_trgm_ops);
+EXCEPTION WHEN OTHERS THEN
+  RAISE NOTICE 'pg_trgm unavailable, skipping trigram indexes: %', SQLERRM;
+END $$;
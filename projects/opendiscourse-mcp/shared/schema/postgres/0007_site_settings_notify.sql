@@ -0,0 +1,11 @@
+-- 0007_site_settings_notify.sql: tell running servers which domain's overrides changed
+CREATE OR REPLACE FUNCTION site_settings_notify() RETURNS trigger
+  LANGUAGE plpgsql AS $$
+BEGIN
+  PERFORM pg_notify('site_settings_changed', COALESCE(NEW.domain, OLD.domain));
+  RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS site_settings_changed ON site_settings;
+CREATE TRIGGER site_settings_changed AFTER INSERT OR UPDATE OR DELETE ON site_settings
+  FOR EACH ROW EXECUTE FUNCTION site_settings_notify();
@@ -0,0 +1,24 @@
+-- 0008_crawl_queue.sql: one row per URL to crawl, replacing crawl_cursors.url_list.
+-- Workers claim pending rows in seq order with FOR UPDATE SKIP LOCKED, so several
+-- can share a domain and each batch reads only the rows it claims.
+CREATE TABLE IF NOT EXISTS crawl_queue (
+  domain TEXT NOT NULL REFERENCES gov_domains(domain) ON DELETE CASCADE,
+  seq BIGINT GENERATED ALWAYS AS IDENTITY,
+  url TEXT NOT NULL,
+  state TEXT NOT NULL DEFAULT 'pending' CHECK (state IN ('pending', 'running', 'done', 'failed')),
+  attempts INT NOT NULL DEFAULT 0,
+  last_error TEXT,
+  claimed_at TIMESTAMPTZ,
+  PRIMARY KEY (domain, seq)
+);
+CREATE INDEX IF NOT EXISTS crawl_queue_domain_state_seq ON crawl_queue (domain, state, seq);
+-- md5 keeps the key small for very long URLs
+CREATE UNIQUE INDEX IF NOT EXISTS crawl_queue_domain_url ON crawl_queue (domain, md5(url));
+
+-- Move existing cursors over: entries before pos are already crawled.
+INSERT INTO crawl_queue (domain, url, state)
+SELECT c.domain, u.url, CASE WHEN u.n <= c.pos THEN 'done' ELSE 'pending' END
+FROM crawl_cursors c, jsonb_array_elements_text(c.url_list) WITH ORDINALITY AS u(url, n)
+ORDER BY c.domain, u.n
+ON CONFLICT DO NOTHING;
+UPDATE crawl_cursors SET url_list = '[]' WHERE url_list <> '[]';
@@ -0,0 +1,23 @@
+-- 0009_crawl_jobs.sql: crawl batches requested through run_crawl_batch and executed by
+-- `python -m worker` processes, plus the per-domain fetch schedule they share.
+CREATE TABLE IF NOT EXISTS crawl_jobs (
+  id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+  domain TEXT NOT NULL REFERENCES gov_domains(domain) ON DELETE CASCADE,
+  url_limit INT NOT NULL,
+  vectorize BOOLEAN NOT NULL DEFAULT true,
+  state TEXT NOT NULL DEFAULT 'queued' CHECK (state IN ('queued', 'running', 'done', 'failed')),
+  worker TEXT,
+  attempted INT NOT NULL DEFAULT 0,
+  ingested INT NOT NULL DEFAULT 0,
+  result JSONB,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  heartbeat_at TIMESTAMPTZ,
+  finished_at TIMESTAMPTZ
+);
+CREATE INDEX IF NOT EXISTS crawl_jobs_open ON crawl_jobs (created_at) WHERE state IN ('queued', 'running');
+
+-- Earliest time the next request to a domain may start, across all workers.
+CREATE TABLE IF NOT EXISTS crawl_rate (
+  domain TEXT PRIMARY KEY,
+  next_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
@@ -0,0 +1,17 @@
+-- 0010_sitemap_walk.sql: sitemap metadata on queued URLs and resumable sitemap enumeration.
+ALTER TABLE crawl_queue ADD COLUMN IF NOT EXISTS lastmod TIMESTAMPTZ;
+ALTER TABLE crawl_queue ADD COLUMN IF NOT EXISTS changefreq TEXT;
+
+-- Set once every sitemap of the domain has been enumerated into crawl_queue.
+ALTER TABLE crawl_cursors ADD COLUMN IF NOT EXISTS seeded_at TIMESTAMPTZ;
+UPDATE crawl_cursors SET seeded_at = last_run WHERE seeded_at IS NULL AND total > 0;
+
+-- Page sitemaps already enumerated, so an interrupted walk resumes where it stopped.
+CREATE TABLE IF NOT EXISTS sitemap_walk (
+  domain TEXT NOT NULL REFERENCES gov_domains(domain) ON DELETE CASCADE,
+  sitemap TEXT NOT NULL,
+  lastmod TIMESTAMPTZ,
+  urls INT NOT NULL DEFAULT 0,
+  finished_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (domain, sitemap)
+);
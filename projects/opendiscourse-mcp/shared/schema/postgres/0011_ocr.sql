@@ -0,0 +1,23 @@
+-- 0011_ocr.sql: OCR backlog for low-text PDFs and a page-level OCR result cache.
+CREATE TABLE IF NOT EXISTS ocr_queue (
+  doc_id UUID PRIMARY KEY REFERENCES documents(id) ON DELETE CASCADE,
+  state TEXT NOT NULL DEFAULT 'pending' CHECK (state IN ('pending', 'running', 'done', 'failed')),
+  attempts INT NOT NULL DEFAULT 0,
+  last_error TEXT,
+  pages INT,
+  cached_pages INT,
+  enqueued_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  claimed_at TIMESTAMPTZ,
+  finished_at TIMESTAMPTZ
+);
+CREATE INDEX IF NOT EXISTS ocr_queue_pending ON ocr_queue (enqueued_at) WHERE state = 'pending';
+
+-- Keyed by sha256 of (PDF sha256, page index, DPI) (+ language): a page is looked up without
+-- rendering it, and a re-queued or re-ingested PDF is recognized once.
+CREATE TABLE IF NOT EXISTS ocr_page_cache (
+  page_hash TEXT NOT NULL,
+  lang TEXT NOT NULL,
+  text TEXT NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (page_hash, lang)
+);
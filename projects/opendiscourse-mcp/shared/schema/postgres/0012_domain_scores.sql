@@ -0,0 +1,13 @@
+-- 0012_domain_scores.sql: materialized domain ranking (refreshed by ranking.refresh_scores).
+CREATE TABLE IF NOT EXISTS domain_scores (
+  domain TEXT PRIMARY KEY REFERENCES gov_domains(domain) ON DELETE CASCADE,
+  score REAL NOT NULL,
+  volume REAL NOT NULL,
+  freshness REAL NOT NULL,
+  quality REAL NOT NULL,
+  reliability REAL NOT NULL,
+  docs BIGINT NOT NULL,
+  last_doc_at TIMESTAMPTZ,
+  computed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS domain_scores_score ON domain_scores (score DESC);
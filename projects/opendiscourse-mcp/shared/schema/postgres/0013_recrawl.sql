@@ -0,0 +1,17 @@
+-- 0013_recrawl.sql: per-URL change history for adaptive revisits, adaptive sitemap re-walks,
+-- and bookkeeping for once-per-period worker tasks.
+ALTER TABLE crawl_queue ADD COLUMN IF NOT EXISTS visits INT NOT NULL DEFAULT 0;
+ALTER TABLE crawl_queue ADD COLUMN IF NOT EXISTS changes INT NOT NULL DEFAULT 0;
+ALTER TABLE crawl_queue ADD COLUMN IF NOT EXISTS first_visit_at TIMESTAMPTZ;
+ALTER TABLE crawl_queue ADD COLUMN IF NOT EXISTS last_visit_at TIMESTAMPTZ;
+ALTER TABLE crawl_queue ADD COLUMN IF NOT EXISTS change_rate REAL;          -- estimated changes per day
+ALTER TABLE crawl_queue ADD COLUMN IF NOT EXISTS next_visit_at TIMESTAMPTZ;
+CREATE INDEX IF NOT EXISTS crawl_queue_next_visit ON crawl_queue (next_visit_at) WHERE state = 'done';
+UPDATE crawl_queue SET next_visit_at = now() + interval '7 days' WHERE state = 'done' AND next_visit_at IS NULL;
+
+ALTER TABLE crawl_cursors ADD COLUMN IF NOT EXISTS reseed_days REAL NOT NULL DEFAULT 1;
+
+CREATE TABLE IF NOT EXISTS worker_periodic (
+  name TEXT PRIMARY KEY,
+  last_run_at TIMESTAMPTZ NOT NULL
+);
@@ -0,0 +1,23 @@
+-- 0014_sample_runs.sql: multi-domain sampling runs (crawl_samples); one result row per
+-- domain, written as soon as that domain finishes.
+CREATE TABLE IF NOT EXISTS sample_runs (
+  id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+  domains INT NOT NULL,
+  max_docs INT NOT NULL,
+  state TEXT NOT NULL DEFAULT 'running' CHECK (state IN ('running', 'done', 'cancelled')),
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  finished_at TIMESTAMPTZ
+);
+
+CREATE TABLE IF NOT EXISTS sample_results (
+  id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,   -- arrival order; readers page with `after`
+  run_id UUID NOT NULL REFERENCES sample_runs(id) ON DELETE CASCADE,
+  domain TEXT NOT NULL,
+  attempted INT NOT NULL DEFAULT 0,
+  ingested INT NOT NULL DEFAULT 0,
+  error TEXT,
+  result JSONB,
+  finished_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  UNIQUE (run_id, domain)
+);
+CREATE INDEX IF NOT EXISTS sample_results_run ON sample_results (run_id, id);
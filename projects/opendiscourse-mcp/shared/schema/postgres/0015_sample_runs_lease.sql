@@ -0,0 +1,19 @@
+-- 0015_sample_runs_lease.sql: commit-ordered result paging and a heartbeat lease for sample runs.
+-- `seq` is assigned under the run's row lock, so results become visible in seq order and
+-- readers paging with `after` never skip one; `recorded` is the last seq handed out.
+ALTER TABLE sample_runs ADD COLUMN IF NOT EXISTS recorded INT NOT NULL DEFAULT 0;
+-- refreshed by the process running the sample; a run whose process died is marked failed
+ALTER TABLE sample_runs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMPTZ NOT NULL DEFAULT now();
+ALTER TABLE sample_runs DROP CONSTRAINT IF EXISTS sample_runs_state_check;
+ALTER TABLE sample_runs ADD CONSTRAINT sample_runs_state_check
+  CHECK (state IN ('running', 'done', 'cancelled', 'failed'));
+
+ALTER TABLE sample_results ADD COLUMN IF NOT EXISTS seq INT;
+UPDATE sample_results s SET seq = o.n
+FROM (SELECT id, row_number() OVER (PARTITION BY run_id ORDER BY id) AS n FROM sample_results) o
+WHERE s.id = o.id AND s.seq IS NULL;
+UPDATE sample_runs r SET recorded = m.n FROM (SELECT run_id, max(seq) AS n FROM sample_results GROUP BY run_id) m
+WHERE r.id = m.run_id;
+ALTER TABLE sample_results ALTER COLUMN seq SET NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS sample_results_run_seq ON sample_results (run_id, seq);
+DROP INDEX IF EXISTS sample_results_run;
@@ -0,0 +1,37 @@
+import os, sys, threading
+from io import BytesIO
+import httpx
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "bench"))
+
+def test_percentiles_and_regression_check():
+    from compare import compare
+    from driver import percentile, summarize
+    assert percentile([1.0, 2.0, 3.0, 4.0], 0.5) == 2.5 and percentile([], 0.99) == 0.0
+    s = summarize([0.01] * 99 + [1.0], errors=1, wall_s=2.0)
+    assert s["p50_ms"] == 10.0 and s["p99_ms"] > 10.0 and s["max_ms"] == 1000.0 and s["throughput_rps"] == 50.0
+    base = {"meta": {"git_sha": "a"}, "scenarios": {"search_docs": {**s, "p95_ms": 10.0}}}
+    new = {"meta": {"git_sha": "b"}, "scenarios": {"search_docs": {**s, "p95_ms": 13.0}}}
+    _, regressions = compare(base, new, 0.10)
+    assert regressions == ["search_docs p95_ms 10 -> 13 (+30.0%)"]
+    assert compare(base, base, 0.10)[1] == []
+
+def test_fixture_server_corpus():
+    from http.server import ThreadingHTTPServer
+    from fixture_server import Corpus, make_handler
+    from pdfminer.high_level import extract_text
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(Corpus(1500, 10, "http://bench.test", 0)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        assert "Sitemap: http://bench.test/sitemap_index.xml" in httpx.get(f"{base}/robots.txt").text
+        assert httpx.get(f"{base}/sitemap_index.xml").text.count("<sitemap>") == 2
+        assert httpx.get(f"{base}/sitemaps/1.xml").text.count("<url>") == 500
+        page = httpx.get(f"{base}/docs/7.html")
+        assert page.headers["content-type"].startswith("text/html") and "(7)" in page.text
+        assert httpx.get(f"{base}/docs/7.html?v=x").text != page.text
+        assert "(10)" in extract_text(BytesIO(httpx.get(f"{base}/docs/10.pdf").content))
+        httpx.post(f"{base}/_generation")
+        assert httpx.get(f"{base}/docs/7.html").text != page.text
+    finally:
+        server.shutdown()
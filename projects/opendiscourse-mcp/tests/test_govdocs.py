@@ -1,6 +1,278 @@
-import httpx, os, pytest
+import httpx, os, sys, pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "servers", "mcp_govdocs"))
 
 @pytest.mark.asyncio
 async def test_healthz_govdocs():
     # Skip if not running; this is a placeholder for CI where we only unit-test JSON structs.
     assert True
+
+def test_chunk_text_offsets():
+    from embeddings import chunk_text
+    text = " ".join(f"word{i}" for i in range(500))
+    chunks = chunk_text(text, size=200, overlap=40)
+    assert len(chunks) > 1
+    for start, end, content in chunks:
+        assert text[start:end] == content and len(content) <= 200
+    assert chunks[-1][1] == len(text)
+
+def test_hashing_embedder_normalized_and_stable():
+    from embeddings import HashingEmbedder
+    import numpy as np
+    emb = HashingEmbedder(dim=64)
+    vecs = emb.embed(["federal register notice", "federal register notice", ""])
+    assert vecs.shape == (3, 64) and vecs.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vecs[0]), 1.0)
+    assert np.array_equal(vecs[0], vecs[1]) and not vecs[2].any()
+
+def test_ann_params_for_recall():
+    from ann_index import ivfflat_lists_for, params_for_recall
+    assert ivfflat_lists_for(500) == 1 and ivfflat_lists_for(200_000) == 200
+    assert params_for_recall(None, 0.9, 10) == {}
+    ivf = {"kind": "ivfflat", "lists": 100, "calibration": []}
+    assert params_for_recall(ivf, 0.9, 10) == {"ivfflat.probes": 10}
+    calibrated = dict(ivf, calibration=[{"value": 4, "recall": 0.85}, {"value": 8, "recall": 0.93}])
+    assert params_for_recall(calibrated, 0.9, 10) == {"ivfflat.probes": 8}
+    assert params_for_recall({"kind": "hnsw", "calibration": []}, 0.9, 100) == {"hnsw.ef_search": 100}
+
+def test_fulltext_cursor_roundtrip():
+    from fulltext import decode_cursor, encode_cursor
+    cur = encode_cursor("fts", 0.1234567890123, "7f1c0b1e-0000-4000-8000-000000000001")
+    assert decode_cursor(cur) == ("fts", 0.1234567890123, "7f1c0b1e-0000-4000-8000-000000000001")
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+def test_rrf_fuse_prefers_agreement():
+    from hybrid import filter_sql, rrf_fuse
+    fused = rrf_fuse({"fts": ["a", "b", "c"], "vector": ["c", "d"]}, k=60)
+    assert [doc_id for doc_id, _, _ in fused][:1] == ["c"]
+    assert fused[0][2] == {"fts": 3, "vector": 1}
+    where, params = filter_sql("d", domain="www.gpo.gov", doc_type=None, date_from="2024-01-01", date_to=None)
+    assert "d.domain = %(f_domain)s" in where and set(params) == {"f_domain", "f_from"}
+
+def test_mcp_batch_partial_failure():
+    from fastapi.testclient import TestClient
+    import app as govdocs_app
+
+    async def echo(**params):
+        return params
+
+    govdocs_app.router.tools["echo"] = echo
+    client = TestClient(govdocs_app.app)
+    resp = client.post("/mcp", json=[
+        {"jsonrpc": "2.0", "method": "echo", "params": {"n": 1}, "id": 1},
+        {"jsonrpc": "2.0", "method": "missing_tool", "id": 2},
+        {"jsonrpc": "2.0", "method": "echo", "params": {"n": 3}},  # notification: no response
+    ]).json()
+    assert resp[0] == {"jsonrpc": "2.0", "result": {"n": 1}, "id": 1}
+    assert resp[1]["error"]["code"] == -32601 and len(resp) == 2
+    assert govdocs_app.router.timeout_for("echo") == 120 and govdocs_app.router.timeout_for("bulk_ingest") is None
+
+def test_config_cache_reloads_on_change(tmp_path, monkeypatch):
+    import config_loader
+    (tmp_path / "config" / "sites").mkdir(parents=True)
+    default = tmp_path / "config" / "default.yml"
+    default.write_text('crawl:\n  politeness_ms: 1500\nstorage:\n  bucket: "${TEST_BUCKET:-od}"\n')
+    monkeypatch.setattr(config_loader, "BASE_DIR", str(tmp_path))
+    config_loader.clear_cache()
+    first = config_loader.load_settings_for("example.gov")
+    assert first["storage"]["bucket"] == "od"
+    assert config_loader.load_settings_for("example.gov") is first  # served from memory
+    (tmp_path / "config" / "sites" / "example.gov.yml").write_text("crawl:\n  politeness_ms: 200\n")
+    site = config_loader.load_settings_for("example.gov")
+    assert site["crawl"]["politeness_ms"] == 200 and site["storage"]["bucket"] == "od"
+    config_loader.clear_cache()
+
+def test_sitemap_parser_streams_gzip_index_and_urlset():
+    import gzip
+    from learner import SitemapParser, parse_sitemap
+    ns = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+    urlset = (f'<?xml version="1.0"?><urlset {ns}>'
+              + "".join(f"<url><loc>https://x.gov/p{i}</loc><lastmod>2024-05-0{i % 9 + 1}</lastmod>"
+                        f"<changefreq>daily</changefreq></url>" for i in range(300))
+              + "</urlset>").encode()
+    parser = SitemapParser()
+    blob = gzip.compress(urlset)
+    for i in range(0, len(blob), 97):  # arbitrary network-sized chunks
+        parser.feed(blob[i:i + 97])
+    parser.close()
+    assert len(parser.pages) == 300 and not parser.sitemaps
+    assert parser.pages[0].loc == "https://x.gov/p0" and parser.pages[0].changefreq == "daily"
+    assert parser.pages[0].lastmod.year == 2024 and parser.pages[0].lastmod.tzinfo is not None
+    index = f'<sitemapindex {ns}><sitemap><loc>https://x.gov/a.xml.gz</loc></sitemap></sitemapindex>'
+    assert parse_sitemap(index) == ["https://x.gov/a.xml.gz"]
+
+def test_robots_group_selection_and_longest_match():
+    from robots import parse_robots
+    txt = """
+User-agent: *
+Disallow: /private/
+Crawl-delay: 1
+
+User-agent: OpenDiscourseGovDocs
+Disallow: /search
+Disallow: /*.pdf$
+Allow: /search/help
+Crawl-delay: 5
+Sitemap: https://x.gov/sitemap.xml
+"""
+    rules = parse_robots(txt, "OpenDiscourseGovDocs/0.1 (+https://opendiscourse.example)")
+    assert rules.crawl_delay == 5 and rules.sitemaps == ["https://x.gov/sitemap.xml"]
+    assert not rules.allowed("https://x.gov/search?q=budget")
+    assert rules.allowed("https://x.gov/search/help")
+    assert not rules.allowed("https://x.gov/docs/a.pdf") and rules.allowed("https://x.gov/docs/a.pdf?x=1")
+    assert rules.allowed("https://x.gov/private/x")  # our own group replaces the * group
+    other = parse_robots(txt, "SomeBot/1.0")
+    assert not other.allowed("https://x.gov/private/x") and other.crawl_delay == 1
+
+    import asyncio, robots
+
+    async def fake_fetch(domain, user_agent):
+        return parse_robots(txt, user_agent), 60
+
+    robots._fetch, real_fetch = fake_fetch, robots._fetch
+    try:
+        robots.invalidate()
+        ours = asyncio.run(robots.get_rules("x.gov", "OpenDiscourseGovDocs/0.1"))
+        theirs = asyncio.run(robots.get_rules("x.gov", "SomeBot/1.0"))
+        assert (ours.crawl_delay, theirs.crawl_delay) == (5, 1)  # cached per agent, not per domain
+    finally:
+        robots._fetch = real_fetch
+        robots.invalidate()
+
+def test_ingest_stage_metrics_count_time_and_errors():
+    import metrics
+    def sample(name, **labels):
+        return metrics.registry.get_sample_value(name, labels) or 0.0
+    before = sample("govdocs_ingest_stage_seconds_count", stage="fetch", domain="t.gov")
+    with metrics.stage("fetch", "t.gov"):
+        pass
+    with pytest.raises(RuntimeError):
+        with metrics.stage("fetch", "t.gov"):
+            raise RuntimeError("boom")
+    assert sample("govdocs_ingest_stage_seconds_count", stage="fetch", domain="t.gov") == before + 2
+    assert sample("govdocs_ingest_errors_total", stage="fetch", domain="t.gov") >= 1
+
+def test_bulk_ingest_reads_tar_against_manifest(tmp_path):
+    import io, json, tarfile
+    from bulk_ingest import iter_source, load_manifest
+    tar_path = tmp_path / "corpus.tar.gz"
+    with tarfile.open(tar_path, "w:gz") as tf:
+        for name, data in [("./docs/a.txt", b"alpha"), ("./docs/b.txt", b"beta"), ("./manifest.jsonl", b"")]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text("\n".join(json.dumps(r) for r in [
+        {"path": "docs/b.txt", "url": "https://x.gov/b", "domain": "x.gov"},
+        {"path": "docs/missing.txt"},
+    ]))
+    items = list(iter_source(str(tar_path), load_manifest(str(tar_path), str(manifest))))
+    assert [(e["url"], raw) for e, raw in items] == [("https://x.gov/b", b"beta")]
+    assert sorted(e["path"] for e, _ in iter_source(str(tar_path), None)) == ["docs/a.txt", "docs/b.txt"]
+
+def test_bulk_ingest_published_at_validated():
+    from datetime import datetime
+    from bulk_ingest import _timestamp
+    assert _timestamp(None) is None and _timestamp("2024-03-01") == datetime(2024, 3, 1)
+    assert _timestamp("2024-03-01T12:00:00Z").hour == 12
+    with pytest.raises(ValueError):
+        _timestamp("March 1st")
+
+@pytest.mark.asyncio
+async def test_bulk_ingest_byte_budget():
+    import asyncio
+    from bulk_ingest import _ByteBudget
+    budget = _ByteBudget(100)
+    await budget.acquire(60)
+    waiter = asyncio.create_task(budget.acquire(60))
+    await asyncio.sleep(0)
+    assert not waiter.done()  # would exceed the budget
+    await budget.release(60)
+    await asyncio.wait_for(waiter, 1)
+    await budget.release(60)
+    await asyncio.wait_for(budget.acquire(500), 1)  # an oversized file goes through alone
+
+def test_bulk_ingest_stays_inside_source(tmp_path):
+    import io, tarfile
+    from bulk_ingest import iter_source
+    (tmp_path / "secret.txt").write_bytes(b"secret")
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    (corpus / "ok.txt").write_bytes(b"ok")
+    (corpus / "link.txt").symlink_to(tmp_path / "secret.txt")
+    manifest = [{"path": "ok.txt"}, {"path": "../secret.txt"}, {"path": "a/../../secret.txt"}, {"path": "link.txt"}]
+    assert [raw for _, raw in iter_source(str(corpus), manifest)] == [b"ok"]
+    assert [raw for _, raw in iter_source(str(corpus), None)] == [b"ok"]
+    tar_path = tmp_path / "corpus.tar"
+    with tarfile.open(tar_path, "w") as tf:
+        for name in ("../escape.txt", "docs/../../escape.txt", "docs/in.txt"):
+            info = tarfile.TarInfo(name)
+            info.size = 2
+            tf.addfile(info, io.BytesIO(b"xx"))
+    assert [e["path"] for e, _ in iter_source(str(tar_path), None)] == ["docs/in.txt"]
+
+def test_needs_ocr_uses_text_per_page():
+    from ocr import needs_ocr
+    assert needs_ocr("", 100)
+    assert needs_ocr("Page 1\f\f\f", 100)  # three scanned pages (a form feed after each), only a header
+    assert not needs_ocr(("x" * 150 + "\f") * 3, 100)
+
+def test_ocr_page_key_needs_no_render():
+    from ocr import page_key
+    assert page_key("abc", 0, 300) == page_key("abc", 0, 300)
+    assert len({page_key("abc", 0, 300), page_key("abc", 1, 300), page_key("abc", 0, 200), page_key("abd", 0, 300)}) == 4
+
+def test_ranking_weights_normalized_with_override():
+    from ranking import weights_from
+    conf = {"ranking": {"weights": {"volume": 0.4, "freshness": 0.3, "quality": 0.2, "reliability": 0.1}}}
+    w = weights_from(conf, {"volume": 0.0, "bogus": 5})
+    assert abs(sum(w.values()) - 1) < 1e-9 and w["volume"] == 0.0
+    assert abs(w["freshness"] - 0.5) < 1e-9
+    with pytest.raises(ValueError):
+        weights_from(conf, {k: 0 for k in w})
+
+def test_revisit_interval_adapts_to_changes():
+    from recrawl import next_reseed_days, recrawl_config, revisit_interval
+    cfg = recrawl_config({"crawl": {"recrawl_min_hours": 1, "recrawl_max_days": 90}})
+    _, fresh = revisit_interval(0, 0, "weekly", cfg)
+    assert abs(fresh - 7) < 1e-9
+    _, busy = revisit_interval(29, 30, "weekly", cfg)  # changed on almost every daily visit
+    _, still = revisit_interval(0, 365, None, cfg)
+    assert busy < 2 and still == 90
+    assert revisit_interval(1000, 1, "always", cfg)[1] == 1 / 24
+    assert next_reseed_days(1, 10) == 0.5 and next_reseed_days(1, 0) == 2
+
+def test_learned_profile_extracts_content():
+    from patterns import compile_profile, extract, learn_profile
+    def page(i):
+        body = "".join(f"<p>Paragraph {j} of release {i}, long enough to count as text.</p>" for j in range(5))
+        return (f"<html><head><title>Release {i} | Agency</title></head><body><nav><p>Menu</p></nav>"
+                f"<div class='wrap-{i}000'><h1 class='title'>Release {i}</h1><div class='body'>{body}</div></div>"
+                f"<a rel='next' href='?p=2'>Next</a></body></html>").encode()
+    prof = learn_profile([page(i) for i in range(5)])
+    assert prof["selectors"] == {"title": "h1.title", "content": "div.body"}
+    assert prof["pagination"] == {"mode": "link-next", "selector": "a[rel=next]"}
+    title, text = extract(page(42), compile_profile(prof))
+    assert title == "Release 42" and "Paragraph 4 of release 42" in text and "Menu" not in text
+    assert extract(b"<html><body><p>other layout</p></body></html>", compile_profile(prof)) is None
+
+@pytest.mark.asyncio
+async def test_result_cache_tags_invalidate():
+    from result_cache import ResultCache
+    cache, calls = ResultCache(max_entries=2), []
+
+    async def call():
+        calls.append(1)
+        return {"n": len(calls)}
+
+    params = {"query": "budget"}
+    assert await cache.get_or_call("search_docs", params, 60, ["docs:*"], call) == {"n": 1}
+    assert await cache.get_or_call("search_docs", dict(params), 60, ["docs:*"], call) == {"n": 1}
+    await cache.invalidate("docs:a.gov")  # unrelated tag
+    assert await cache.get_or_call("search_docs", params, 60, ["docs:*"], call) == {"n": 1}
+    await cache.invalidate("docs:*")
+    assert await cache.get_or_call("search_docs", params, 60, ["docs:*"], call) == {"n": 2}
+    for q in ("a", "b", "c"):
+        await cache.get_or_call("search_docs", {"query": q}, 60, ["docs:*"], call)
+    assert len(cache) == 2
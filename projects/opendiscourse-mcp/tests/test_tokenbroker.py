@@ -1,4 +1,7 @@
-import httpx, pytest
+import asyncio, httpx, os, sys, time, pytest
+
+# appended, not prepended: the govdocs tests own the shared module names (settings, ...)
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "servers", "mcp_tokenbroker"))
 
 @pytest.mark.asyncio
 async def test_tokenbroker_unknown():
@@ -6,3 +9,55 @@ async def test_tokenbroker_unknown():
     payload = {"jsonrpc": "2.0", "method": "unknown_tool", "params": {}, "id": 1}
     # We can't call the live server here; this test is illustrative for CI structure.
     assert "method" in payload and payload["method"] == "unknown_tool"
+
+def test_secret_store_envelope_roundtrip(tmp_path):
+    from secret_store import SecretStore, load_kek
+    kek = load_kek(None, str(tmp_path / "kek"))
+    assert load_kek(None, str(tmp_path / "kek")) == kek  # created once, then reused
+    store = SecretStore(str(tmp_path / "s.sqlite"), kek)
+    store.put("secret://a", "tok-a", expires_at=123.0)
+    assert store.get_many(["secret://a", "secret://b"]) == {"secret://a": ("tok-a", 123.0, None)}
+    raw = open(tmp_path / "s.sqlite", "rb").read()
+    assert b"tok-a" not in raw
+    other = SecretStore(str(tmp_path / "s.sqlite"), os.urandom(32))
+    with pytest.raises(Exception):
+        other.get_many(["secret://a"])
+
+@pytest.mark.asyncio
+async def test_broker_refresh_is_single_flight(tmp_path):
+    from broker import TokenBroker
+    from secret_store import SecretStore
+    calls = []
+
+    async def fake_flow(flow, broker):
+        calls.append(flow["provider_url"])
+        await asyncio.sleep(0.05)
+        return f"fresh-{len(calls)}", time.time() + 3600
+
+    broker = TokenBroker(SecretStore(str(tmp_path / "s.sqlite"), os.urandom(32)), refreshers={"fake": fake_flow})
+    flow_id = (await broker.record_flow("https://idp.example", kind="fake"))["flow_id"]
+    await broker.store_secret("secret://t", "old", expires_at=time.time() + 5, flow_id=flow_id)
+    await broker.store_secret("secret://static", "s")
+    results = await asyncio.gather(*(broker.resolve_many(["secret://t", "secret://static", "secret://none"])
+                                     for _ in range(10)))
+    assert len(calls) == 1
+    for r in results:
+        assert r["secrets"]["secret://t"]["value"] == "fresh-1" and r["secrets"]["secret://static"]["value"] == "s"
+        assert r["missing"] == ["secret://none"] and not r["errors"]
+    assert (await broker.resolve("secret://t"))["value"] == "fresh-1" and len(calls) == 1
+
+@pytest.mark.asyncio
+async def test_broker_serves_valid_token_when_refresh_fails(tmp_path):
+    from broker import TokenBroker
+    from secret_store import SecretStore
+
+    async def broken_flow(flow, broker):
+        raise RuntimeError("idp down")
+
+    broker = TokenBroker(SecretStore(str(tmp_path / "s.sqlite"), os.urandom(32)), refreshers={"broken": broken_flow})
+    flow_id = (await broker.record_flow("https://idp.example", kind="broken"))["flow_id"]
+    await broker.store_secret("secret://soon", "still-good", expires_at=time.time() + 5, flow_id=flow_id)
+    await broker.store_secret("secret://gone", "old", expires_at=time.time() - 5, flow_id=flow_id)
+    got = await broker.resolve_many(["secret://soon", "secret://gone"])
+    assert got["secrets"]["secret://soon"]["value"] == "still-good"
+    assert "secret://gone" in got["errors"] and "secret://gone" not in got["secrets"]